@@ -0,0 +1,31 @@
+"""
+Auditor, para escribir en segundo plano las bitácoras y entradas-salidas que encolan las vistas en Redis
+
+El worker (worker.py) ya lo ejecuta como uno de sus procesos. Para ejecutarlo por separado, sin el worker,
+correr en la terminal y dejar corriendo:
+
+    python3 auditor.py
+
+"""
+
+import signal
+
+from pjecz_casiopea_flask.lib.audit_log import AUDITORIA_LOTE, AUDITORIA_MILISEGUNDOS, consume_audit_events
+from pjecz_casiopea_flask.main import app, redis_client
+
+detener = False
+
+
+def stop(signum, frame):
+    """Al recibir la señal, terminar después de escribir lo que se haya tomado de la cola"""
+    global detener
+    detener = True
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Auditor is running, writing every {AUDITORIA_LOTE} events or {AUDITORIA_MILISEGUNDOS} ms...")
+    with app.app_context():
+        escritos = consume_audit_events(redis_client, detener=lambda: detener)
+    print(f"Auditor has been stopped after writing {escritos} events.")
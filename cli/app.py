@@ -6,6 +6,7 @@ from typer import Typer
 
 from cli.commands.autoridades import autoridades
 from cli.commands.bitacoras import bitacoras
+from cli.commands.busquedas import busquedas
 from cli.commands.cit_citas import cit_citas
 from cli.commands.cit_clientes import cit_clientes
 from cli.commands.db import db
@@ -22,6 +23,7 @@ from cli.commands.usuarios_roles import usuarios_roles
 cli = Typer()
 cli.add_typer(autoridades, name="autoridades")
 cli.add_typer(bitacoras, name="bitacoras")
+cli.add_typer(busquedas, name="busquedas")
 cli.add_typer(cit_citas, name="cit_citas")
 cli.add_typer(cit_clientes, name="cit_clientes")
 cli.add_typer(db, name="db")
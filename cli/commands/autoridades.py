@@ -12,6 +12,7 @@ from pjecz_casiopea_flask.blueprints.autoridades.models import Autoridad
 from pjecz_casiopea_flask.blueprints.distritos.models import Distrito
 from pjecz_casiopea_flask.blueprints.materias.models import Materia
 from pjecz_casiopea_flask.lib.safe_string import safe_clave, safe_string
+from pjecz_casiopea_flask.lib.universal_mixin import UniversalMixin
 from pjecz_casiopea_flask.main import app
 
 AUTORIDADES_CSV = "seed/autoridades.csv"
@@ -33,9 +34,9 @@ def alimentar():
         console.print(f"[red]El archivo {AUTORIDADES_CSV} no existe.[/red]")
         return
 
-    # Leer el archivo CSV e insertar
+    # Leer el archivo CSV e insertar, con un solo commit al terminar
     contador = 0
-    with open(ruta, encoding="utf8") as puntero:
+    with open(ruta, encoding="utf8") as puntero, UniversalMixin.batch():
         for renglon in csv.DictReader(puntero):
             distrito_clave = safe_clave(renglon.get("distrito_clave"))
             materia_clave = safe_clave(renglon.get("materia_clave"))
@@ -3,17 +3,32 @@ CLI Commands Bitácoras
 """
 
 import os
+from datetime import date
 
 from dotenv import load_dotenv
 from rich.console import Console
 from typer import Typer
 
-from pjecz_casiopea_flask.main import task_queue
+from pjecz_casiopea_flask.blueprints.bitacoras.models import Bitacora
+from pjecz_casiopea_flask.blueprints.entradas_salidas.models import EntradaSalida
+from pjecz_casiopea_flask.lib.partitions import (
+    add_months,
+    convert_to_partitioned,
+    create_partitions,
+    is_partitioned,
+    retire_partitions,
+)
+from pjecz_casiopea_flask.main import app, database, task_queue
 
 # Cargar las variables de entorno
 load_dotenv()
 SENDGRID_TO_EMAIL = os.getenv("SENDGRID_TO_EMAIL", "")
 
+# Tablas particionadas por mes
+TABLAS_PARTICIONADAS = (Bitacora.__table__, EntradaSalida.__table__)
+
+app.app_context().push()
+
 bitacoras = Typer()
 
 
@@ -24,3 +39,31 @@ def enviar_email_reporte():
     console.print("Enviando reporte de bitácoras por email...")
     tarea = task_queue.enqueue("pjecz_lira_flask.blueprints.bitacoras.tasks.enviar_reporte_por_email", SENDGRID_TO_EMAIL)
     console.print(f"  [green]Se ha solicitado la tarea {tarea.id}[/green]")
+
+
+@bitacoras.command()
+def rotar_particiones(meses_adelante: int = 3, meses_retencion: int = 24, archivar: bool = True):
+    """Crear las particiones mensuales de bitácoras y entradas-salidas y retirar las que pasen de la retención"""
+    console = Console()
+    este_mes = date.today().replace(day=1)
+    hasta = add_months(este_mes, meses_adelante)
+    antes_de = add_months(este_mes, -meses_retencion)
+
+    # Bucle por cada tabla, cada una en su propia transacción
+    for tabla in TABLAS_PARTICIONADAS:
+        console.print(f"Rotando las particiones de [cyan]{tabla.name}[/cyan]...")
+        with database.engine.begin() as conexion:
+            # Si la tabla no está particionada, convertirla
+            if not is_partitioned(conexion, tabla.name):
+                anterior, copiados = convert_to_partitioned(conexion, tabla, hasta)
+                console.print(f"  Se convirtió a particionada, se copiaron {copiados} renglones de {anterior}")
+                console.print(f"  [yellow]Cuando lo verifique, borre la tabla {anterior}[/yellow]")
+            # Crear las particiones que falten hasta los meses por adelantado
+            for nombre in create_partitions(conexion, tabla.name, este_mes, hasta):
+                console.print(f"  Se creó la partición {nombre}")
+            # Retirar las particiones anteriores a la retención
+            for nombre in retire_partitions(conexion, tabla.name, antes_de, archivar):
+                console.print(f"  Se {'archivó' if archivar else 'borró'} la partición {nombre}")
+
+    # Mensaje final
+    console.print(f"[green]Particiones hasta {hasta:%Y-%m}, retención desde {antes_de:%Y-%m}[/green]")
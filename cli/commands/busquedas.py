@@ -0,0 +1,274 @@
+"""
+CLI Commands Búsquedas
+"""
+
+import json
+import re
+import timeit
+
+from rich.console import Console
+from rich.table import Table
+from sqlalchemy import bindparam, select, text, update
+from typer import Typer
+from unidecode import unidecode
+
+from pjecz_casiopea_flask.blueprints.cit_clientes.models import CitCliente
+from pjecz_casiopea_flask.blueprints.usuarios.models import Usuario
+from pjecz_casiopea_flask.lib.safe_string import safe_string, safe_string_many
+from pjecz_casiopea_flask.lib.search import (
+    LLAVE_BUSQUEDA_LARGO,
+    TRIGRAMAS_EXTENSION,
+    TRIGRAMAS_OPERADORES,
+    indices_trigramas,
+    modelos_llaves_busqueda,
+    search_key,
+    trigram_index_sql,
+)
+from pjecz_casiopea_flask.main import app, database
+
+# Nombres y apellidos para generar los clientes de la medición
+MEDIR_NOMBRES = ("JUAN", "MARIA", "JOSE", "GUADALUPE", "FRANCISCO", "ANA", "LUIS", "PATRICIA", "CARLOS", "ROSA")
+MEDIR_APELLIDOS = ("GARCIA", "MARTINEZ", "LOPEZ", "HERNANDEZ", "GONZALEZ", "PEREZ", "RODRIGUEZ", "SANCHEZ", "RAMIREZ")
+
+# Fragmentos que se buscan en la medición, columna y texto
+MEDIR_BUSQUEDAS = (
+    ("email", "cliente12345"),
+    ("email", "99999@"),
+    ("nombres", "GUADA"),
+    ("apellido_primero", "RODRI"),
+)
+
+# Nombres reales con acentos, diéresis, Ñ y signos, para comparar safe_string con la versión anterior
+MEDIR_CORPUS = (
+    "José María",
+    "María de los Ángeles",
+    "Peña Nieto",
+    "Núñez",
+    "Muñoz Ibáñez",
+    "Güereca",
+    "Argüello",
+    "O'Connor",
+    "Díaz-Ordaz",
+    "  Sofía   Ximena ",
+    "Zúñiga Cantú",
+    "Ñañez",
+    "Iñiguez de la Peña",
+    "Ávila Camacho",
+    "Ruíz (Jr.)",
+    "Cervantes/Saavedra",
+    "Müller Schäfer",
+    "François Lefèvre",
+    "Øyvind Åsmund",
+    "Çelik",
+)
+
+# Cantidad de renglones por cada consulta y commit al rellenar las llaves de búsqueda
+RELLENAR_LOTE = 5000
+
+app.app_context().push()
+
+busquedas = Typer()
+
+
+@busquedas.command()
+def crear_indices():
+    """Crear la extensión pg_trgm y los índices GIN de trigramas que falten, sin bloquear las tablas"""
+    console = Console()
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    with database.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.execute(text(f"CREATE EXTENSION IF NOT EXISTS {TRIGRAMAS_EXTENSION}"))
+        for indice in indices_trigramas:
+            console.print(f"Creando {indice.name}...")
+            conexion.execute(text(trigram_index_sql(indice)))
+    console.print(f"[green]Se verificaron {len(indices_trigramas)} índices de trigramas[/green]")
+
+
+@busquedas.command()
+def rellenar_llaves(lote: int = RELLENAR_LOTE):
+    """Agregar las columnas de las llaves de búsqueda si faltan y calcular las que no coincidan con sus columnas"""
+    console = Console()
+    for modelo, llaves in modelos_llaves_busqueda:
+        tabla = modelo.__table__
+        console.print(f"Rellenando las llaves de búsqueda de [cyan]{tabla.name}[/cyan]...")
+
+        # Agregar las columnas que falten, create_all no las agrega a una tabla que ya existe
+        for llave in llaves:
+            database.session.execute(
+                text(
+                    f"ALTER TABLE {tabla.name} ADD COLUMN IF NOT EXISTS {llave} "
+                    f"VARCHAR({LLAVE_BUSQUEDA_LARGO}) NOT NULL DEFAULT ''"
+                )
+            )
+        database.session.commit()
+
+        # Actualizar sin cambiar modificado, porque las llaves no son un cambio del registro
+        actualizar = (
+            update(tabla)
+            .where(tabla.c.id == bindparam("b_id"))
+            .values(modificado=tabla.c.modificado, **{llave: bindparam(f"b_{llave}") for llave in llaves})
+        )
+
+        # Recorrer la tabla por bloques ordenados por id
+        columnas = [tabla.c.id] + [tabla.c[columna] for columna in llaves.values()] + [tabla.c[llave] for llave in llaves]
+        ultimo_id = None
+        revisados = 0
+        actualizados = 0
+        while True:
+            consulta = select(*columnas).order_by(tabla.c.id).limit(lote)
+            if ultimo_id is not None:
+                consulta = consulta.where(tabla.c.id > ultimo_id)
+            renglones = database.session.execute(consulta).mappings().all()
+            if not renglones:
+                break
+            cambios = []
+            for renglon in renglones:
+                calculadas = {llave: search_key(renglon[columna]) for llave, columna in llaves.items()}
+                if any(calculadas[llave] != renglon[llave] for llave in llaves):
+                    cambios.append({"b_id": renglon["id"], **{f"b_{llave}": valor for llave, valor in calculadas.items()}})
+            if cambios:
+                database.session.execute(actualizar, cambios)
+            database.session.commit()
+            ultimo_id = renglones[-1]["id"]
+            revisados += len(renglones)
+            actualizados += len(cambios)
+        console.print(f"  Se revisaron {revisados} y se actualizaron {actualizados}")
+
+    # Mensaje final
+    console.print("[cyan]Ejecute busquedas crear-indices para crear los índices de las llaves de búsqueda.[/cyan]")
+
+
+def safe_string_anterior(input_str, max_len=250, do_unidecode=True, save_enie=False, to_uppercase=True) -> str:
+    """Versión anterior de safe_string, sin compilar y carácter por carácter, solo para comparar en medir-safe-string"""
+    if not isinstance(input_str, str):
+        return ""
+    if do_unidecode:
+        new_string = re.sub(r"[^a-zA-Z0-9.()/-]+", " ", input_str)
+        if save_enie:
+            new_string = ""
+            for char in input_str:
+                if char == "ñ":
+                    new_string += "ñ"
+                elif char == "Ñ":
+                    new_string += "Ñ"
+                else:
+                    new_string += unidecode(char)
+        else:
+            new_string = re.sub(r"[^a-zA-Z0-9.()/-]+", " ", unidecode(input_str))
+    else:
+        if save_enie is False:
+            new_string = re.sub(r"[^a-záéíóúüA-ZÁÉÍÓÚÜ0-9.()/-]+", " ", input_str)
+        else:
+            new_string = re.sub(r"[^a-záéíóúüñA-ZÁÉÍÓÚÜÑ0-9.()/-]+", " ", input_str)
+    removed_multiple_spaces = re.sub(r"\s+", " ", new_string)
+    final = removed_multiple_spaces.strip()
+    if to_uppercase:
+        final = final.upper()
+    if max_len == 0:
+        return final
+    return (final[:max_len] + "…") if len(final) > max_len else final
+
+
+@busquedas.command()
+def medir_safe_string(cantidad: int = 10000, repeticiones: int = 5):
+    """Comparar safe_string con su versión anterior: que entreguen lo mismo y cuánto tardan, con nombres reales"""
+    console = Console()
+
+    # Juntar el corpus con los nombres de la base de datos, si los hay
+    corpus = list(MEDIR_CORPUS)
+    for modelo, columnas in ((CitCliente, ("nombres", "apellido_primero", "apellido_segundo")), (Usuario, ("nombres",))):
+        for renglon in database.session.query(*(getattr(modelo, columna) for columna in columnas)).limit(cantidad):
+            corpus.extend(renglon)
+    console.print(f"Corpus de {len(corpus)} textos")
+
+    # Verificar que entreguen lo mismo con cada combinación de opciones
+    opciones = (
+        {},
+        {"save_enie": True},
+        {"do_unidecode": False},
+        {"do_unidecode": False, "save_enie": True},
+        {"save_enie": True, "to_uppercase": False, "max_len": 0},
+    )
+    diferencias = 0
+    for kwargs in opciones:
+        for texto, nuevo in zip(corpus, safe_string_many(corpus, **kwargs)):
+            if nuevo != safe_string_anterior(texto, **kwargs):
+                diferencias += 1
+                console.print(f"[red]Diferencia con {kwargs}: {texto!r}[/red]")
+    if diferencias > 0:
+        console.print(f"[red]Hay {diferencias} diferencias[/red]")
+        return
+
+    # Medir el tiempo de cada versión con la opción que conserva la Ñ, la que usan los nombres
+    tabla = Table(title=f"safe_string con save_enie=True, {len(corpus)} textos, mejor de {repeticiones}")
+    tabla.add_column("Versión")
+    tabla.add_column("Milisegundos", justify="right")
+    for version, funcion in (
+        ("Anterior", lambda: [safe_string_anterior(texto, save_enie=True) for texto in corpus]),
+        ("safe_string", lambda: [safe_string(texto, save_enie=True) for texto in corpus]),
+        ("safe_string_many", lambda: safe_string_many(corpus, save_enie=True)),
+    ):
+        mejor = min(timeit.repeat(funcion, number=1, repeat=repeticiones))
+        tabla.add_row(version, f"{mejor * 1000:.2f}")
+    console.print(tabla)
+    console.print("[green]Las dos versiones entregan lo mismo[/green]")
+
+
+def measure_milliseconds(conexion, columna: str, fragmento: str, repeticiones: int) -> float:
+    """Medir con EXPLAIN ANALYZE el conteo con el filtro contiene, como lo hace el DataTable, entrega el mejor tiempo"""
+    sql = f"EXPLAIN (ANALYZE, FORMAT JSON) SELECT count(*) FROM medir_clientes WHERE {columna} LIKE :patron"
+    tiempos = []
+    for _ in range(repeticiones):
+        plan = conexion.execute(text(sql), {"patron": f"%{fragmento}%"}).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tiempos.append(plan[0]["Execution Time"])
+    return min(tiempos)
+
+
+@busquedas.command()
+def medir(cantidad: int = 1000000, repeticiones: int = 3):
+    """Medir el filtro contiene sin y con índices de trigramas, sobre una tabla temporal de clientes generados"""
+    console = Console()
+    columnas = sorted({columna for columna, _ in MEDIR_BUSQUEDAS})
+    with database.engine.connect() as conexion:
+        conexion.execute(text(f"CREATE EXTENSION IF NOT EXISTS {TRIGRAMAS_EXTENSION}"))
+
+        # Generar los clientes en una tabla temporal, así no se tocan los datos reales
+        console.print(f"Generando {cantidad} clientes...")
+        conexion.execute(
+            text(
+                """
+                CREATE TEMP TABLE medir_clientes AS
+                SELECT
+                    gen_random_uuid() AS id,
+                    'cliente' || n || '@correo' || (n % 97) || '.com' AS email,
+                    (:nombres)[1 + n % cardinality(:nombres)] AS nombres,
+                    (:apellidos)[1 + (n / 7) % cardinality(:apellidos)] AS apellido_primero,
+                    (:apellidos)[1 + (n / 13) % cardinality(:apellidos)] AS apellido_segundo
+                FROM generate_series(1, :cantidad) AS n
+                """
+            ),
+            {"nombres": list(MEDIR_NOMBRES), "apellidos": list(MEDIR_APELLIDOS), "cantidad": cantidad},
+        )
+        conexion.execute(text("ANALYZE medir_clientes"))
+
+        # Medir sin índices de trigramas
+        antes = [measure_milliseconds(conexion, columna, fragmento, repeticiones) for columna, fragmento in MEDIR_BUSQUEDAS]
+
+        # Crear los índices de trigramas y medir de nuevo
+        console.print("Creando los índices de trigramas...")
+        for columna in columnas:
+            conexion.execute(text(f"CREATE INDEX ON medir_clientes USING gin ({columna} {TRIGRAMAS_OPERADORES})"))
+        conexion.execute(text("ANALYZE medir_clientes"))
+        despues = [measure_milliseconds(conexion, columna, fragmento, repeticiones) for columna, fragmento in MEDIR_BUSQUEDAS]
+        conexion.rollback()
+
+    # Mostrar la tabla con los resultados
+    tabla = Table(title=f"Filtro contiene sobre {cantidad} clientes, mejor de {repeticiones}")
+    tabla.add_column("Columna")
+    tabla.add_column("Fragmento")
+    tabla.add_column("Sin índice (ms)", justify="right")
+    tabla.add_column("Con trigramas (ms)", justify="right")
+    for (columna, fragmento), ms_antes, ms_despues in zip(MEDIR_BUSQUEDAS, antes, despues):
+        tabla.add_row(columna, fragmento, f"{ms_antes:.2f}", f"{ms_despues:.2f}")
+    console.print(tabla)
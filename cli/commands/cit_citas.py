@@ -10,7 +10,7 @@ from rich.console import Console
 from sqlalchemy.sql import func
 from typer import Typer
 
-from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCita
+from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCita, CitCitaOcupacion
 from pjecz_casiopea_flask.blueprints.cit_clientes.models import CitCliente
 from pjecz_casiopea_flask.blueprints.cit_oficinas_servicios.models import CitOficinaServicio
 from pjecz_casiopea_flask.blueprints.cit_servicios.models import CitServicio
@@ -113,13 +113,16 @@ def eliminar(horas: int = 24):
     console = Console()
     # Definir el tiempo límite
     tiempo_limite = datetime.now() - timedelta(hours=horas)
-    # Consultar las citas a eliminar
-    citas = CitCita.query.filter(CitCita.inicio < tiempo_limite).filter(CitCita.estatus == "A").all()
-    # Contador
-    contador = 0
-    # Bucle entre las citas
-    for cita in citas:
-        cita.delete()
-        contador += 1
+    # Eliminar las citas por bloques, con un UPDATE y un commit por bloque
+    contador = CitCita.bulk_delete(CitCita.inicio < tiempo_limite)
     # Mensaje final
     console.print(f"[green]Se han eliminado {contador} citas pasadas de más de {horas} horas[/green]")
+
+
+@cit_citas.command()
+def reconstruir_ocupacion():
+    """Reconstruir desde cero la ocupación por oficina, fecha y hora a partir de las citas"""
+    console = Console()
+    console.print("[cyan]Reconstruyendo la ocupación de las oficinas...[/cyan]")
+    contador = CitCitaOcupacion.rebuild()
+    console.print(f"[green]Se han reconstruido {contador} celdas de ocupación[/green]")
@@ -10,6 +10,7 @@ from typer import Typer
 
 from pjecz_casiopea_flask.blueprints.distritos.models import Distrito
 from pjecz_casiopea_flask.lib.safe_string import safe_clave, safe_string
+from pjecz_casiopea_flask.lib.universal_mixin import UniversalMixin
 from pjecz_casiopea_flask.main import app
 
 DISTRITOS_CSV = "seed/distritos.csv"
@@ -31,9 +32,9 @@ def alimentar():
         console.print(f"[red]El archivo {DISTRITOS_CSV} no existe.[/red]")
         return
 
-    # Leer el archivo CSV e insertar
+    # Leer el archivo CSV e insertar, con un solo commit al terminar
     contador = 0
-    with open(ruta, encoding="utf8") as puntero:
+    with open(ruta, encoding="utf8") as puntero, UniversalMixin.batch():
         for renglon in csv.DictReader(puntero):
             clave = safe_clave(renglon.get("clave"))
             nombre = safe_string(renglon.get("nombre"), save_enie=True)
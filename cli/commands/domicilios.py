@@ -9,7 +9,8 @@ from rich.console import Console
 from typer import Typer
 
 from pjecz_casiopea_flask.blueprints.domicilios.models import Domicilio
-from pjecz_casiopea_flask.lib.safe_string import safe_clave, safe_string
+from pjecz_casiopea_flask.lib.safe_string import safe_clave, safe_string, safe_string_many
+from pjecz_casiopea_flask.lib.universal_mixin import UniversalMixin
 from pjecz_casiopea_flask.main import app
 
 DOMICILIOS_CSV = "seed/domicilios.csv"
@@ -31,18 +32,17 @@ def alimentar():
         console.print(f"[red]El archivo {DOMICILIOS_CSV} no existe.[/red]")
         return
 
-    # Leer el archivo CSV e insertar
+    # Leer el archivo CSV e insertar, con un solo commit al terminar
     contador = 0
-    with open(ruta, encoding="utf8") as puntero:
+    with open(ruta, encoding="utf8") as puntero, UniversalMixin.batch():
         for renglon in csv.DictReader(puntero):
             clave = safe_clave(renglon.get("clave"))
-            edificio = safe_string(renglon.get("edificio"), save_enie=True)
-            estado = safe_string(renglon.get("estado"), save_enie=True)
-            municipio = safe_string(renglon.get("municipio"), save_enie=True)
-            calle = safe_string(renglon.get("calle"), save_enie=True)
+            edificio, estado, municipio, calle, colonia = safe_string_many(
+                (renglon.get(columna) for columna in ("edificio", "estado", "municipio", "calle", "colonia")),
+                save_enie=True,
+            )
             num_ext = safe_string(renglon.get("num_ext"))
             num_int = safe_string(renglon.get("num_int"))
-            colonia = safe_string(renglon.get("colonia"), save_enie=True)
             cp = int(renglon.get("cp", "0"))
             es_activo = renglon.get("es_activo") == "1"
             estatus = renglon.get("estatus")
@@ -1,15 +1,32 @@
 """
 CLI Commands Migrar
+
+Copia las tablas de la base de datos ANTERIOR a la NUEVA por lotes. Los registros se leen con un cursor del lado
+del servidor, se cargan con COPY FROM STDIN a una tabla temporal y se insertan con un solo INSERT ... SELECT por
+lote, donde las llaves foráneas se resuelven con LEFT JOIN por clave o email y se omiten los registros que ya existen.
+Los registros cuyo padre aún no está en la NUEVA no se insertan, se cuentan y se informan.
+
+Como no se usa el ORM, en cada lote se calculan aquí lo que harían sus listeners: la ocupación de las oficinas en
+las fechas de las citas y las llaves de búsqueda de los registros que se insertaron o actualizaron.
 """
 
+import io
 import os
-import uuid
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from datetime import time as datetime_time
 
 import psycopg2
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
 from rich.console import Console
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
 from typer import Typer
 
+from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCita, CitCitaOcupacion
+from pjecz_casiopea_flask.lib.search import modelos_llaves_busqueda, search_key
 from pjecz_casiopea_flask.main import app
 
 load_dotenv()  # Take environment variables from .env
@@ -28,938 +45,737 @@ NEW_DB_PASS = os.environ.get("NEW_DB_PASS")
 NEW_DB_HOST = os.environ.get("NEW_DB_HOST")
 NEW_DB_PORT = os.environ.get("NEW_DB_PORT")
 
+# Cantidad de registros por lote
+LOTE = 10000
+
+# Tabla en la base de datos NUEVA con la marca (modificado, id) de la última sincronización de cada tabla
+PUNTOS_CONTROL = "migrar_puntos_control"
+MARCA_INICIAL = (datetime(1900, 1, 1), 0)
+
+# Margen hacia atrás desde la marca al sincronizar, para no perder lo que la ANTERIOR confirmó tarde con un modificado
+# menor a la marca; volver a leer esos registros no hace daño porque el UPDATE y el INSERT son idempotentes
+SINCRONIZAR_MARGEN = timedelta(minutes=10)
+
+# Tablas a copiar, en el orden en que se deben copiar. En cada una se define:
+# - columnas: las que tienen el mismo nombre en ambas bases de datos
+# - llaves_foraneas: columna, tabla padre y columna del padre con la que se busca el id en la base de datos NUEVA
+# - unicas: columnas de la tabla NUEVA con las que se sabe si el registro ya existe
+# - constantes: columnas de la tabla NUEVA que no existen en la ANTERIOR y su valor
+# - id_original: si se guarda el id de la base de datos ANTERIOR en la columna id_original
+TABLAS = [
+    {
+        "tabla": "cit_dias_inhabiles",
+        "columnas": ("fecha", "descripcion", "estatus"),
+        "unicas": ("fecha",),
+    },
+    {
+        "tabla": "distritos",
+        "columnas": (
+            "clave",
+            "nombre",
+            "nombre_corto",
+            "es_distrito_judicial",
+            "es_distrito",
+            "es_jurisdiccional",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "unicas": ("clave",),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "autoridades",
+        "columnas": ("clave", "descripcion", "descripcion_corta", "es_jurisdiccional", "estatus", "creado", "modificado"),
+        "llaves_foraneas": (("distrito_id", "distritos", "clave"), ("materia_id", "materias", "clave")),
+        "unicas": ("clave",),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "domicilios",
+        "columnas": (
+            "clave",
+            "edificio",
+            "estado",
+            "municipio",
+            "calle",
+            "num_ext",
+            "num_int",
+            "colonia",
+            "cp",
+            "completo",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "unicas": ("clave",),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "oficinas",
+        "columnas": (
+            "clave",
+            "descripcion",
+            "descripcion_corta",
+            "es_jurisdiccional",
+            "puede_agendar_citas",
+            "apertura",
+            "cierre",
+            "limite_personas",
+            "puede_enviar_qr",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "llaves_foraneas": (("distrito_id", "distritos", "clave"), ("domicilio_id", "domicilios", "clave")),
+        "unicas": ("clave",),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "cit_categorias",
+        "columnas": ("clave", "nombre", "estatus", "creado", "modificado"),
+        "unicas": ("clave",),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "cit_servicios",
+        "columnas": (
+            "clave",
+            "descripcion",
+            "duracion",
+            "documentos_limite",
+            "desde",
+            "hasta",
+            "dias_habilitados",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "llaves_foraneas": (("cit_categoria_id", "cit_categorias", "clave"),),
+        "unicas": ("clave",),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "cit_oficinas_servicios",
+        "columnas": ("descripcion", "estatus", "creado", "modificado"),
+        "llaves_foraneas": (("cit_servicio_id", "cit_servicios", "clave"), ("oficina_id", "oficinas", "clave")),
+        "unicas": ("cit_servicio_id", "oficina_id"),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "cit_clientes",
+        "columnas": (
+            "nombres",
+            "apellido_primero",
+            "apellido_segundo",
+            "curp",
+            "telefono",
+            "email",
+            "contrasena_md5",
+            "contrasena_sha256",
+            "renovacion",
+            "limite_citas_pendientes",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "unicas": ("email",),
+        "constantes": {
+            "autoriza_mensajes": "false",
+            "enviar_boletin": "false",
+            "es_adulto_mayor": "false",
+            "es_mujer": "false",
+            "es_identidad": "false",
+            "es_discapacidad": "false",
+            "es_personal_interno": "false",
+        },
+    },
+    {
+        "tabla": "cit_clientes_recuperaciones",
+        "columnas": (
+            "expiracion",
+            "cadena_validar",
+            "mensajes_cantidad",
+            "ya_recuperado",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "llaves_foraneas": (("cit_cliente_id", "cit_clientes", "email"),),
+        "unicas": ("id_original",),
+        "id_original": True,
+    },
+    {
+        "tabla": "cit_clientes_registros",
+        "columnas": (
+            "nombres",
+            "apellido_primero",
+            "apellido_segundo",
+            "curp",
+            "telefono",
+            "email",
+            "expiracion",
+            "cadena_validar",
+            "mensajes_cantidad",
+            "ya_registrado",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "unicas": ("id_original",),
+        "id_original": True,
+    },
+    {
+        "tabla": "cit_citas",
+        "columnas": (
+            "inicio",
+            "termino",
+            "notas",
+            "estado",
+            "cancelar_antes",
+            "asistencia",
+            "codigo_asistencia",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "llaves_foraneas": (
+            ("cit_cliente_id", "cit_clientes", "email"),
+            ("cit_servicio_id", "cit_servicios", "clave"),
+            ("oficina_id", "oficinas", "clave"),
+        ),
+        "unicas": ("id_original",),
+        "id_original": True,
+    },
+    {
+        "tabla": "pag_tramites_servicios",
+        "columnas": ("clave", "descripcion", "costo", "url", "estatus", "creado", "modificado"),
+        "unicas": ("clave",),
+        "constantes": {"es_activo": "true"},
+    },
+    {
+        "tabla": "pag_pagos",
+        "columnas": (
+            "caducidad",
+            "cantidad",
+            "descripcion",
+            "estado",
+            "email",
+            "folio",
+            "resultado_tiempo",
+            "resultado_xml",
+            "total",
+            "ya_se_envio_comprobante",
+            "estatus",
+            "creado",
+            "modificado",
+        ),
+        "llaves_foraneas": (
+            ("autoridad_id", "autoridades", "clave"),
+            ("distrito_id", "distritos", "clave"),
+            ("cit_cliente_id", "cit_clientes", "email"),
+            ("pag_tramite_servicio_id", "pag_tramites_servicios", "clave"),
+        ),
+        "unicas": ("id_original",),
+        "id_original": True,
+    },
+]
+
 app.app_context().push()
 
 
-def copiar_cit_dias_inhabiles(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_dias_inhabiles de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute("SELECT fecha, descripcion, estatus FROM cit_dias_inhabiles ORDER BY fecha ASC")
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = "INSERT INTO cit_dias_inhabiles (id, fecha, descripcion, estatus) VALUES (%s, %s, %s, %s)"
-    try:
-        for row in rows:
-            fecha = row[0]  # La fecha es la primer columna
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM cit_dias_inhabiles WHERE fecha = %s", (fecha,))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {fecha}: {error}")
-    # Confirmar los cambios
-    conn_new.commit()
-    # Mensaje final
-    return f"  {contador} cit_dias_inhabiles copiados."
+def foreign_key_column(llave_foranea: tuple) -> str:
+    """Nombre de la columna de la tabla temporal con la clave del padre, por ejemplo distrito_id a distrito_clave"""
+    columna, _, llave = llave_foranea
+    return f"{columna.removesuffix('_id')}_{llave}"
 
 
-def copiar_distritos(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla distritos de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute(
-            """
-                SELECT
-                    clave, nombre, nombre_corto, es_distrito_judicial, es_distrito, es_jurisdiccional,
-                    estatus, creado, modificado
-                FROM
-                    distritos
-                ORDER BY
-                    id ASC
-            """,
-        )
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO distritos (id,
-            clave, nombre, nombre_corto, es_distrito_judicial, es_distrito, es_jurisdiccional,
-            estatus, creado, modificado, es_activo)
-        VALUES (%s,
-            %s, %s, %s, %s, %s, %s,
-            %s, %s, %s, true)
-    """
-    try:
-        for row in rows:
-            clave = row[0]  # La clave es la primer columna
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM distritos WHERE clave = %s", (clave,))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {clave}: {error}")
-    # Confirmar los cambios
-    conn_new.commit()
-    # Mensaje final
-    return f"  {contador} distritos copiados."
+def staged_columns(tabla: dict) -> list:
+    """Columnas de la tabla temporal, en el mismo orden en que se leen de la base de datos ANTERIOR"""
+    columnas = [foreign_key_column(llave_foranea) for llave_foranea in tabla.get("llaves_foraneas", ())]
+    if tabla.get("id_original"):
+        columnas.append("id_original")
+    columnas.extend(tabla["columnas"])
+    return columnas
 
 
-def copiar_autoridades(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla autoridades de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute(
-            """
-                SELECT
-                    distritos.clave AS distrito_clave,
-                    materias.clave AS materia_clave,
-                    autoridades.clave,
-                    autoridades.descripcion,
-                    autoridades.descripcion_corta,
-                    autoridades.es_jurisdiccional,
-                    autoridades.estatus,
-                    autoridades.creado,
-                    autoridades.modificado
-                FROM
-                    autoridades
-                    JOIN distritos ON autoridades.distrito_id = distritos.id
-                    JOIN materias ON autoridades.materia_id = materias.id
-                ORDER BY
-                    autoridades.id ASC
-            """,
-        )
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO autoridades (id,
-            distrito_id,
-            materia_id,
-            clave, descripcion, descripcion_corta, es_jurisdiccional,
-            estatus, creado, modificado, es_activo)
-        VALUES (%s,
-            (SELECT id FROM distritos WHERE clave = %s),
-            (SELECT id FROM materias WHERE clave = %s),
-            %s, %s, %s, %s,
-            %s, %s, %s, true)
-    """
-    try:
-        for row in rows:
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM autoridades WHERE clave = %s", (row[2],))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar registros en la BD NUEVA: {error}")
-    # Confirmar los cambios
-    conn_new.commit()
-    # Mensaje final
-    return f"  {contador} autoridades copiados."
+def build_select_old(tabla: dict, incremental: bool = False) -> str:
+    """Elaborar el SELECT para la base de datos ANTERIOR, con LEFT JOIN a los padres para leer sus claves
 
-
-def copiar_domicilios(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla domicilios de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute(
-            """
-                SELECT
-                    clave, edificio, estado, municipio, calle, num_ext, num_int, colonia, cp, completo,
-                    estatus, creado, modificado
-                FROM
-                    domicilios
-                ORDER BY
-                    clave ASC
-            """,
-        )
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO domicilios (id,
-            clave, edificio, estado, municipio, calle, num_ext, num_int, colonia, cp, completo,
-            estatus, creado, modificado,
-            es_activo)
-        VALUES (%s,
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-            %s, %s, %s,
-            true)
+    Si es incremental, solo los modificados desde una fecha, con la marca (modificado, id) agregada al final
     """
-    try:
-        for row in rows:
-            clave = row[0]  # La clave es la primer columna
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM domicilios WHERE clave = %s", (clave,))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {clave}: {error}")
-    # Confirmar los cambios
-    conn_new.commit()
-    # Mensaje final
-    return f"  {contador} domicilios copiados."
+    nombre = tabla["tabla"]
+    expresiones = []
+    joins = []
+    for numero, llave_foranea in enumerate(tabla.get("llaves_foraneas", ())):
+        columna, padre, llave = llave_foranea
+        expresiones.append(f"p{numero}.{llave} AS {foreign_key_column(llave_foranea)}")
+        joins.append(f"LEFT JOIN {padre} AS p{numero} ON {nombre}.{columna} = p{numero}.id")
+    if tabla.get("id_original"):
+        expresiones.append(f"{nombre}.id AS id_original")
+    expresiones.extend(f"{nombre}.{columna}" for columna in tabla["columnas"])
+    if incremental:
+        expresiones.extend([f"{nombre}.modificado AS marca_modificado", f"{nombre}.id AS marca_id"])
+        return (
+            f"SELECT {', '.join(expresiones)} FROM {nombre} {' '.join(joins)} "
+            f"WHERE {nombre}.modificado >= %s "
+            f"ORDER BY {nombre}.modificado ASC, {nombre}.id ASC"
+        )
+    return f"SELECT {', '.join(expresiones)} FROM {nombre} {' '.join(joins)} ORDER BY {nombre}.id ASC"
 
 
-def copiar_oficinas(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla oficinas de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute(
-            """
-                SELECT
-                    distritos.clave AS distrito_clave,
-                    domicilios.clave AS domicilio_clave,
-                    oficinas.clave, oficinas.descripcion, oficinas.descripcion_corta,
-                    oficinas.es_jurisdiccional, oficinas.puede_agendar_citas,
-                    oficinas.apertura, oficinas.cierre, oficinas.limite_personas, oficinas.puede_enviar_qr,
-                    oficinas.estatus, oficinas.creado, oficinas.modificado
-                FROM
-                    oficinas
-                    JOIN distritos ON oficinas.distrito_id = distritos.id
-                    JOIN domicilios ON oficinas.domicilio_id = domicilios.id
-                ORDER BY oficinas.clave ASC
-            """,
-        )
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO oficinas (id,
-            distrito_id,
-            domicilio_id,
-            clave, descripcion, descripcion_corta,
-            es_jurisdiccional, puede_agendar_citas,
-            apertura, cierre, limite_personas, puede_enviar_qr,
-            estatus, creado, modificado, es_activo)
-        VALUES (%s,
-            (SELECT id FROM distritos WHERE clave = %s),
-            (SELECT id FROM domicilios WHERE clave = %s),
-            %s, %s, %s,
-            %s, %s,
-            %s, %s, %s, %s,
-            %s, %s, %s, true)
+def build_create_staging(tabla: dict) -> str:
+    """Elaborar el CREATE de la tabla temporal, con los tipos de las columnas de la tabla NUEVA
+
+    La columna renglon guarda la posición del registro en el lote, para saber cuál es el primero sin padre
     """
-    try:
-        for row in rows:
-            clave = row[2]  # La clave de la oficina es la tercer columna
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM oficinas WHERE clave = %s", (clave,))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {clave}: {error}")
-    # Confirmar los cambios
+    expresiones = [f"NULL::text AS {foreign_key_column(llave_foranea)}" for llave_foranea in tabla.get("llaves_foraneas", ())]
+    if tabla.get("id_original"):
+        expresiones.append("id_original")
+    expresiones.extend(tabla["columnas"])
+    expresiones.append("NULL::integer AS renglon")
+    return (
+        f"CREATE TEMP TABLE IF NOT EXISTS tmp_{tabla['tabla']} ON COMMIT DELETE ROWS AS "
+        f"SELECT {', '.join(expresiones)} FROM {tabla['tabla']} WITH NO DATA"
+    )
+
+
+def build_values(tabla: dict) -> tuple[list, list, list]:
+    """Elaborar las columnas de la tabla NUEVA, las expresiones con que se llenan y los LEFT JOIN a las tablas padre"""
+    destinos = ["id"]
+    expresiones = ["gen_random_uuid()"]
+    joins = []
+    for numero, llave_foranea in enumerate(tabla.get("llaves_foraneas", ())):
+        columna, padre, llave = llave_foranea
+        destinos.append(columna)
+        expresiones.append(f"p{numero}.id")
+        joins.append(f"LEFT JOIN {padre} AS p{numero} ON p{numero}.{llave} = t.{foreign_key_column(llave_foranea)}")
+    columnas = (["id_original"] if tabla.get("id_original") else []) + list(tabla["columnas"])
+    destinos.extend(columnas)
+    expresiones.extend(f"t.{columna}" for columna in columnas)
+    for columna, valor in tabla.get("constantes", {}).items():
+        destinos.append(columna)
+        expresiones.append(valor)
+    return destinos, expresiones, joins
+
+
+def parents_found(tabla: dict) -> str:
+    """Elaborar la condición de que se encontraron todos los padres en la NUEVA"""
+    condiciones = [f"p{numero}.id IS NOT NULL" for numero in range(len(tabla.get("llaves_foraneas", ())))]
+    return " AND ".join(condiciones) if condiciones else "TRUE"
+
+
+def build_orphans_select(tabla: dict) -> str:
+    """Elaborar el SELECT del primer renglón y la cantidad de registros de la tabla temporal sin padre en la NUEVA"""
+    nombre = tabla["tabla"]
+    _, _, joins = build_values(tabla)
+    return f"SELECT min(t.renglon), count(*) FROM tmp_{nombre} AS t {' '.join(joins)} WHERE NOT ({parents_found(tabla)})"
+
+
+def build_insert_select(tabla: dict) -> str:
+    """Elaborar el INSERT ... SELECT de la tabla temporal a la NUEVA, omitiendo los registros que ya existen"""
+    nombre = tabla["tabla"]
+    destinos, expresiones, joins = build_values(tabla)
+    # Para saber si ya existe, comparar las columnas únicas con lo que se va a insertar
+    valores = dict(zip(destinos, expresiones))
+    existe = " AND ".join(f"e.{columna} = {valores[columna]}" for columna in tabla["unicas"])
+    return (
+        f"INSERT INTO {nombre} ({', '.join(destinos)}) "
+        f"SELECT {', '.join(expresiones)} FROM tmp_{nombre} AS t {' '.join(joins)} "
+        f"WHERE {parents_found(tabla)} AND NOT EXISTS (SELECT 1 FROM {nombre} AS e WHERE {existe}) "
+        "ON CONFLICT DO NOTHING"
+    )
+
+
+def build_update_select(tabla: dict) -> str:
+    """Elaborar el UPDATE de los registros que ya existen en la NUEVA con los de la tabla temporal"""
+    nombre = tabla["tabla"]
+    destinos, expresiones, joins = build_values(tabla)
+    # Actualizar todas las columnas menos el id, las únicas y las constantes
+    omitir = {"id", *tabla["unicas"], *tabla.get("constantes", {})}
+    valores = ", ".join(f"{expresion} AS {destino}" for destino, expresion in zip(destinos, expresiones) if destino != "id")
+    asignaciones = ", ".join(f"{destino} = v.{destino}" for destino in destinos if destino not in omitir)
+    coincide = " AND ".join(f"e.{columna} = v.{columna}" for columna in tabla["unicas"])
+    return (
+        f"UPDATE {nombre} AS e SET {asignaciones} "
+        f"FROM (SELECT {valores} FROM tmp_{nombre} AS t {' '.join(joins)} WHERE {parents_found(tabla)}) AS v "
+        f"WHERE {coincide}"
+    )
+
+
+def build_touched_condition(tabla: dict) -> str:
+    """Elaborar la condición de que un registro e de la NUEVA coincide con uno de la tabla temporal con sus padres"""
+    nombre = tabla["tabla"]
+    destinos, expresiones, joins = build_values(tabla)
+    valores = dict(zip(destinos, expresiones))
+    coincide = " AND ".join(f"e.{columna} = {valores[columna]}" for columna in tabla["unicas"])
+    return f"EXISTS (SELECT 1 FROM tmp_{nombre} AS t {' '.join(joins)} WHERE {parents_found(tabla)} AND {coincide})"
+
+
+def psycopg2_sql(sql: str) -> str:
+    """Convertir los parámetros :nombre de un SQL para SQLAlchemy a los %(nombre)s de psycopg2"""
+    return str(text(sql).compile(dialect=PGDialect_psycopg2()))
+
+
+def occupancy_days(cursor_new, tabla: dict) -> set:
+    """Pares de oficina y fecha de las citas de la NUEVA que coinciden con la tabla temporal"""
+    if tabla["tabla"] != CitCita.__tablename__:
+        return set()
+    cursor_new.execute(
+        f"SELECT DISTINCT e.oficina_id, fecha FROM {CitCita.__tablename__} AS e, "
+        f"unnest(ARRAY[e.inicio::date, e.termino::date]) AS fecha WHERE {build_touched_condition(tabla)}"
+    )
+    return set(cursor_new.fetchall())
+
+
+def rebuild_occupancy_days(cursor_new, dias: set) -> None:
+    """Volver a contar la ocupación de los pares de oficina y fecha"""
+    if not dias:
+        return
+    parametros = {
+        "oficinas_ids": [str(oficina_id) for oficina_id, _ in dias],
+        "fechas": [fecha for _, fecha in dias],
+        "minutos": CitCitaOcupacion.CELDA_MINUTOS,
+    }
+    cursor_new.execute(psycopg2_sql(CitCitaOcupacion.build_delete_days()), parametros)
+    cursor_new.execute(psycopg2_sql(CitCitaOcupacion.build_insert_days()), parametros)
+
+
+def fill_search_keys(cursor_new, tabla: dict) -> None:
+    """Calcular las llaves de búsqueda de los registros de la NUEVA que coinciden con la tabla temporal"""
+    nombre = tabla["tabla"]
+    llaves = next((llaves for modelo, llaves in modelos_llaves_busqueda if modelo.__tablename__ == nombre), None)
+    if llaves is None:
+        return
+    cursor_new.execute(
+        f"SELECT e.id, {', '.join(f'e.{columna}' for columna in llaves.values())} FROM {nombre} AS e "
+        f"WHERE {build_touched_condition(tabla)}"
+    )
+    valores = [(str(renglon[0]), *(search_key(valor) for valor in renglon[1:])) for renglon in cursor_new.fetchall()]
+    if not valores:
+        return
+    asignaciones = ", ".join(f"{llave} = v.{llave}" for llave in llaves)
+    execute_values(
+        cursor_new,
+        f"UPDATE {nombre} AS e SET {asignaciones} FROM (VALUES %s) AS v (id, {', '.join(llaves)}) WHERE e.id = v.id::uuid",
+        valores,
+        page_size=LOTE,
+    )
+
+
+def copy_text(valor) -> str:
+    """Convertir un valor al formato de texto de COPY"""
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, bool):
+        return "t" if valor else "f"
+    if isinstance(valor, (bytes, memoryview)):
+        return "\\\\x" + bytes(valor).hex()
+    if isinstance(valor, (datetime, date, datetime_time)):
+        return valor.isoformat()
+    if isinstance(valor, str):
+        return valor.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return str(valor)
+
+
+def copy_rows(cursor_new, tabla_temporal: str, columnas: list, rows: list) -> None:
+    """Cargar un lote de registros a la tabla temporal con COPY FROM STDIN"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_text(valor) for valor in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor_new.copy_expert(f"COPY {tabla_temporal} ({', '.join(columnas)}) FROM STDIN", buffer)
+
+
+def copiar_tabla(conn_old, conn_new, tabla: dict) -> tuple[int, int, int, float]:
+    """Copiar una tabla de la base de datos ANTERIOR a la NUEVA, entrega leídos, insertados, sin padre y segundos"""
+    inicio = time.perf_counter()
+    nombre = tabla["tabla"]
+    columnas = staged_columns(tabla)
+    orphans_select = build_orphans_select(tabla)
+    insert_select = build_insert_select(tabla)
+    leidos = 0
+    insertados = 0
+    sin_padre = 0
+    # Crear la tabla temporal, sus registros se borran con cada commit
+    with conn_new.cursor() as cursor_new:
+        cursor_new.execute(build_create_staging(tabla))
     conn_new.commit()
-    # Mensaje final
-    return f"  {contador} oficinas copiadas."
-
-
-def copiar_cit_categorias(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_categorias de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute(
-            """
-            SELECT
-                clave, nombre,
-                estatus, creado, modificado
-            FROM
-                cit_categorias
-            ORDER BY
-                clave ASC
-        """
-        )
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar datos en la tabla cit_categorias en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO cit_categorias (id,
-            clave, nombre,
-            estatus, creado, modificado, es_activo)
-        VALUES (%s,
-            %s, %s,
-            %s, %s, %s, true)
+    # Leer con un cursor del lado del servidor para no traer toda la tabla a memoria
+    with conn_old.cursor(name=f"migrar_{nombre}") as cursor_old:
+        cursor_old.itersize = LOTE
+        try:
+            cursor_old.execute(build_select_old(tabla))
+        except Exception as error:
+            raise Exception(f"Error al leer {nombre} de la BD ANTERIOR: {error}")
+        # Bucle por lotes: COPY a la tabla temporal e INSERT ... SELECT a la tabla NUEVA
+        while True:
+            rows = cursor_old.fetchmany(LOTE)
+            if not rows:
+                break
+            try:
+                with conn_new.cursor() as cursor_new:
+                    copy_rows(cursor_new, f"tmp_{nombre}", columnas, rows)
+                    cursor_new.execute(orphans_select)
+                    sin_padre += cursor_new.fetchone()[1]
+                    cursor_new.execute(insert_select)
+                    insertados += cursor_new.rowcount
+                    rebuild_occupancy_days(cursor_new, occupancy_days(cursor_new, tabla))
+                    fill_search_keys(cursor_new, tabla)
+                conn_new.commit()
+            except Exception as error:
+                conn_new.rollback()
+                raise Exception(f"Error al insertar {nombre} en la BD NUEVA: {error}")
+            leidos += len(rows)
+    conn_old.commit()
+    return leidos, insertados, sin_padre, time.perf_counter() - inicio
+
+
+def read_checkpoint(conn_new, nombre: str) -> tuple[datetime, int]:
+    """Leer la marca (modificado, id) de la última sincronización de la tabla"""
+    with conn_new.cursor() as cursor_new:
+        cursor_new.execute(f"SELECT modificado, id_anterior FROM {PUNTOS_CONTROL} WHERE tabla = %s", (nombre,))
+        renglon = cursor_new.fetchone()
+    if renglon is None:
+        return MARCA_INICIAL
+    return renglon[0], renglon[1]
+
+
+def sincronizar_tabla(conn_old, conn_new, tabla: dict) -> tuple[int, int, int, int, float]:
+    """Sincronizar los registros modificados desde la marca, entrega leídos, actualizados, insertados, sin padre y segundos
+
+    Se lee desde la marca menos SINCRONIZAR_MARGEN. Si hay registros sin padre, la marca se queda en el primero de ellos
+    para volver a leerlos en la siguiente sincronización, cuando su padre ya esté en la NUEVA
     """
-    try:
-        for row in rows:
-            clave = row[0]  # La clave es la primer columna
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM cit_categorias WHERE clave = %s", (clave,))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {clave}: {error}")
-    # Confirmar los cambios
+    inicio = time.perf_counter()
+    nombre = tabla["tabla"]
+    columnas = staged_columns(tabla) + ["renglon"]
+    orphans_select = build_orphans_select(tabla)
+    update_select = build_update_select(tabla)
+    insert_select = build_insert_select(tabla)
+    leidos = 0
+    actualizados = 0
+    insertados = 0
+    sin_padre = 0
+    # Crear la tabla temporal y tomar la marca de la última sincronización
+    with conn_new.cursor() as cursor_new:
+        cursor_new.execute(build_create_staging(tabla))
     conn_new.commit()
-    # Mensaje final
-    return f"  {contador} cit_categorias copiados."
+    marca = read_checkpoint(conn_new, nombre)
+    primero_sin_padre = None
+    # Leer con un cursor del lado del servidor solo lo modificado desde la marca menos el margen
+    with conn_old.cursor(name=f"sincronizar_{nombre}") as cursor_old:
+        cursor_old.itersize = LOTE
+        try:
+            cursor_old.execute(build_select_old(tabla, incremental=True), (marca[0] - SINCRONIZAR_MARGEN,))
+        except Exception as error:
+            raise Exception(f"Error al leer {nombre} de la BD ANTERIOR: {error}")
+        # Bucle por lotes: COPY, UPDATE de los que existen, INSERT de los nuevos y la marca, en una sola transacción
+        while True:
+            rows = cursor_old.fetchmany(LOTE)
+            if not rows:
+                break
+            try:
+                with conn_new.cursor() as cursor_new:
+                    renglones = [row[:-2] + (numero,) for numero, row in enumerate(rows)]
+                    copy_rows(cursor_new, f"tmp_{nombre}", columnas, renglones)
+                    cursor_new.execute(orphans_select)
+                    renglon, cantidad = cursor_new.fetchone()
+                    sin_padre += cantidad
+                    if cantidad > 0 and primero_sin_padre is None:
+                        primero_sin_padre = tuple(rows[renglon][-2:])
+                    # Las citas que se actualizan pueden cambiar de oficina o fecha, contar donde estaban y donde quedan
+                    dias = occupancy_days(cursor_new, tabla)
+                    cursor_new.execute(update_select)
+                    actualizados += cursor_new.rowcount
+                    cursor_new.execute(insert_select)
+                    insertados += cursor_new.rowcount
+                    rebuild_occupancy_days(cursor_new, dias | occupancy_days(cursor_new, tabla))
+                    fill_search_keys(cursor_new, tabla)
+                    # La marca avanza al último leído, salvo que haya uno sin padre, entonces no pasa de él
+                    if primero_sin_padre is None:
+                        marca = max(marca, tuple(rows[-1][-2:]))
+                    else:
+                        marca = primero_sin_padre
+                    cursor_new.execute(
+                        f"""
+                        INSERT INTO {PUNTOS_CONTROL} (tabla, modificado, id_anterior, actualizado)
+                        VALUES (%s, %s, %s, now())
+                        ON CONFLICT (tabla) DO UPDATE
+                        SET modificado = EXCLUDED.modificado, id_anterior = EXCLUDED.id_anterior, actualizado = now()
+                        """,
+                        (nombre, *marca),
+                    )
+                conn_new.commit()
+            except Exception as error:
+                conn_new.rollback()
+                raise Exception(f"Error al sincronizar {nombre} en la BD NUEVA: {error}")
+            leidos += len(rows)
+    conn_old.commit()
+    return leidos, actualizados, insertados, sin_padre, time.perf_counter() - inicio
+
+
+def conectar_anterior():
+    """Conectar a la base de datos ANTERIOR"""
+    return psycopg2.connect(dbname=OLD_DB_NAME, user=OLD_DB_USER, password=OLD_DB_PASS, host=OLD_DB_HOST, port=OLD_DB_PORT)
+
+
+def conectar_nueva():
+    """Conectar a la base de datos NUEVA"""
+    return psycopg2.connect(dbname=NEW_DB_NAME, user=NEW_DB_USER, password=NEW_DB_PASS, host=NEW_DB_HOST, port=NEW_DB_PORT)
+
+
+def dependencies(tabla: dict) -> set:
+    """Tablas que se deben copiar antes, las tablas padre que también se copian"""
+    nombres = {otra["tabla"] for otra in TABLAS}
+    return {padre for _, padre, _ in tabla.get("llaves_foraneas", ()) if padre in nombres and padre != tabla["tabla"]}
+
+
+def copiar_tabla_proceso(nombre: str) -> tuple[str, int, int, int, float]:
+    """Copiar una tabla en un proceso aparte, con sus propias conexiones"""
+    tabla = next(tabla for tabla in TABLAS if tabla["tabla"] == nombre)
+    conn_old = conectar_anterior()
+    conn_new = conectar_nueva()
+    try:
+        leidos, insertados, sin_padre, segundos = copiar_tabla(conn_old, conn_new, tabla)
+    finally:
+        conn_old.close()
+        conn_new.close()
+    return nombre, leidos, insertados, sin_padre, segundos
 
 
-def copiar_cit_servicios(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_servicios de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute(
-            """
-                SELECT
-                    cit_categorias.clave AS cit_categoria_clave,
-                    cit_servicios.clave,
-                    cit_servicios.descripcion,
-                    cit_servicios.duracion,
-                    cit_servicios.documentos_limite,
-                    cit_servicios.desde,
-                    cit_servicios.hasta,
-                    cit_servicios.dias_habilitados,
-                    cit_servicios.estatus,
-                    cit_servicios.creado,
-                    cit_servicios.modificado
-                FROM
-                    cit_servicios
-                    JOIN cit_categorias ON cit_servicios.cit_categoria_id = cit_categorias.id
-            """,
-        )
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO cit_servicios (id,
-            cit_categoria_id,
-            clave, descripcion, duracion, documentos_limite,
-            desde, hasta, dias_habilitados,
-            estatus, creado, modificado, es_activo)
-        VALUES (%s,
-            (SELECT id FROM cit_categorias WHERE clave = %s),
-            %s, %s, %s, %s,
-            %s, %s, %s,
-            %s, %s, %s, true)
-    """
-    try:
-        for row in rows:
-            cit_servicio_clave = row[1]  # La clave del servicio es la segunda columna
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM cit_servicios WHERE clave = %s", (cit_servicio_clave,))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {cit_servicio_clave}: {error}")
-    # Confirmar los cambios
-    conn_new.commit()
-    # Mensaje final
-    return f"  {contador} cit_servicios copiados."
+migrar = Typer()
 
 
-def copiar_cit_oficinas_servicios(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_oficinas_servicios de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute(
-            """
-                SELECT
-                    cit_servicios.clave AS cit_servicio_clave,
-                    oficinas.clave AS oficina_clave,
-                    cit_oficinas_servicios.descripcion,
-                    cit_oficinas_servicios.estatus,
-                    cit_oficinas_servicios.creado,
-                    cit_oficinas_servicios.modificado
-                FROM
-                    cit_oficinas_servicios
-                    JOIN cit_servicios ON cit_oficinas_servicios.cit_servicio_id = cit_servicios.id
-                    JOIN oficinas ON cit_oficinas_servicios.oficina_id = oficinas.id
-                ORDER BY cit_oficinas_servicios.id ASC
-            """,
+@migrar.command()
+def copiar(workers: int = 1):
+    """Copiar registros de la base de datos ANTERIOR a la NUEVA, con --workers para copiar tablas en paralelo"""
+    console = Console()
+    inicio = time.perf_counter()
+    resultados = {}
+
+    def mostrar(nombre: str, leidos: int, insertados: int, sin_padre: int, segundos: float):
+        """Mostrar y guardar el resultado de una tabla"""
+        resultados[nombre] = segundos
+        por_segundo = leidos / segundos if segundos > 0 else 0
+        console.print(
+            f"[green]  {insertados} {nombre} copiados de {leidos} leídos "
+            f"en {segundos:.1f} s ({por_segundo:.0f} registros/s).[/green]"
         )
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO cit_oficinas_servicios (id,
-            cit_servicio_id,
-            oficina_id,
-            descripcion,
-            estatus, creado, modificado, es_activo)
-        VALUES (%s,
-            (SELECT id FROM cit_servicios WHERE clave = %s),
-            (SELECT id FROM oficinas WHERE clave = %s),
-            %s,
-            %s, %s, %s, true)
-    """
-    try:
-        for row in rows:
-            cit_servicio_clave = row[0]  # La clave del servicio es la primer columna
-            oficina_clave = row[1]  # La clave de la oficina es la segunda columna
-            # Si ya existe un registro con cit_servicio_id y oficina_id, omitir
-            cursor_new.execute(
-                """
-                SELECT id FROM cit_oficinas_servicios
-                WHERE cit_servicio_id = (SELECT id FROM cit_servicios WHERE clave = %s)
-                AND oficina_id = (SELECT id FROM oficinas WHERE clave = %s)
-                """,
-                (cit_servicio_clave, oficina_clave),
-            )
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {cit_servicio_clave} en {oficina_clave}: {error}")
-    # Confirmar los cambios
-    conn_new.commit()
-    # Mensaje final
-    return f"  {contador} cit_oficinas_servicios copiados."
-
-
-def copiar_cit_clientes(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_clientes de la base de datos ANTERIOR a la NUEVA"""
-    # Inicializar limit y offset para paginar la consulta de la base de datos ANTERIOR
-    limit = 1000
-    offset = 0
-    contador = 0
-    # Bucle para leer e insertar registros en lotes
-    while True:
-        # Leer registros en la base de datos ANTERIOR
-        try:
-            cursor_old.execute(
-                """
-                    SELECT
-                        nombres, apellido_primero, apellido_segundo, curp, telefono, email,
-                        contrasena_md5, contrasena_sha256, renovacion, limite_citas_pendientes,
-                        estatus, creado, modificado
-                    FROM
-                        cit_clientes
-                    LIMIT %s OFFSET %s
-                """,
-                (limit, offset),
-            )
-            rows = cursor_old.fetchall()
-        except Exception as error:
-            raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-        # Si no hay más registros, salir del ciclo
-        if not rows:
-            break
-        # Insertar registros en la base de datos NUEVA
-        insert_query = """
-            INSERT INTO cit_clientes
-                (id, nombres, apellido_primero, apellido_segundo, curp, telefono, email,
-                contrasena_md5, contrasena_sha256, renovacion, limite_citas_pendientes,
-                estatus, creado, modificado,
-                autoriza_mensajes, enviar_boletin,
-                es_adulto_mayor, es_mujer, es_identidad, es_discapacidad, es_personal_interno)
-            VALUES
-                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                false, false,
-                false, false, false, false, false)
-        """
-        try:
-            for row in rows:
-                email = row[5]  # El email es la sexta columna
-                # Consultar si el registro ya existe
-                cursor_new.execute("SELECT id FROM cit_clientes WHERE email = %s", (email,))
-                if cursor_new.fetchone():
-                    continue  # Ya existe, se omite
-                # Insertar
-                new_id = str(uuid.uuid4())
-                cursor_new.execute(insert_query, (new_id, *row))
-                contador += 1
-        except Exception as error:
-            raise Exception(f"Error al insertar {email}: {error}")
-        # Confirmar los cambios
-        conn_new.commit()
-        # Incrementar offset para la siguiente página
-        offset += limit
-    # Mensaje final
-    return f"  {contador} cit_clientes copiados."
-
-
-def copiar_cit_clientes_recuperaciones(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_clientes_recuperaciones de la base de datos ANTERIOR a la NUEVA"""
-    # Inicializar limit y offset para paginar la consulta de la base de datos ANTERIOR
-    limit = 1000
-    offset = 0
-    contador = 0
-    # Bucle para leer e insertar registros en lotes
-    while True:
-        # Leer registros en la base de datos ANTERIOR
-        try:
-            cursor_old.execute(
-                """
-                    SELECT
-                        cit_clientes_recuperaciones.id as id_original,
-                        cit_clientes.email,
-                        cit_clientes_recuperaciones.expiracion,
-                        cit_clientes_recuperaciones.cadena_validar,
-                        cit_clientes_recuperaciones.mensajes_cantidad,
-                        cit_clientes_recuperaciones.ya_recuperado,
-                        cit_clientes_recuperaciones.estatus,
-                        cit_clientes_recuperaciones.creado,
-                        cit_clientes_recuperaciones.modificado
-                    FROM
-                        cit_clientes_recuperaciones
-                        JOIN cit_clientes ON cit_clientes_recuperaciones.cit_cliente_id = cit_clientes.id
-                    ORDER BY cit_clientes_recuperaciones.id ASC
-                    LIMIT %s OFFSET %s
-                """,
-                (limit, offset),
-            )
-            rows = cursor_old.fetchall()
-        except Exception as error:
-            raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-        # Si no hay más registros, salir del ciclo
-        if not rows:
-            break
-        # Insertar registros en la base de datos NUEVA
-        insert_query = """
-            INSERT INTO cit_clientes_recuperaciones (id, id_original,
-                cit_cliente_id,
-                expiracion, cadena_validar, mensajes_cantidad, ya_recuperado,
-                estatus, creado, modificado)
-            VALUES (%s, %s,
-                (SELECT id FROM cit_clientes WHERE email = %s),
-                %s, %s, %s, %s,
-                %s, %s, %s)
-        """
-        try:
-            for row in rows:
-                id_original = row[0]  # El id_original es la primer columna
-                # Consultar si el registro ya existe
-                cursor_new.execute("SELECT id FROM cit_clientes_recuperaciones WHERE id_original = %s", (id_original,))
-                if cursor_new.fetchone():
-                    continue  # Ya existe, se omite
-                # Insertar
-                new_id = str(uuid.uuid4())
-                cursor_new.execute(insert_query, (new_id, *row))
-                contador += 1
-        except Exception as error:
-            raise Exception(f"Error al insertar {id_original}: {error}")
-        # Confirmar los cambios
-        conn_new.commit()
-        # Incrementar offset para la siguiente página
-        offset += limit
-    # Mensaje final
-    return f"  {contador} cit_clientes_recuperaciones copiados."
-
-
-def copiar_cit_clientes_registros(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_clientes_registros de la base de datos ANTERIOR a la NUEVA"""
-    # Inicializar limit y offset para paginar la consulta de la base de datos ANTERIOR
-    limit = 1000
-    offset = 0
-    contador = 0
-    # Bucle para leer e insertar registros en lotes
-    while True:
-        # Leer registros en la base de datos ANTERIOR
-        try:
-            cursor_old.execute(
-                """
-                    SELECT
-                        id AS id_original,
-                        nombres,
-                        apellido_primero,
-                        apellido_segundo,
-                        curp,
-                        telefono,
-                        email,
-                        expiracion,
-                        cadena_validar,
-                        mensajes_cantidad,
-                        ya_registrado,
-                        estatus,
-                        creado,
-                        modificado
-                    FROM
-                        cit_clientes_registros
-                    ORDER BY cit_clientes_registros.id ASC
-                    LIMIT %s OFFSET %s
-                """,
-                (limit, offset),
-            )
-            rows = cursor_old.fetchall()
-        except Exception as error:
-            raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-        # Si no hay más registros, salir del ciclo
-        if not rows:
-            break
-        # Insertar registros en la base de datos NUEVA
-        insert_query = """
-            INSERT INTO cit_clientes_registros (id, id_original,
-                nombres, apellido_primero, apellido_segundo, curp, telefono, email,
-                expiracion, cadena_validar, mensajes_cantidad, ya_registrado,
-                estatus, creado, modificado)
-            VALUES (%s, %s,
-                %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s,
-                %s, %s, %s)
-        """
-        try:
-            for row in rows:
-                id_original = row[0]  # El id_original es la primer columna
-                # Consultar si el registro ya existe
-                cursor_new.execute("SELECT id FROM cit_clientes_registros WHERE id_original = %s", (id_original,))
-                if cursor_new.fetchone():
-                    continue  # Ya existe, se omite
-                # Insertar
-                new_id = str(uuid.uuid4())
-                cursor_new.execute(insert_query, (new_id, *row))
-                contador += 1
-        except Exception as error:
-            raise Exception(f"Error al insertar {id_original}: {error}")
-        # Confirmar los cambios
-        conn_new.commit()
-        # Incrementar offset para la siguiente página
-        offset += limit
-    # Mensaje final
-    return f"  {contador} cit_clientes_registros copiados."
-
-
-def copiar_cit_citas(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla cit_citas de la base de datos ANTERIOR a la NUEVA"""
-    # Inicializar limit y offset para paginar la consulta de la base de datos ANTERIOR
-    limit = 1000
-    offset = 0
-    contador = 0
-    # Bucle para leer e insertar registros en lotes
-    while True:
-        # Leer registros en la base de datos ANTERIOR
-        try:
-            cursor_old.execute(
-                """
-                    SELECT
-                        cit_citas.id as id_original,
-                        cit_clientes.email,
-                        cit_servicios.clave AS cit_servicio_clave,
-                        oficinas.clave AS oficina_clave,
-                        cit_citas.inicio,
-                        cit_citas.termino,
-                        cit_citas.notas,
-                        cit_citas.estado,
-                        cit_citas.cancelar_antes,
-                        cit_citas.asistencia,
-                        cit_citas.codigo_asistencia,
-                        cit_citas.estatus,
-                        cit_citas.creado,
-                        cit_citas.modificado
-                    FROM
-                        cit_citas
-                        JOIN cit_clientes ON cit_citas.cit_cliente_id = cit_clientes.id
-                        JOIN cit_servicios ON cit_citas.cit_servicio_id = cit_servicios.id
-                        JOIN oficinas ON cit_citas.oficina_id = oficinas.id
-                    ORDER BY cit_citas.id ASC
-                    LIMIT %s OFFSET %s
-                """,
-                (limit, offset),
-            )
-            rows = cursor_old.fetchall()
-        except Exception as error:
-            raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-        # Si no hay más registros, salir del ciclo
-        if not rows:
-            break
-        # Insertar registros en la base de datos NUEVA
-        insert_query = """
-            INSERT INTO cit_citas (id, id_original,
-                cit_cliente_id, cit_servicio_id, oficina_id,
-                inicio, termino, notas, estado, cancelar_antes,
-                asistencia, codigo_asistencia, codigo_acceso_id, codigo_acceso_imagen,
-                estatus, creado, modificado)
-            VALUES (%s, %s,
-                (SELECT id FROM cit_clientes WHERE email = %s),
-                (SELECT id FROM cit_servicios WHERE clave = %s),
-                (SELECT id FROM oficinas WHERE clave = %s),
-                %s, %s, %s, %s, %s,
-                %s, %s, NULL, NULL,
-                %s, %s, %s)
-        """
+        if sin_padre > 0:
+            console.print(f"[yellow]  {sin_padre} {nombre} no se copiaron porque su padre no está en la BD NUEVA.[/yellow]")
+
+    # Con un solo worker, copiar en este proceso en el orden de TABLAS
+    if workers <= 1:
         try:
-            for row in rows:
-                id_original = row[0]  # El id_original es la primer columna
-                # Consultar si el registro ya existe
-                cursor_new.execute("SELECT id FROM cit_citas WHERE id_original = %s", (id_original,))
-                if cursor_new.fetchone():
-                    continue  # Ya existe, se omite
-                # Insertar
-                new_id = str(uuid.uuid4())
-                cursor_new.execute(insert_query, (new_id, *row))
-                contador += 1
+            conn_old = conectar_anterior()
         except Exception as error:
-            raise Exception(f"Error al insertar {id_original}: {error}")
-        # Confirmar los cambios
-        conn_new.commit()
-        # Incrementar offset para la siguiente página
-        offset += limit
-    # Mensaje final
-    return f"  {contador} cit_citas copiados."
-
-
-def copiar_pag_tramites_servicios(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla pag_tramites_servicios de la base de datos ANTERIOR a la NUEVA"""
-    # Leer registros en la base de datos ANTERIOR
-    try:
-        cursor_old.execute("SELECT clave, descripcion, costo, url, estatus, creado, modificado FROM pag_tramites_servicios")
-        rows = cursor_old.fetchall()
-    except Exception as error:
-        raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-    # Continuar solo si se leyeron registros
-    if not rows:
-        raise Exception("No hay registros en la base de datos ANTERIOR.")
-    # Insertar registros en la base de datos NUEVA
-    contador = 0
-    insert_query = """
-        INSERT INTO pag_tramites_servicios (id, clave, descripcion, costo, url, estatus, creado, modificado, es_activo)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, true)
-    """
-    try:
-        for row in rows:
-            clave = row[0]  # La clave es la primer columna
-            # Consultar si el registro ya existe
-            cursor_new.execute("SELECT id FROM pag_tramites_servicios WHERE clave = %s", (clave,))
-            if cursor_new.fetchone():
-                continue  # Ya existe, se omite
-            # Insertar
-            new_id = str(uuid.uuid4())
-            cursor_new.execute(insert_query, (new_id, *row))
-            contador += 1
-    except Exception as error:
-        raise Exception(f"Error al insertar {clave}: {error}")
-    # Confirmar los cambios
-    conn_new.commit()
-    # Mensaje final
-    return f"  {contador} pag_tramites_servicios copiados."
-
-
-def copiar_pag_pagos(conn_old, cursor_old, conn_new, cursor_new) -> str:
-    """Copiar tabla pag_pagos de la base de datos ANTERIOR a la NUEVA"""
-    # Inicializar limit y offset para paginar la consulta de la base de datos ANTERIOR
-    limit = 1000
-    offset = 0
-    contador = 0
-    # Bucle para leer e insertar registros en lotes
-    while True:
-        # Leer registros en la base de datos ANTERIOR
+            console.print(f"[red]Error al conectar a la BD ANTERIOR:[/red] {error}")
+            return
         try:
-            cursor_old.execute(
-                """
-                    SELECT
-                        pag_pagos.id as id_original,
-                        autoridades.clave AS autoridad_clave,
-                        distritos.clave AS distrito_clave,
-                        cit_clientes.email,
-                        pag_tramites_servicios.clave AS pag_tramite_servicio_clave,
-                        pag_pagos.caducidad,
-                        pag_pagos.cantidad,
-                        pag_pagos.descripcion,
-                        pag_pagos.estado,
-                        pag_pagos.email,
-                        pag_pagos.folio,
-                        pag_pagos.resultado_tiempo,
-                        pag_pagos.resultado_xml,
-                        pag_pagos.total,
-                        pag_pagos.ya_se_envio_comprobante,
-                        pag_pagos.estatus,
-                        pag_pagos.creado,
-                        pag_pagos.modificado
-                    FROM
-                        pag_pagos
-                        JOIN autoridades ON pag_pagos.autoridad_id = autoridades.id
-                        JOIN distritos ON pag_pagos.distrito_id = distritos.id
-                        JOIN cit_clientes ON pag_pagos.cit_cliente_id = cit_clientes.id
-                        JOIN pag_tramites_servicios ON pag_pagos.pag_tramite_servicio_id = pag_tramites_servicios.id
-                    ORDER BY pag_pagos.id ASC
-                    LIMIT %s OFFSET %s
-                """,
-                (limit, offset),
-            )
-            rows = cursor_old.fetchall()
+            conn_new = conectar_nueva()
         except Exception as error:
-            raise Exception(f"Error al leer registros de la BD ANTERIOR: {error}")
-        # Si no hay más registros, salir del ciclo
-        if not rows:
-            break
-        # Insertar registros en la base de datos NUEVA
-        insert_query = """
-            INSERT INTO pag_pagos (id, id_original,
-                autoridad_id,
-                distrito_id,
-                cit_cliente_id,
-                pag_tramite_servicio_id,
-                caducidad, cantidad, descripcion, estado, email,
-                folio, resultado_tiempo, resultado_xml, total, ya_se_envio_comprobante,
-                estatus, creado, modificado)
-            VALUES (%s, %s,
-                (SELECT id FROM autoridades WHERE clave = %s),
-                (SELECT id FROM distritos WHERE clave = %s),
-                (SELECT id FROM cit_clientes WHERE email = %s),
-                (SELECT id FROM pag_tramites_servicios WHERE clave = %s),
-                %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s,
-                %s, %s, %s)
-        """
+            console.print(f"[red]Error al conectar a la BD NUEVA:[/red] {error}")
+            return
         try:
-            for row in rows:
-                id_original = row[0]  # El id_original es la primer columna
-                # Consultar si el registro ya existe
-                cursor_new.execute("SELECT id FROM pag_pagos WHERE id_original = %s", (id_original,))
-                if cursor_new.fetchone():
-                    continue  # Ya existe, se omite
-                # Insertar
-                new_id = str(uuid.uuid4())
-                cursor_new.execute(insert_query, (new_id, *row))
-                contador += 1
+            for tabla in TABLAS:
+                console.print(f"[cyan]Copiando tabla {tabla['tabla']}...[/cyan]")
+                mostrar(tabla["tabla"], *copiar_tabla(conn_old, conn_new, tabla))
         except Exception as error:
-            raise Exception(f"Error al insertar {id_original}: {error}")
-        # Confirmar los cambios
-        conn_new.commit()
-        # Incrementar offset para la siguiente página
-        offset += limit
-    # Mensaje final
-    return f"  {contador} pag_pagos copiados."
-
-
-migrar = Typer()
+            console.print(f"[yellow]{error}[/yellow]")
+            return
+        finally:
+            conn_old.close()
+            conn_new.close()
+
+    # Con varios workers, copiar en paralelo las tablas cuyas tablas padre ya se copiaron
+    else:
+        pendientes = {tabla["tabla"]: dependencies(tabla) for tabla in TABLAS}
+        terminadas = set()
+        en_proceso = {}
+        error_encontrado = None
+        with ProcessPoolExecutor(max_workers=workers) as ejecutor:
+            while pendientes or en_proceso:
+                # Enviar las tablas listas, si no ha habido errores
+                if error_encontrado is None:
+                    for nombre in [nombre for nombre, padres in pendientes.items() if padres <= terminadas]:
+                        console.print(f"[cyan]Copiando tabla {nombre}...[/cyan]")
+                        en_proceso[ejecutor.submit(copiar_tabla_proceso, nombre)] = nombre
+                        del pendientes[nombre]
+                if not en_proceso:
+                    break
+                # Esperar a que termine al menos una
+                listas, _ = wait(en_proceso, return_when=FIRST_COMPLETED)
+                for futuro in listas:
+                    nombre = en_proceso.pop(futuro)
+                    try:
+                        mostrar(*futuro.result())
+                        terminadas.add(nombre)
+                    except Exception as error:
+                        error_encontrado = error
+                        console.print(f"[yellow]{nombre}: {error}[/yellow]")
+        if error_encontrado is not None:
+            omitidas = ", ".join(pendientes)
+            if omitidas:
+                console.print(f"[yellow]No se copiaron: {omitidas}[/yellow]")
+            return
+
+    # Mostrar el resumen con el tiempo de cada tabla
+    console.print("[cyan]Resumen de tiempos:[/cyan]")
+    for nombre, segundos in resultados.items():
+        console.print(f"  {nombre}: {segundos:.1f} s")
+    console.print(f"[green]Tiempo total: {time.perf_counter() - inicio:.1f} s con {max(workers, 1)} workers[/green]")
 
 
 @migrar.command()
-def copiar():
-    """Copiar registros de la base de datos ANTERIOR a la NUEVA"""
+def sincronizar(reiniciar: bool = False):
+    """Sincronizar solo lo modificado desde la última vez, se puede volver a ejecutar y continúa donde se quedó"""
     console = Console()
+    inicio = time.perf_counter()
     try:
-        # Conectar a la base de datos ANTERIOR
-        conn_old = psycopg2.connect(
-            dbname=OLD_DB_NAME,
-            user=OLD_DB_USER,
-            password=OLD_DB_PASS,
-            host=OLD_DB_HOST,
-            port=OLD_DB_PORT,
-        )
-        cursor_old = conn_old.cursor()
+        conn_old = conectar_anterior()
     except Exception as error:
         console.print(f"[red]Error al conectar a la BD ANTERIOR:[/red] {error}")
         return
     try:
-        # Conectar a la base de datos NUEVA
-        conn_new = psycopg2.connect(
-            dbname=NEW_DB_NAME,
-            user=NEW_DB_USER,
-            password=NEW_DB_PASS,
-            host=NEW_DB_HOST,
-            port=NEW_DB_PORT,
-        )
-        cursor_new = conn_new.cursor()
+        conn_new = conectar_nueva()
     except Exception as error:
         console.print(f"[red]Error al conectar a la BD NUEVA:[/red] {error}")
         return
-    # Ejecutar las copias en el orden correcto
     try:
-        console.print("[cyan]Copiando tabla cit_dias_inhabiles...[/cyan]")
-        mensaje = copiar_cit_dias_inhabiles(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla distritos...[/cyan]")
-        mensaje = copiar_distritos(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla autoridades...[/cyan]")
-        mensaje = copiar_autoridades(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla domicilios...[/cyan]")
-        mensaje = copiar_domicilios(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla oficinas...[/cyan]")
-        mensaje = copiar_oficinas(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla cit_categorias...[/cyan]")
-        mensaje = copiar_cit_categorias(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla cit_servicios...[/cyan]")
-        mensaje = copiar_cit_servicios(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla cit_oficias_servicios...[/cyan]")
-        mensaje = copiar_cit_oficinas_servicios(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla cit_clientes...[/cyan]")
-        mensaje = copiar_cit_clientes(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla cit_clientes_recuperaciones...[/cyan]")
-        mensaje = copiar_cit_clientes_recuperaciones(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla cit_clientes_registros...[/cyan]")
-        mensaje = copiar_cit_clientes_registros(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla cit_citas...[/cyan]")
-        mensaje = copiar_cit_citas(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla pag_tramites_servicios...[/cyan]")
-        mensaje = copiar_pag_tramites_servicios(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
-        console.print("[cyan]Copiando tabla pag_pagos[/cyan]")
-        mensaje = copiar_pag_pagos(conn_old, cursor_old, conn_new, cursor_new)
-        console.print(f"[green]{mensaje}[/green]")
+        # Crear la tabla de las marcas si no existe, con reiniciar se borran y se revisa todo de nuevo
+        with conn_new.cursor() as cursor_new:
+            cursor_new.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {PUNTOS_CONTROL} (
+                    tabla VARCHAR(64) PRIMARY KEY,
+                    modificado TIMESTAMP NOT NULL,
+                    id_anterior BIGINT NOT NULL,
+                    actualizado TIMESTAMP NOT NULL DEFAULT now()
+                )
+                """
+            )
+            if reiniciar:
+                cursor_new.execute(f"DELETE FROM {PUNTOS_CONTROL}")
+        conn_new.commit()
+        # Sincronizar en el orden de TABLAS, para que los padres estén antes que los hijos
+        for tabla in TABLAS:
+            console.print(f"[cyan]Sincronizando tabla {tabla['tabla']}...[/cyan]")
+            leidos, actualizados, insertados, sin_padre, segundos = sincronizar_tabla(conn_old, conn_new, tabla)
+            console.print(
+                f"[green]  {leidos} {tabla['tabla']} modificados: {actualizados} actualizados "
+                f"y {insertados} insertados en {segundos:.1f} s.[/green]"
+            )
+            if sin_padre > 0:
+                console.print(
+                    f"[yellow]  {sin_padre} {tabla['tabla']} sin padre en la BD NUEVA, la marca se quedó en el primero; "
+                    "vuelva a ejecutar sincronizar.[/yellow]"
+                )
     except Exception as error:
         console.print(f"[yellow]{error}[/yellow]")
         return
-    # Cerrar las conexiones (si no se cerraron ya en las funciones)
-    try:
-        cursor_old.close()
+    finally:
         conn_old.close()
-        cursor_new.close()
         conn_new.close()
-    except Exception:
-        pass
+    console.print(f"[green]Tiempo total: {time.perf_counter() - inicio:.1f} s[/green]")
@@ -12,6 +12,7 @@ from pjecz_casiopea_flask.blueprints.modulos.models import Modulo
 from pjecz_casiopea_flask.blueprints.permisos.models import Permiso
 from pjecz_casiopea_flask.blueprints.roles.models import Rol
 from pjecz_casiopea_flask.lib.safe_string import safe_string
+from pjecz_casiopea_flask.lib.universal_mixin import UniversalMixin
 from pjecz_casiopea_flask.main import app
 
 PERMISOS_CSV = "seed/roles_permisos.csv"
@@ -36,9 +37,9 @@ def alimentar():
     # Consultar todos los módulos
     modulos = Modulo.query.order_by(Modulo.nombre).all()
 
-    # Leer el archivo CSV e insertar
+    # Leer el archivo CSV e insertar, con un solo commit al terminar
     contador = 0
-    with open(ruta, encoding="utf8") as puntero:
+    with open(ruta, encoding="utf8") as puntero, UniversalMixin.batch():
         for renglon in csv.DictReader(puntero):
             rol_nombre = safe_string(renglon.get("rol_nombre"), save_enie=True)
             estatus = renglon["estatus"]
@@ -10,6 +10,7 @@ from typer import Typer
 
 from pjecz_casiopea_flask.blueprints.roles.models import Rol
 from pjecz_casiopea_flask.lib.safe_string import safe_string
+from pjecz_casiopea_flask.lib.universal_mixin import UniversalMixin
 from pjecz_casiopea_flask.main import app
 
 ROLES_CSV = "seed/roles_permisos.csv"
@@ -31,9 +32,9 @@ def alimentar():
         console.print(f"[red]El archivo {ROLES_CSV} no existe.[/red]")
         return
 
-    # Leer el archivo CSV e insertar
+    # Leer el archivo CSV e insertar, con un solo commit al terminar
     contador = 0
-    with open(ruta, encoding="utf8") as puntero:
+    with open(ruta, encoding="utf8") as puntero, UniversalMixin.batch():
         for renglon in csv.DictReader(puntero):
             nombre = safe_string(renglon.get("rol_nombre"), save_enie=True)
             estatus = renglon.get("estatus")
@@ -14,9 +14,15 @@ from typer import Typer
 from pjecz_casiopea_flask.blueprints.autoridades.models import Autoridad
 from pjecz_casiopea_flask.blueprints.usuarios.models import Usuario
 from pjecz_casiopea_flask.config.extensions import pwd_context
-from pjecz_casiopea_flask.lib.cryptography_api_key import convert_string_to_fernet_key, decode_api_key, generate_api_key
+from pjecz_casiopea_flask.lib.cryptography_api_key import (
+    convert_string_to_fernet_key,
+    decode_api_key,
+    generate_api_key,
+    rotate_api_key,
+)
 from pjecz_casiopea_flask.lib.pwgen import generar_contrasena
-from pjecz_casiopea_flask.lib.safe_string import safe_clave, safe_email, safe_string
+from pjecz_casiopea_flask.lib.safe_string import safe_clave, safe_email, safe_string_many
+from pjecz_casiopea_flask.lib.universal_mixin import UniversalMixin
 from pjecz_casiopea_flask.main import app, task_queue
 
 # Cargar las variables de entorno
@@ -43,16 +49,16 @@ def alimentar():
         console.print(f"[red]El archivo {USUARIOS_CSV} no existe.[/red]")
         return
 
-    # Leer el archivo CSV e insertar
+    # Leer el archivo CSV e insertar, con un solo commit al terminar
     contador = 0
-    with open(ruta, encoding="utf8") as puntero:
+    with open(ruta, encoding="utf8") as puntero, UniversalMixin.batch():
         for renglon in csv.DictReader(puntero):
             autoridad_clave = safe_clave(renglon.get("autoridad_clave"))
             email = safe_email(renglon.get("email"))
-            nombres = safe_string(renglon.get("nombres"), save_enie=True)
-            apellido_paterno = safe_string(renglon.get("apellido_paterno"), save_enie=True)
-            apellido_materno = safe_string(renglon.get("apellido_materno"), save_enie=True)
-            puesto = safe_string(renglon.get("puesto"), save_enie=True)
+            nombres, apellido_paterno, apellido_materno, puesto = safe_string_many(
+                (renglon.get(columna) for columna in ("nombres", "apellido_paterno", "apellido_materno", "puesto")),
+                save_enie=True,
+            )
             estatus = renglon.get("estatus")
             autoridad = Autoridad.query.filter(Autoridad.clave == autoridad_clave).first()
             if autoridad is None:
@@ -114,6 +120,23 @@ def decodificar_api_key(api_key: str):
     console.print(decode_api_key(api_key))
 
 
+@usuarios.command()
+def rotar_api_keys():
+    """Cifrar de nuevo las API Keys con la primera llave de FERNET_KEY, para después quitar la llave anterior"""
+    console = Console()
+    contador = 0
+    with UniversalMixin.batch():
+        for usuario in Usuario.query.filter(Usuario.api_key != "").all():
+            api_key = rotate_api_key(usuario.api_key)
+            if api_key == "":
+                console.print(f"[yellow]La API Key de {usuario.email} no es válida con ninguna llave, se omite[/yellow]")
+                continue
+            usuario.api_key = api_key
+            usuario.save()
+            contador += 1
+    console.print(f"[green]Se rotaron {contador} API Keys[/green]")
+
+
 @usuarios.command()
 def nueva_api_key(email: str, dias: int = 365):
     """Nueva API Key"""
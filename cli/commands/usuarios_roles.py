@@ -12,6 +12,7 @@ from pjecz_casiopea_flask.blueprints.roles.models import Rol
 from pjecz_casiopea_flask.blueprints.usuarios.models import Usuario
 from pjecz_casiopea_flask.blueprints.usuarios_roles.models import UsuarioRol
 from pjecz_casiopea_flask.lib.safe_string import safe_email, safe_string
+from pjecz_casiopea_flask.lib.universal_mixin import UniversalMixin
 from pjecz_casiopea_flask.main import app
 
 USUARIOS_ROLES_CSV = "seed/usuarios_roles.csv"
@@ -33,9 +34,9 @@ def alimentar():
         console.print(f"[red]El archivo {USUARIOS_ROLES_CSV} no existe.[/red]")
         return
 
-    # Leer el archivo CSV e insertar
+    # Leer el archivo CSV e insertar, con un solo commit al terminar
     contador = 0
-    with open(ruta, encoding="utf8") as puntero:
+    with open(ruta, encoding="utf8") as puntero, UniversalMixin.batch():
         for renglon in csv.DictReader(puntero):
             email = safe_email(renglon.get("email"))
             usuario = Usuario.query.filter(Usuario.email == email).first()
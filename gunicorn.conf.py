@@ -0,0 +1,14 @@
+"""
+Gunicorn, configuración para el worker de gevent
+
+El Dockerfile ejecuta la aplicación con un worker de gevent para que las conexiones de Socket.IO no ocupen hilos.
+psycopg2 es una extensión en C que bloquea mientras espera a PostgreSQL, con psycogreen espera con gevent y así una
+consulta lenta no detiene a las demás peticiones ni a los navegadores conectados.
+"""
+
+
+def post_fork(server, worker):
+    """Hacer cooperativo a psycopg2 en cada worker de gunicorn"""
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
@@ -6,9 +6,8 @@ from flask_wtf import FlaskForm
 from wtforms import BooleanField, SelectField, StringField, SubmitField
 from wtforms.validators import DataRequired, Length, Optional, Regexp
 
+from ...lib.catalog_cache import get_catalog_records
 from ...lib.safe_string import CLAVE_REGEXP
-from ..distritos.models import Distrito
-from ..materias.models import Materia
 
 
 class AutoridadForm(FlaskForm):
@@ -25,7 +24,5 @@ class AutoridadForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         """Inicializar y cargar opciones en distrito y materia"""
         super().__init__(*args, **kwargs)
-        self.distrito.choices = [
-            (d.id, d.nombre_corto) for d in Distrito.query.filter_by(estatus="A").order_by(Distrito.nombre_corto).all()
-        ]
-        self.materia.choices = [(m.id, m.nombre) for m in Materia.query.filter_by(estatus="A").order_by(Materia.nombre).all()]
+        self.distrito.choices = [(d.id, d.nombre_corto) for d in get_catalog_records("distritos", "nombre_corto")]
+        self.materia.choices = [(m.id, m.nombre) for m in get_catalog_records("materias", "nombre")]
@@ -7,12 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..distritos.models import Distrito
-from ..materias.models import Materia
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import AutoridadForm
@@ -141,22 +140,25 @@ def new():
             descripcion_corta=safe_string(form.descripcion_corta.data, save_enie=True),
             es_activo=form.es_activo.data,
         )
-        autoridad.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nueva Autoridad {autoridad.clave}"),
-            url=url_for("autoridades.detail", autoridad_id=autoridad.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            autoridad.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nueva Autoridad {autoridad.clave}"),
+                url=url_for("autoridades.detail", autoridad_id=autoridad.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("autoridades")
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     # Consultar el distrito NO DEFINIDO
-    distrito_no_definido = Distrito.query.filter_by(clave="ND").first()
+    distrito_no_definido = get_catalog_by_clave("distritos", "ND")
     if distrito_no_definido:
         form.distrito.data = str(distrito_no_definido.id)  # Es un SelectField
     # Consultar la materia NO DEFINIDA
-    materia_no_definida = Materia.query.filter_by(clave="ND").first()
+    materia_no_definida = get_catalog_by_clave("materias", "ND")
     if materia_no_definida:
         form.materia.data = str(materia_no_definida.id)  # Es un SelectField
     return render_template("autoridades/new.jinja2", form=form)
@@ -188,14 +190,16 @@ def edit(autoridad_id):
             autoridad.descripcion = safe_string(form.descripcion.data, save_enie=True)
             autoridad.descripcion_corta = safe_string(form.descripcion_corta.data, save_enie=True)
             autoridad.es_activo = form.es_activo.data
-            autoridad.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editada Autoridad {autoridad.clave}"),
-                url=url_for("autoridades.detail", autoridad_id=autoridad.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                autoridad.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editada Autoridad {autoridad.clave}"),
+                    url=url_for("autoridades.detail", autoridad_id=autoridad.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("autoridades")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = autoridad.clave
@@ -216,14 +220,16 @@ def delete(autoridad_id):
         abort(400)
     autoridad = Autoridad.query.get_or_404(autoridad_id)
     if autoridad.estatus == "A":
-        autoridad.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Autoridad {autoridad.clave}"),
-            url=url_for("autoridades.detail", autoridad_id=autoridad.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            autoridad.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Autoridad {autoridad.clave}"),
+                url=url_for("autoridades.detail", autoridad_id=autoridad.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("autoridades")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("autoridades.detail", autoridad_id=autoridad.id))
 
@@ -237,14 +243,16 @@ def recover(autoridad_id):
         abort(400)
     autoridad = Autoridad.query.get_or_404(autoridad_id)
     if autoridad.estatus == "B":
-        autoridad.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Autoridad {autoridad.clave}"),
-            url=url_for("autoridades.detail", autoridad_id=autoridad.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            autoridad.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Autoridad {autoridad.clave}"),
+                url=url_for("autoridades.detail", autoridad_id=autoridad.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("autoridades")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("autoridades.detail", autoridad_id=autoridad.id))
 
@@ -292,6 +300,7 @@ def toggle_es_activo_json(autoridad_id):
     # Cambiar es_activo a su opuesto y guardar
     autoridad.es_activo = not autoridad.es_activo
     autoridad.save()
+    bump_catalog_version("autoridades")
 
     # Entregar JSON
     return {
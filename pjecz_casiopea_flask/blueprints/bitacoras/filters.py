@@ -0,0 +1,19 @@
+"""
+Bitácoras, filtros
+"""
+
+from .models import Bitacora
+
+
+def filter_bitacoras(consulta, filtros: dict):
+    """Filtrar la consulta de Bitácoras con los filtros del DataTable, también sirve para exportar"""
+    # Primero filtrar por columnas propias
+    if "estatus" in filtros:
+        consulta = consulta.filter(Bitacora.estatus == filtros["estatus"])
+    else:
+        consulta = consulta.filter(Bitacora.estatus == "A")
+    if "modulo_id" in filtros:
+        consulta = consulta.filter(Bitacora.modulo_id == filtros["modulo_id"])
+    if "usuario_id" in filtros:
+        consulta = consulta.filter(Bitacora.usuario_id == filtros["usuario_id"])
+    return consulta
@@ -3,12 +3,16 @@ Bitácoras
 """
 
 import uuid
+from datetime import datetime
 
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import ForeignKey, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.functions import now
 
 from ...config.extensions import database
+from ...lib.audit_log import enqueue_audit_event
+from ...lib.partitions import add_default_partition
 from ...lib.universal_mixin import UniversalMixin
 
 
@@ -18,8 +22,15 @@ class Bitacora(database.Model, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "bitacoras"
 
-    # Clave primaria
+    # Índice para la paginación por llave (keyset) de los listados, particionada por mes con la columna creado
+    __table_args__ = (
+        Index("ix_bitacoras_creado_id", "creado", "id"),
+        {"postgresql_partition_by": "RANGE (creado)"},
+    )
+
+    # Clave primaria, incluye creado porque la llave de una tabla particionada debe contener la columna de partición
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    creado: Mapped[datetime] = mapped_column(primary_key=True, default=now(), server_default=now())
 
     # Claves foráneas
     modulo_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("modulos.id"))
@@ -31,6 +42,23 @@ class Bitacora(database.Model, UniversalMixin):
     descripcion: Mapped[str] = mapped_column(String(256))
     url: Mapped[str] = mapped_column(String(512))
 
+    def enqueue(self):
+        """Encolar para que el auditor lo escriba en segundo plano, en lugar de insertarlo en la petición"""
+        enqueue_audit_event(
+            self.__tablename__,
+            {
+                "modulo_id": self.modulo_id,
+                "usuario_id": self.usuario_id,
+                "descripcion": self.descripcion,
+                "url": self.url,
+            },
+        )
+        return self
+
     def __repr__(self):
         """Representación"""
         return f"<Bitacora {self.creado} {self.descripcion}>"
+
+
+# Crear la partición predeterminada junto con la tabla
+add_default_partition(Bitacora.__table__)
@@ -0,0 +1,41 @@
+"""
+Bitácoras, tareas en el fondo
+"""
+
+from ...lib.catalog_cache import get_catalog
+from ...lib.exceptions import MyAnyError
+from ...lib.exports import export_download_url, export_query
+from ...lib.tasks import set_task_error, set_task_progress
+from ..usuarios.models import Usuario
+from .filters import filter_bitacoras
+from .models import Bitacora
+
+# Columnas y encabezados de la exportación, el módulo se toma del catálogo en memoria
+EXPORTAR_COLUMNAS = (Bitacora.creado, Usuario.email, Bitacora.modulo_id, Bitacora.descripcion, Bitacora.url)
+EXPORTAR_ENCABEZADOS = ("Creado", "Usuario", "Módulo", "Descripción", "URL")
+
+
+def lanzar_exportar(filtros: dict, formato: str) -> str:
+    """Lanzar tarea en el fondo para exportar las bitácoras a un archivo CSV o XLSX"""
+    set_task_progress(0, "Se ha lanzado la tarea en el fondo para exportar las bitácoras")
+
+    # Tomar una sola vez el catálogo de módulos
+    modulos = get_catalog("modulos").por_id
+
+    # Convertir cada renglón, cambiando el id del módulo por su nombre
+    def convertir(renglon) -> tuple:
+        """Convertir el renglón de la consulta en el renglón del archivo"""
+        modulo = modulos.get(renglon.modulo_id)
+        return (renglon.creado, renglon.email, modulo.nombre if modulo else "", renglon.descripcion, renglon.url)
+
+    # Exportar, las bitácoras están particionadas por creado y se leen en ese orden
+    consulta = filter_bitacoras(Bitacora.query, filtros).join(Bitacora.usuario).order_by(Bitacora.creado, Bitacora.id)
+    try:
+        ruta, cantidad = export_query(consulta, EXPORTAR_COLUMNAS, EXPORTAR_ENCABEZADOS, convertir, "bitacoras", formato)
+    except MyAnyError as error:
+        mensaje_error = str(error)
+        set_task_error(mensaje_error)
+        return mensaje_error
+    mensaje_termino = f"Se han exportado {cantidad} bitácoras a {ruta.name}"
+    set_task_progress(100, mensaje_termino, ruta.name, export_download_url())
+    return mensaje_termino
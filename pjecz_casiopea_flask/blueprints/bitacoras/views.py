@@ -4,17 +4,35 @@ Bitácoras
 
 import json
 
-from flask import Blueprint, render_template, request, url_for
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.datatables import (
+    CONTEO_ESTIMADO,
+    count_datatable,
+    get_datatable_parameters,
+    output_datatable_json,
+    paginate_datatable_keyset,
+)
+from ...lib.exports import EXPORTACION_FORMATOS, EXPORTACION_SEGUNDOS, get_export_filters
+from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from ..usuarios.models import Usuario
+from .filters import filter_bitacoras
 from .models import Bitacora
 
 MODULO = "BITACORAS"
 
+# Perfil de carga del DataTable, solo las columnas que se usan para elaborar los datos
+DATATABLE_PERFIL = {
+    "columnas": (Bitacora.id, Bitacora.creado, Bitacora.usuario_id, Bitacora.modulo_id, Bitacora.descripcion, Bitacora.url),
+    "relaciones": {
+        Bitacora.usuario: (Usuario.id, Usuario.email),
+        Bitacora.modulo: (Modulo.id, Modulo.nombre),
+    },
+}
+
 bitacoras = Blueprint("bitacoras", __name__, template_folder="templates")
 
 
@@ -31,19 +49,10 @@ def datatable_json():
     # Tomar parámetros de Datatables
     draw, start, rows_per_page = get_datatable_parameters()
     # Consultar
-    consulta = Bitacora.query
-    # Primero filtrar por columnas propias
-    if "estatus" in request.form:
-        consulta = consulta.filter(Bitacora.estatus == request.form["estatus"])
-    else:
-        consulta = consulta.filter(Bitacora.estatus == "A")
-    if "modulo_id" in request.form:
-        consulta = consulta.filter(Bitacora.modulo_id == request.form["modulo_id"])
-    if "usuario_id" in request.form:
-        consulta = consulta.filter(Bitacora.usuario_id == request.form["usuario_id"])
+    consulta = filter_bitacoras(Bitacora.query, request.form)
     # Ordenar y paginar
-    registros = consulta.order_by(Bitacora.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, Bitacora, start, rows_per_page, DATATABLE_PERFIL)
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_ESTIMADO)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -67,7 +76,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @bitacoras.route("/bitacoras")
@@ -90,3 +99,27 @@ def list_active():
         filtros=json.dumps(filtros),
         titulo=titulo,
     )
+
+
+@bitacoras.route("/bitacoras/exportar/<formato>")
+@permission_required(MODULO, Permiso.ADMINISTRAR)
+def export(formato):
+    """Lanzar la tarea en el fondo para exportar las bitácoras a un archivo CSV o XLSX, con los filtros del listado"""
+    if formato not in EXPORTACION_FORMATOS:
+        abort(400)
+    comando = "bitacoras.tasks.lanzar_exportar"
+    # Si ya hay una exportación en proceso, mostrarla en lugar de lanzar otra
+    tarea = current_user.get_task_in_progress(comando)
+    if tarea is not None:
+        flash("Ya hay una exportación de bitácoras en proceso, espere a que termine", "warning")
+        return redirect(url_for("tareas.detail", tarea_id=tarea.id))
+    # Lanzar la tarea en el fondo
+    tarea = current_user.launch_task(
+        comando=comando,
+        mensaje=f"Exportando las bitácoras a {formato.upper()}",
+        filtros=get_export_filters(),
+        formato=formato,
+        job_timeout=EXPORTACION_SEGUNDOS,
+    )
+    flash(f"Se ha lanzado la tarea en el fondo para exportar las bitácoras a {formato.upper()}", "info")
+    return redirect(url_for("tareas.detail", tarea_id=tarea.id))
@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import CitCategoriaForm
@@ -136,14 +137,17 @@ def new():
         # Si es válido, guardar
         if es_valido:
             cit_categoria = CitCategoria(clave=clave, nombre=nombre, es_valido=form.es_activo.data)
-            cit_categoria.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nueva Categoria {cit_categoria.clave}"),
-                url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                cit_categoria.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nueva Categoria {cit_categoria.clave}"),
+                    url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("cit_categorias")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     return render_template("cit_categorias/new.jinja2", form=form)
@@ -181,14 +185,16 @@ def edit(cit_categoria_id):
             cit_categoria.clave = clave
             cit_categoria.nombre = nombre
             cit_categoria.es_activo = form.es_activo.data
-            cit_categoria.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Categoria {cit_categoria.clave}"),
-                url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                cit_categoria.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Categoria {cit_categoria.clave}"),
+                    url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("cit_categorias")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = cit_categoria.clave
@@ -206,14 +212,16 @@ def delete(cit_categoria_id):
         abort(400)
     cit_categoria = CitCategoria.query.get_or_404(cit_categoria_id)
     if cit_categoria.estatus == "A":
-        cit_categoria.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminada Categoría {cit_categoria.clave}"),
-            url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_categoria.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminada Categoría {cit_categoria.clave}"),
+                url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("cit_categorias")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id))
 
@@ -227,14 +235,16 @@ def recover(cit_categoria_id):
         abort(400)
     cit_categoria = CitCategoria.query.get_or_404(cit_categoria_id)
     if cit_categoria.estatus == "B":
-        cit_categoria.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperada Categoría {cit_categoria.clave}"),
-            url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_categoria.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperada Categoría {cit_categoria.clave}"),
+                url=url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("cit_categorias")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_categorias.detail", cit_categoria_id=cit_categoria.id))
 
@@ -255,6 +265,7 @@ def toggle_es_activo_json(cit_categoria_id):
     # Cambiar es_activo a su opuesto y guardar
     cit_categoria.es_activo = not cit_categoria.es_activo
     cit_categoria.save()
+    bump_catalog_version("cit_categorias")
 
     # Entregar JSON
     return {
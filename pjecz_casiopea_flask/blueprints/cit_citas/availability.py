@@ -0,0 +1,190 @@
+"""
+Cit Citas, disponibilidad
+
+Calcula las horas disponibles de una oficina y un servicio en un rango de fechas con un número fijo de consultas,
+sin importar cuántos días tenga el rango. Por cada día se arma un arreglo de ocupación con una celda por cada
+intervalo mínimo de tiempo, se suman las citas, se llenan las horas bloqueadas y se buscan en una sola pasada los
+inicios donde caben todas las celdas que ocupa el servicio.
+"""
+
+from array import array
+from datetime import date, datetime, time, timedelta
+from itertools import accumulate
+from math import gcd
+
+from sqlalchemy.sql import func
+
+from ...config.extensions import database
+from ..cit_dias_inhabiles.models import CitDiaInhabil
+from ..cit_horas_bloqueadas.models import CitHoraBloqueada
+from ..cit_servicios.models import CitServicio
+from ..oficinas.models import Oficina
+from .models import CitCita, CitCitaOcupacion
+
+CELDA_MINUTOS = 15
+DIAS_HABILITADOS_PREDETERMINADOS = "12345"  # De lunes a viernes, 0 es domingo y 6 es sábado
+
+
+def minutes_of(tiempo: time) -> int:
+    """Convertir una hora a minutos desde la medianoche"""
+    return tiempo.hour * 60 + tiempo.minute
+
+
+def consult_availability_data(oficina_id, cit_servicio_id, desde: date, hasta: date) -> tuple:
+    """Consultar la oficina, el servicio, los días inhábiles, las horas bloqueadas y las citas, cinco consultas en total"""
+    oficina = Oficina.query.get(oficina_id)
+    cit_servicio = CitServicio.query.get(cit_servicio_id)
+    dias_inhabiles = {
+        renglon.fecha
+        for renglon in CitDiaInhabil.query.with_entities(CitDiaInhabil.fecha)
+        .filter(CitDiaInhabil.fecha >= desde)
+        .filter(CitDiaInhabil.fecha <= hasta)
+        .filter(CitDiaInhabil.estatus == "A")
+    }
+    horas_bloqueadas = (
+        CitHoraBloqueada.query.with_entities(CitHoraBloqueada.fecha, CitHoraBloqueada.inicio, CitHoraBloqueada.termino)
+        .filter(CitHoraBloqueada.oficina_id == oficina_id)
+        .filter(CitHoraBloqueada.fecha >= desde)
+        .filter(CitHoraBloqueada.fecha <= hasta)
+        .filter(CitHoraBloqueada.estatus == "A")
+        .all()
+    )
+    citas = (
+        CitCita.query.with_entities(CitCita.inicio, CitCita.termino)
+        .filter(CitCita.oficina_id == oficina_id)
+        .filter(CitCita.inicio >= datetime.combine(desde, time.min))
+        .filter(CitCita.inicio < datetime.combine(hasta + timedelta(days=1), time.min))
+        .filter(CitCita.estado != "CANCELO")
+        .filter(CitCita.estatus == "A")
+        .all()
+    )
+    return oficina, cit_servicio, dias_inhabiles, horas_bloqueadas, citas
+
+
+def build_occupancy(
+    desde: date,
+    hasta: date,
+    apertura: int,
+    celdas: int,
+    celda_minutos: int,
+    limite: int,
+    horas_bloqueadas: list,
+    citas: list,
+) -> dict:
+    """Armar por día el arreglo de ocupación, sumando las citas y llenando las horas bloqueadas"""
+    ocupacion = {}
+    dia = desde
+    while dia <= hasta:
+        ocupacion[dia] = array("H", bytes(2 * celdas))
+        dia += timedelta(days=1)
+
+    def celdas_de(inicio: int, termino: int) -> range:
+        """Entregar el rango de celdas que toca un intervalo en minutos, recortado al horario de la oficina"""
+        primera = max((inicio - apertura) // celda_minutos, 0)
+        ultima = min(-(-(termino - apertura) // celda_minutos), celdas)
+        return range(primera, ultima)
+
+    # Sumar las citas, cada una ocupa un lugar en las celdas que toca
+    for inicio, termino in citas:
+        arreglo = ocupacion.get(inicio.date())
+        if arreglo is None:
+            continue
+        termino_minutos = minutes_of(termino.time()) if termino.date() == inicio.date() else 24 * 60
+        for celda in celdas_de(minutes_of(inicio.time()), termino_minutos):
+            arreglo[celda] += 1
+
+    # Llenar las horas bloqueadas para que no quede lugar
+    for fecha, inicio, termino in horas_bloqueadas:
+        arreglo = ocupacion.get(fecha)
+        if arreglo is None:
+            continue
+        for celda in celdas_de(minutes_of(inicio), minutes_of(termino)):
+            arreglo[celda] = max(arreglo[celda], limite)
+
+    return ocupacion
+
+
+def has_capacity(oficina, inicio: datetime, termino: datetime) -> bool:
+    """¿Hay lugar en la oficina para una cita? Consulta la ocupación materializada por llave, sin recorrer las citas"""
+    celdas = CitCitaOcupacion.cells(inicio, termino)
+    if not celdas:
+        return False
+    ocupacion_maxima = (
+        database.session.query(func.max(CitCitaOcupacion.cantidad))
+        .filter(CitCitaOcupacion.oficina_id == oficina.id)
+        .filter(CitCitaOcupacion.fecha == inicio.date())
+        .filter(CitCitaOcupacion.hora.in_([celda.time() for celda in celdas if celda.date() == inicio.date()]))
+        .scalar()
+    )
+    return (ocupacion_maxima or 0) < oficina.limite_personas
+
+
+def get_available_slots(oficina_id, cit_servicio_id, desde: date, hasta: date, ahora: datetime = None) -> dict:
+    """Entregar un diccionario con las fechas y la lista de horas de inicio disponibles en cada una"""
+    if ahora is None:
+        ahora = datetime.now()
+    disponibles = {}
+    if hasta < desde:
+        return disponibles
+
+    # Consultar todo lo necesario para el rango de fechas
+    oficina, cit_servicio, dias_inhabiles, horas_bloqueadas, citas = consult_availability_data(
+        oficina_id, cit_servicio_id, desde, hasta
+    )
+    if oficina is None or cit_servicio is None or oficina.limite_personas <= 0:
+        return disponibles
+
+    # Definir el horario en minutos, el del servicio si lo tiene, dentro del de la oficina
+    apertura = minutes_of(oficina.apertura)
+    cierre = minutes_of(oficina.cierre)
+    duracion = minutes_of(cit_servicio.duracion)
+    desde_servicio = max(apertura, minutes_of(cit_servicio.desde)) if cit_servicio.desde else apertura
+    hasta_servicio = min(cierre, minutes_of(cit_servicio.hasta)) if cit_servicio.hasta else cierre
+    if duracion <= 0 or cierre <= apertura:
+        return disponibles
+
+    # Definir el tamaño de la celda para que la duración y los horarios caigan en celdas completas
+    celda_minutos = gcd(CELDA_MINUTOS, duracion, desde_servicio - apertura)
+    celdas = -(-(cierre - apertura) // celda_minutos)
+    celdas_servicio = duracion // celda_minutos
+    primera = (desde_servicio - apertura) // celda_minutos
+    ultima = (hasta_servicio - apertura) // celda_minutos - celdas_servicio
+
+    # Días de la semana habilitados para el servicio
+    dias_habilitados = cit_servicio.dias_habilitados or DIAS_HABILITADOS_PREDETERMINADOS
+
+    # Armar la ocupación de todos los días del rango
+    ocupacion = build_occupancy(
+        desde,
+        hasta,
+        apertura,
+        celdas,
+        celda_minutos,
+        oficina.limite_personas,
+        horas_bloqueadas,
+        citas,
+    )
+
+    # Bucle por cada día
+    for dia, arreglo in ocupacion.items():
+        # Omitir los días inhábiles y los que no están habilitados para el servicio
+        if dia in dias_inhabiles or str(dia.isoweekday() % 7) not in dias_habilitados:
+            continue
+        # Acumular las celdas llenas, así la suma de un tramo se obtiene con una resta
+        llenas = array("H", accumulate((1 if valor >= oficina.limite_personas else 0 for valor in arreglo), initial=0))
+        # No ofrecer horas que ya pasaron
+        primera_del_dia = primera
+        if dia == ahora.date():
+            minutos_ahora = minutes_of(ahora.time())
+            primera_del_dia = max(primera, -(-(minutos_ahora - apertura) // celda_minutos))
+        # Una hora de inicio está disponible si no hay celdas llenas en las que ocupa el servicio
+        horas = []
+        for celda in range(primera_del_dia, ultima + 1):
+            if llenas[celda + celdas_servicio] == llenas[celda]:
+                minutos = apertura + celda * celda_minutos
+                horas.append(time(minutos // 60, minutos % 60))
+        if horas:
+            disponibles[dia] = horas
+
+    # Entregar
+    return disponibles
@@ -3,12 +3,13 @@ Cit Citas, modelos
 """
 
 import uuid
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 from typing import Optional
 
-from sqlalchemy import Enum, ForeignKey, String, Text
-from sqlalchemy.dialects.postgresql import BYTEA, UUID
+from sqlalchemy import Enum, ForeignKey, Index, String, Text, event, func, text, tuple_, update
+from sqlalchemy.dialects.postgresql import BYTEA, UUID, insert
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm.attributes import get_history
 
 from ...config.extensions import database
 from ...lib.universal_mixin import UniversalMixin
@@ -27,6 +28,12 @@ class CitCita(database.Model, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_citas"
 
+    # Índices para la paginación por llave (keyset) de los listados y para consultar las citas de una oficina por fecha
+    __table_args__ = (
+        Index("ix_cit_citas_creado_id", "creado", "id"),
+        Index("ix_cit_citas_oficina_id_inicio", "oficina_id", "inicio"),
+    )
+
     # Clave primaria
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
@@ -47,11 +54,186 @@ class CitCita(database.Model, UniversalMixin):
     asistencia: Mapped[bool] = mapped_column(default=False)
     codigo_asistencia: Mapped[Optional[str]] = mapped_column(String(6), default="000000")
     codigo_acceso_id: Mapped[Optional[int]]
-    codigo_acceso_imagen: Mapped[Optional[bytes]] = mapped_column(BYTEA)
+    codigo_acceso_imagen: Mapped[Optional[bytes]] = mapped_column(BYTEA, deferred=True)  # Se carga solo si se usa
 
     # Para controlar la migracion desde pjecz_citas_v2 se incluye el id_original
     id_original: Mapped[Optional[int]] = mapped_column(index=True)
 
+    @classmethod
+    def after_bulk_change_estatus(cls, ids: list, estatus_nuevo: str):
+        """Al eliminar o recuperar citas en bloque, restarlas o sumarlas a la ocupación"""
+        CitCitaOcupacion.add_citas(ids, -1 if estatus_nuevo == "B" else 1)
+
     def __repr__(self):
         """Representación"""
         return f"<CitCita {self.id}>"
+
+
+class CitCitaOcupacion(database.Model):
+    """CitCitaOcupacion, cantidad de citas por oficina, fecha y celda de tiempo, se mantiene al guardar las citas"""
+
+    CELDA_MINUTOS = 15
+
+    # Nombre de la tabla
+    __tablename__ = "cit_citas_ocupaciones"
+
+    # Clave primaria compuesta por la oficina, la fecha y la hora de inicio de la celda
+    oficina_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("oficinas.id"), primary_key=True)
+    fecha: Mapped[date] = mapped_column(primary_key=True)
+    hora: Mapped[time] = mapped_column(primary_key=True)
+
+    # Columnas
+    cantidad: Mapped[int] = mapped_column(default=0)
+
+    @classmethod
+    def cells(cls, inicio: datetime, termino: datetime) -> list:
+        """Entregar los inicios de las celdas que toca el intervalo de una cita"""
+        celda = inicio.replace(minute=inicio.minute - inicio.minute % cls.CELDA_MINUTOS, second=0, microsecond=0)
+        celdas = []
+        while celda < termino:
+            celdas.append(celda)
+            celda += timedelta(minutes=cls.CELDA_MINUTOS)
+        return celdas
+
+    @classmethod
+    def add(cls, connection, oficina_id, inicio: datetime, termino: datetime, cantidad: int) -> None:
+        """Sumar la cantidad a las celdas de la cita con un solo INSERT ... ON CONFLICT, o restarla si es negativa"""
+        celdas = cls.cells(inicio, termino)
+        if not celdas:
+            return
+        tabla = cls.__table__
+        # Restar solo de las celdas que ya existen y sin bajar de cero, una resta no debe insertar cantidades negativas
+        if cantidad < 0:
+            connection.execute(
+                update(tabla)
+                .where(tabla.c.oficina_id == oficina_id)
+                .where(tuple_(tabla.c.fecha, tabla.c.hora).in_([(celda.date(), celda.time()) for celda in celdas]))
+                .values(cantidad=func.greatest(tabla.c.cantidad + cantidad, 0))
+            )
+            return
+        renglones = [
+            {"oficina_id": oficina_id, "fecha": celda.date(), "hora": celda.time(), "cantidad": cantidad}
+            for celda in celdas
+        ]
+        sentencia = insert(tabla).values(renglones)
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=["oficina_id", "fecha", "hora"],
+            set_={"cantidad": tabla.c.cantidad + sentencia.excluded.cantidad},
+        )
+        connection.execute(sentencia)
+
+    @classmethod
+    def build_count_select(cls, condicion: str) -> str:
+        """Elaborar el SELECT que cuenta las citas que cumplen la condición por oficina, fecha y celda"""
+        return f"""
+            SELECT cit_citas.oficina_id, celda::date AS fecha, celda::time AS hora, count(*) AS cantidad
+            FROM cit_citas,
+                generate_series(
+                    date_trunc('hour', cit_citas.inicio)
+                        + floor(extract(minute FROM cit_citas.inicio) / :minutos) * make_interval(mins => :minutos),
+                    cit_citas.termino - interval '1 microsecond',
+                    make_interval(mins => :minutos)
+                ) AS celda
+            WHERE {condicion} AND cit_citas.estado != 'CANCELO' AND cit_citas.termino > cit_citas.inicio
+            GROUP BY cit_citas.oficina_id, celda::date, celda::time
+        """
+
+    @classmethod
+    def build_insert_select(cls, condicion: str, sumar: bool = False) -> str:
+        """Elaborar el INSERT ... SELECT con el conteo de las citas, si sumar se agrega a las celdas que ya existen"""
+        sql = f"INSERT INTO {cls.__tablename__} (oficina_id, fecha, hora, cantidad) {cls.build_count_select(condicion)}"
+        if sumar:
+            sql += f"""
+                ON CONFLICT (oficina_id, fecha, hora)
+                DO UPDATE SET cantidad = {cls.__tablename__}.cantidad + EXCLUDED.cantidad
+            """
+        return sql
+
+    @classmethod
+    def build_update_subtract(cls, condicion: str) -> str:
+        """Elaborar el UPDATE que resta el conteo de las citas de las celdas que ya existen, sin bajar de cero"""
+        return f"""
+            UPDATE {cls.__tablename__}
+            SET cantidad = GREATEST({cls.__tablename__}.cantidad - conteos.cantidad, 0)
+            FROM ({cls.build_count_select(condicion)}) AS conteos
+            WHERE {cls.__tablename__}.oficina_id = conteos.oficina_id
+                AND {cls.__tablename__}.fecha = conteos.fecha
+                AND {cls.__tablename__}.hora = conteos.hora
+        """
+
+    @classmethod
+    def build_delete_days(cls) -> str:
+        """Elaborar el DELETE de las celdas de los pares de oficina y fecha en :oficinas_ids y :fechas"""
+        return f"""
+            DELETE FROM {cls.__tablename__}
+            WHERE (oficina_id, fecha) IN (SELECT * FROM unnest(CAST(:oficinas_ids AS uuid[]), CAST(:fechas AS date[])))
+        """
+
+    @classmethod
+    def build_insert_days(cls) -> str:
+        """Elaborar el INSERT ... SELECT que vuelve a contar las celdas de los pares de oficina y fecha"""
+        condicion = (
+            "cit_citas.estatus = 'A' AND cit_citas.oficina_id = ANY(CAST(:oficinas_ids AS uuid[])) "
+            "AND (cit_citas.inicio::date = ANY(CAST(:fechas AS date[])) "
+            "OR cit_citas.termino::date = ANY(CAST(:fechas AS date[])))"
+        )
+        return f"""
+            INSERT INTO {cls.__tablename__} (oficina_id, fecha, hora, cantidad)
+            SELECT * FROM ({cls.build_count_select(condicion)}) AS conteos
+            WHERE (conteos.oficina_id, conteos.fecha) IN (
+                SELECT * FROM unnest(CAST(:oficinas_ids AS uuid[]), CAST(:fechas AS date[]))
+            )
+        """
+
+    @classmethod
+    def add_citas(cls, ids: list, signo: int) -> None:
+        """Sumar (signo 1) o restar (signo -1) las citas de los ids, en la transacción en curso"""
+        condicion = "cit_citas.id = ANY(CAST(:ids AS uuid[]))"
+        sql = cls.build_insert_select(condicion, sumar=True) if signo > 0 else cls.build_update_subtract(condicion)
+        database.session.execute(
+            text(sql),
+            {"ids": [str(cit_cita_id) for cit_cita_id in ids], "minutos": cls.CELDA_MINUTOS},
+        )
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """Reconstruir toda la tabla a partir de las citas activas que no se han cancelado, entrega las celdas"""
+        database.session.execute(text(f"DELETE FROM {cls.__tablename__}"))
+        resultado = database.session.execute(
+            text(cls.build_insert_select("cit_citas.estatus = 'A'")),
+            {"minutos": cls.CELDA_MINUTOS},
+        )
+        database.session.commit()
+        return resultado.rowcount
+
+    def __repr__(self):
+        """Representación"""
+        return f"<CitCitaOcupacion {self.oficina_id} {self.fecha} {self.hora} {self.cantidad}>"
+
+
+def cit_cita_counts(estatus: str, estado: str) -> bool:
+    """¿La cita ocupa lugar? Solo si está activa y no se ha cancelado"""
+    return estatus == "A" and estado != "CANCELO"
+
+
+@event.listens_for(CitCita, "after_insert")
+def cit_cita_after_insert(mapper, connection, cit_cita):
+    """Al crear una cita, sumarla a la ocupación"""
+    if cit_cita_counts(cit_cita.estatus or "A", cit_cita.estado):
+        CitCitaOcupacion.add(connection, cit_cita.oficina_id, cit_cita.inicio, cit_cita.termino, 1)
+
+
+@event.listens_for(CitCita, "after_update")
+def cit_cita_after_update(mapper, connection, cit_cita):
+    """Al cancelar, eliminar, recuperar o mover una cita, restar lo anterior y sumar lo nuevo a la ocupación"""
+    columnas = ("oficina_id", "inicio", "termino", "estado", "estatus")
+    historias = {columna: get_history(cit_cita, columna) for columna in columnas}
+    if not any(historia.deleted for historia in historias.values()):
+        return
+    anteriores = {}
+    for columna, historia in historias.items():
+        anteriores[columna] = historia.deleted[0] if historia.deleted else getattr(cit_cita, columna)
+    if cit_cita_counts(anteriores["estatus"], anteriores["estado"]):
+        CitCitaOcupacion.add(connection, anteriores["oficina_id"], anteriores["inicio"], anteriores["termino"], -1)
+    if cit_cita_counts(cit_cita.estatus, cit_cita.estado):
+        CitCitaOcupacion.add(connection, cit_cita.oficina_id, cit_cita.inicio, cit_cita.termino, 1)
@@ -1,3 +1,70 @@
 """
 Cit Citas, tareas en el fondo
 """
+
+from ...lib.catalog_cache import get_catalog
+from ...lib.exceptions import MyAnyError
+from ...lib.exports import export_download_url, export_query
+from ...lib.tasks import set_task_error, set_task_progress
+from ..cit_clientes.models import CitCliente
+from .filters import filter_cit_citas
+from .models import CitCita
+
+# Columnas y encabezados de la exportación, la oficina y el servicio se toman del catálogo en memoria
+EXPORTAR_COLUMNAS = (
+    CitCita.creado,
+    CitCita.inicio,
+    CitCita.termino,
+    CitCita.estado,
+    CitCita.oficina_id,
+    CitCita.cit_servicio_id,
+    CitCliente.email,
+    CitCliente.nombres,
+    CitCliente.apellido_primero,
+    CitCliente.apellido_segundo,
+)
+EXPORTAR_ENCABEZADOS = (
+    "Creado",
+    "Inicio",
+    "Término",
+    "Estado",
+    "Oficina",
+    "Servicio",
+    "Correo electrónico",
+    "Nombres",
+    "Primer apellido",
+    "Segundo apellido",
+)
+
+
+def lanzar_exportar(filtros: dict, formato: str) -> str:
+    """Lanzar tarea en el fondo para exportar las citas a un archivo CSV o XLSX"""
+    set_task_progress(0, "Se ha lanzado la tarea en el fondo para exportar las citas")
+
+    # Tomar una sola vez los catálogos de oficinas y servicios
+    oficinas = get_catalog("oficinas").por_id
+    cit_servicios = get_catalog("cit_servicios").por_id
+
+    # Convertir cada renglón, cambiando los id de la oficina y el servicio por sus claves
+    def convertir(renglon) -> tuple:
+        """Convertir el renglón de la consulta en el renglón del archivo"""
+        oficina = oficinas.get(renglon.oficina_id)
+        cit_servicio = cit_servicios.get(renglon.cit_servicio_id)
+        return (
+            *renglon[:4],
+            oficina.clave if oficina else "",
+            cit_servicio.clave if cit_servicio else "",
+            *renglon[6:],
+        )
+
+    # Exportar
+    consulta = filter_cit_citas(CitCita.query, filtros, con_cit_cliente=True).order_by(CitCita.creado, CitCita.id)
+    try:
+        ruta, cantidad = export_query(consulta, EXPORTAR_COLUMNAS, EXPORTAR_ENCABEZADOS, convertir, "citas", formato)
+    except MyAnyError as error:
+        mensaje_error = str(error)
+        set_task_error(mensaje_error)
+        return mensaje_error
+    mensaje_termino = f"Se han exportado {cantidad} citas a {ruta.name}"
+    set_task_progress(100, mensaje_termino, ruta.name, export_download_url())
+    return mensaje_termino
@@ -3,12 +3,22 @@ Cit Citas, vistas
 """
 
 import json
+from io import BytesIO
 
-from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+from flask import Blueprint, abort, flash, make_response, redirect, render_template, request, send_file, url_for
 from flask_login import current_user, login_required
+from sqlalchemy.sql import func
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
-from ...lib.safe_string import safe_email, safe_message, safe_string, safe_uuid
+from ...config.extensions import database
+from ...lib.datatables import (
+    CONTEO_ESTIMADO,
+    count_datatable,
+    get_datatable_parameters,
+    output_datatable_json,
+    paginate_datatable_keyset,
+)
+from ...lib.exports import EXPORTACION_FORMATOS, EXPORTACION_SEGUNDOS, get_export_filters
+from ...lib.safe_string import safe_message, safe_uuid
 from ..bitacoras.models import Bitacora
 from ..cit_clientes.models import CitCliente
 from ..cit_servicios.models import CitServicio
@@ -16,10 +26,31 @@ from ..modulos.models import Modulo
 from ..oficinas.models import Oficina
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
+from .filters import filter_cit_citas
 from .models import CitCita
 
 MODULO = "CIT CITAS"
 
+# Imagen del código de acceso, se guarda en la caché del navegador y se valida con el ETag
+CODIGO_ACCESO_IMAGEN_MIMETYPE = "image/png"
+CODIGO_ACCESO_IMAGEN_SEGUNDOS = 3600
+
+# Perfil de carga del DataTable, solo las columnas que se usan para elaborar los datos
+DATATABLE_PERFIL = {
+    "columnas": (CitCita.id, CitCita.creado, CitCita.inicio, CitCita.termino, CitCita.estado),
+    "relaciones": {
+        CitCita.cit_cliente: (
+            CitCliente.id,
+            CitCliente.email,
+            CitCliente.nombres,
+            CitCliente.apellido_primero,
+            CitCliente.apellido_segundo,
+        ),
+        CitCita.cit_servicio: (CitServicio.id, CitServicio.clave, CitServicio.descripcion),
+        CitCita.oficina: (Oficina.id, Oficina.clave, Oficina.descripcion),
+    },
+}
+
 cit_citas = Blueprint("cit_citas", __name__, template_folder="templates")
 
 
@@ -36,55 +67,10 @@ def datatable_json():
     # Tomar parámetros de Datatables
     draw, start, rows_per_page = get_datatable_parameters()
     # Consultar
-    consulta = CitCita.query
-    # Primero filtrar por columnas propias
-    if "estatus" in request.form:
-        consulta = consulta.filter(CitCita.estatus == request.form["estatus"])
-    else:
-        consulta = consulta.filter(CitCita.estatus == "A")
-    if "id" in request.form:
-        consulta = consulta.filter(CitCita.id == request.form["id"])
-    if "cit_cliente_id" in request.form:
-        consulta = consulta.filter(CitCita.cit_cliente_id == request.form["cit_cliente_id"])
-    if "cit_servicio_id" in request.form:
-        consulta = consulta.filter(CitCita.cit_servicio_id == request.form["cit_servicio_id"])
-    if "oficina_id" in request.form:
-        consulta = consulta.filter(CitCita.oficina_id == request.form["oficina_id"])
-    if "estado" in request.form:
-        estado = safe_string(request.form["estado"])
-        if estado != "":
-            consulta = consulta.filter(CitCita.estado == estado)
-    # Luego filtrar por columnas de otras tablas
-    cit_cliente_email = ""
-    if "cit_cliente_email" in request.form:
-        cit_cliente_email = safe_email(request.form["cit_cliente_email"], search_fragment=True)
-    cit_cliente_nombres = ""
-    if "cit_cliente_nombres" in request.form:
-        cit_cliente_nombres = safe_string(request.form["cit_cliente_nombres"], save_enie=True)
-    cit_cliente_apellido_primero = ""
-    if "cit_cliente_apellido_primero" in request.form:
-        cit_cliente_apellido_primero = safe_string(request.form["cit_cliente_apellido_primero"], save_enie=True)
-    cit_cliente_apellido_segundo = ""
-    if "cit_cliente_apellido_segundo" in request.form:
-        cit_cliente_apellido_segundo = safe_string(request.form["cit_cliente_apellido_segundo"], save_enie=True)
-    if (
-        cit_cliente_email != ""
-        or cit_cliente_nombres != ""
-        or cit_cliente_apellido_primero != ""
-        or cit_cliente_apellido_segundo != ""
-    ):
-        consulta = consulta.join(CitCliente)
-        if cit_cliente_email != "":
-            consulta = consulta.filter(CitCliente.email.contains(cit_cliente_email))
-        if cit_cliente_nombres != "":
-            consulta = consulta.filter(CitCliente.nombres.contains(cit_cliente_nombres))
-        if cit_cliente_apellido_primero != "":
-            consulta = consulta.filter(CitCliente.apellido_primero.contains(cit_cliente_apellido_primero))
-        if cit_cliente_apellido_segundo != "":
-            consulta = consulta.filter(CitCliente.apellido_segundo.contains(cit_cliente_apellido_segundo))
+    consulta = filter_cit_citas(CitCita.query, request.form)
     # Ordenar y paginar
-    registros = consulta.order_by(CitCita.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, CitCita, start, rows_per_page, DATATABLE_PERFIL)
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_ESTIMADO)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -127,7 +113,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @cit_citas.route("/cit_citas")
@@ -153,6 +139,30 @@ def list_inactive():
     )
 
 
+@cit_citas.route("/cit_citas/exportar/<formato>")
+@permission_required(MODULO, Permiso.ADMINISTRAR)
+def export(formato):
+    """Lanzar la tarea en el fondo para exportar las citas a un archivo CSV o XLSX, con los filtros del listado"""
+    if formato not in EXPORTACION_FORMATOS:
+        abort(400)
+    comando = "cit_citas.tasks.lanzar_exportar"
+    # Si ya hay una exportación en proceso, mostrarla en lugar de lanzar otra
+    tarea = current_user.get_task_in_progress(comando)
+    if tarea is not None:
+        flash("Ya hay una exportación de citas en proceso, espere a que termine", "warning")
+        return redirect(url_for("tareas.detail", tarea_id=tarea.id))
+    # Lanzar la tarea en el fondo
+    tarea = current_user.launch_task(
+        comando=comando,
+        mensaje=f"Exportando las citas a {formato.upper()}",
+        filtros=get_export_filters(),
+        formato=formato,
+        job_timeout=EXPORTACION_SEGUNDOS,
+    )
+    flash(f"Se ha lanzado la tarea en el fondo para exportar las citas a {formato.upper()}", "info")
+    return redirect(url_for("tareas.detail", tarea_id=tarea.id))
+
+
 @cit_citas.route("/cit_citas/<cit_cita_id>")
 def detail(cit_cita_id):
     """Detalle de un Cit Cita"""
@@ -161,3 +171,34 @@ def detail(cit_cita_id):
         abort(400)
     cit_cita = CitCita.query.get_or_404(cit_cita_id)
     return render_template("cit_citas/detail.jinja2", cit_cita=cit_cita)
+
+
+@cit_citas.route("/cit_citas/codigo_acceso_imagen/<cit_cita_id>")
+def codigo_acceso_imagen(cit_cita_id):
+    """Entregar la imagen del código de acceso de un Cit Cita, con ETag para que el navegador la guarde"""
+    cit_cita_id = safe_uuid(cit_cita_id)
+    if cit_cita_id == "":
+        abort(400)
+    # Consultar primero solo el hash, si el navegador ya tiene la imagen se responde 304 sin leer sus bytes
+    etag = (
+        database.session.query(func.md5(CitCita.codigo_acceso_imagen))
+        .filter(CitCita.id == cit_cita_id)
+        .filter(CitCita.codigo_acceso_imagen.isnot(None))
+        .scalar()
+    )
+    if etag is None:
+        abort(404)
+    if etag in request.if_none_match:
+        respuesta = make_response("", 304)
+        respuesta.set_etag(etag)
+        respuesta.cache_control.max_age = CODIGO_ACCESO_IMAGEN_SEGUNDOS
+    else:
+        imagen = database.session.query(CitCita.codigo_acceso_imagen).filter(CitCita.id == cit_cita_id).scalar()
+        respuesta = send_file(
+            BytesIO(imagen),
+            mimetype=CODIGO_ACCESO_IMAGEN_MIMETYPE,
+            etag=etag,
+            max_age=CODIGO_ACCESO_IMAGEN_SEGUNDOS,
+        )
+    respuesta.cache_control.private = True
+    return respuesta
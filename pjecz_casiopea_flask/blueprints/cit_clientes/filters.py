@@ -0,0 +1,32 @@
+"""
+Cit Clientes, filtros
+"""
+
+from ...lib.safe_string import safe_email, safe_string
+from .models import CitCliente
+
+
+def filter_cit_clientes(consulta, filtros: dict):
+    """Filtrar la consulta de Cit Clientes con los filtros del DataTable, también sirve para exportar"""
+    # Primero filtrar por columnas propias
+    if "estatus" in filtros:
+        consulta = consulta.filter(CitCliente.estatus == filtros["estatus"])
+    else:
+        consulta = consulta.filter(CitCliente.estatus == "A")
+    if "email" in filtros:
+        email = safe_email(filtros["email"], search_fragment=True)
+        if email != "":
+            consulta = consulta.filter(CitCliente.email.contains(email))
+    if "nombres" in filtros:
+        nombres = safe_string(filtros["nombres"], save_enie=True)
+        if nombres != "":
+            consulta = consulta.filter(CitCliente.nombres_busqueda.contains(nombres))
+    if "apellido_primero" in filtros:
+        apellido_primero = safe_string(filtros["apellido_primero"], save_enie=True)
+        if apellido_primero != "":
+            consulta = consulta.filter(CitCliente.apellido_primero_busqueda.contains(apellido_primero))
+    if "apellido_segundo" in filtros:
+        apellido_segundo = safe_string(filtros["apellido_segundo"], save_enie=True)
+        if apellido_segundo != "":
+            consulta = consulta.filter(CitCliente.apellido_segundo_busqueda.contains(apellido_segundo))
+    return consulta
@@ -11,6 +11,7 @@ from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ...config.extensions import database
+from ...lib.search import add_search_keys, trigram_indexes
 from ...lib.universal_mixin import UniversalMixin
 
 
@@ -20,6 +21,11 @@ class CitCliente(database.Model, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_clientes"
 
+    # Índices de trigramas para los filtros que buscan por fragmento
+    __table_args__ = trigram_indexes(
+        "cit_clientes", "email", "nombres_busqueda", "apellido_primero_busqueda", "apellido_segundo_busqueda"
+    )
+
     # Clave primaria
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
@@ -27,6 +33,12 @@ class CitCliente(database.Model, UniversalMixin):
     nombres: Mapped[str] = mapped_column(String(256))
     apellido_primero: Mapped[str] = mapped_column(String(256))
     apellido_segundo: Mapped[str] = mapped_column(String(256))
+
+    # Llaves de búsqueda, se calculan al insertar y al actualizar
+    nombres_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+    apellido_primero_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+    apellido_segundo_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+
     curp: Mapped[str] = mapped_column(String(18), unique=True)
     telefono: Mapped[str] = mapped_column(String(64))
     email: Mapped[str] = mapped_column(String(256), unique=True)
@@ -59,3 +71,14 @@ class CitCliente(database.Model, UniversalMixin):
     def __repr__(self):
         """Representación"""
         return f"<CitCliente {self.email}>"
+
+
+# Calcular las llaves de búsqueda de los nombres y apellidos
+add_search_keys(
+    CitCliente,
+    {
+        "nombres_busqueda": "nombres",
+        "apellido_primero_busqueda": "apellido_primero",
+        "apellido_segundo_busqueda": "apellido_segundo",
+    },
+)
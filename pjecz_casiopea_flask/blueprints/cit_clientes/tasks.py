@@ -0,0 +1,52 @@
+"""
+Cit Clientes, tareas en el fondo
+"""
+
+from ...lib.exceptions import MyAnyError
+from ...lib.exports import export_download_url, export_query
+from ...lib.tasks import set_task_error, set_task_progress
+from .filters import filter_cit_clientes
+from .models import CitCliente
+
+# Columnas y encabezados de la exportación, sin contraseñas
+EXPORTAR_COLUMNAS = (
+    CitCliente.creado,
+    CitCliente.email,
+    CitCliente.nombres,
+    CitCliente.apellido_primero,
+    CitCliente.apellido_segundo,
+    CitCliente.curp,
+    CitCliente.telefono,
+    CitCliente.renovacion,
+    CitCliente.limite_citas_pendientes,
+    CitCliente.autoriza_mensajes,
+    CitCliente.enviar_boletin,
+)
+EXPORTAR_ENCABEZADOS = (
+    "Creado",
+    "Correo electrónico",
+    "Nombres",
+    "Primer apellido",
+    "Segundo apellido",
+    "CURP",
+    "Teléfono",
+    "Renovación",
+    "Límite de citas pendientes",
+    "Autoriza mensajes",
+    "Enviar boletín",
+)
+
+
+def lanzar_exportar(filtros: dict, formato: str) -> str:
+    """Lanzar tarea en el fondo para exportar los clientes a un archivo CSV o XLSX"""
+    set_task_progress(0, "Se ha lanzado la tarea en el fondo para exportar los clientes")
+    consulta = filter_cit_clientes(CitCliente.query, filtros).order_by(CitCliente.creado, CitCliente.id)
+    try:
+        ruta, cantidad = export_query(consulta, EXPORTAR_COLUMNAS, EXPORTAR_ENCABEZADOS, tuple, "clientes", formato)
+    except MyAnyError as error:
+        mensaje_error = str(error)
+        set_task_error(mensaje_error)
+        return mensaje_error
+    mensaje_termino = f"Se han exportado {cantidad} clientes a {ruta.name}"
+    set_task_progress(100, mensaje_termino, ruta.name, export_download_url())
+    return mensaje_termino
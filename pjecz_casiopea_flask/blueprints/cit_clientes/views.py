@@ -9,13 +9,16 @@ from flask import Blueprint, abort, flash, redirect, render_template, request, u
 from flask_login import current_user, login_required
 
 from ...config.extensions import pwd_context
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.catalog_cache import get_catalog_by_clave
+from ...lib.datatables import CONTEO_CACHE, count_datatable, get_datatable_parameters, output_datatable_json
+from ...lib.exports import EXPORTACION_FORMATOS, EXPORTACION_SEGUNDOS, get_export_filters
 from ...lib.safe_string import safe_curp, safe_email, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import CitClienteForm
+from .filters import filter_cit_clientes
 from .models import CitCliente
 
 LIMITE_CITAS_PENDIENTES = 3
@@ -39,31 +42,10 @@ def datatable_json():
     # Tomar parámetros de Datatables
     draw, start, rows_per_page = get_datatable_parameters()
     # Consultar
-    consulta = CitCliente.query
-    # Primero filtrar por columnas propias
-    if "estatus" in request.form:
-        consulta = consulta.filter(CitCliente.estatus == request.form["estatus"])
-    else:
-        consulta = consulta.filter(CitCliente.estatus == "A")
-    if "email" in request.form:
-        email = safe_email(request.form["email"], search_fragment=True)
-        if email != "":
-            consulta = consulta.filter(CitCliente.email.contains(email))
-    if "nombres" in request.form:
-        nombres = safe_string(request.form["nombres"], save_enie=True)
-        if nombres != "":
-            consulta = consulta.filter(CitCliente.nombres.contains(nombres))
-    if "apellido_primero" in request.form:
-        apellido_primero = safe_string(request.form["apellido_primero"], save_enie=True)
-        if apellido_primero != "":
-            consulta = consulta.filter(CitCliente.apellido_primero.contains(apellido_primero))
-    if "apellido_segundo" in request.form:
-        apellido_segundo = safe_string(request.form["apellido_segundo"], save_enie=True)
-        if apellido_segundo != "":
-            consulta = consulta.filter(CitCliente.apellido_segundo.contains(apellido_segundo))
+    consulta = filter_cit_clientes(CitCliente.query, request.form)
     # Ordenar y paginar
     registros = consulta.order_by(CitCliente.email).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_CACHE)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -105,6 +87,30 @@ def list_inactive():
     )
 
 
+@cit_clientes.route("/cit_clientes/exportar/<formato>")
+@permission_required(MODULO, Permiso.ADMINISTRAR)
+def export(formato):
+    """Lanzar la tarea en el fondo para exportar los clientes a un archivo CSV o XLSX, con los filtros del listado"""
+    if formato not in EXPORTACION_FORMATOS:
+        abort(400)
+    comando = "cit_clientes.tasks.lanzar_exportar"
+    # Si ya hay una exportación en proceso, mostrarla en lugar de lanzar otra
+    tarea = current_user.get_task_in_progress(comando)
+    if tarea is not None:
+        flash("Ya hay una exportación de clientes en proceso, espere a que termine", "warning")
+        return redirect(url_for("tareas.detail", tarea_id=tarea.id))
+    # Lanzar la tarea en el fondo
+    tarea = current_user.launch_task(
+        comando=comando,
+        mensaje=f"Exportando los clientes a {formato.upper()}",
+        filtros=get_export_filters(),
+        formato=formato,
+        job_timeout=EXPORTACION_SEGUNDOS,
+    )
+    flash(f"Se ha lanzado la tarea en el fondo para exportar los clientes a {formato.upper()}", "info")
+    return redirect(url_for("tareas.detail", tarea_id=tarea.id))
+
+
 @cit_clientes.route("/cit_clientes/<cit_cliente_id>")
 def detail(cit_cliente_id):
     """Detalle de un Cit Cliente"""
@@ -152,14 +158,16 @@ def new():
                 renovacion=datetime.now() + timedelta(days=RENOVACION_DIAS),
                 limite_citas_pendientes=limite_citas_pendientes,
             )
-            cit_cliente.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nuevo Cliente {cit_cliente.email}"),
-                url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                cit_cliente.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nuevo Cliente {cit_cliente.email}"),
+                    url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             # TODO: Agregar tarea en el fondo para enviar mensaje por correo electrónico
             return redirect(bitacora.url)
@@ -211,14 +219,15 @@ def edit(cit_cliente_id):
                 cit_cliente.contrasena_sha256 = pwd_context.hash(contrasena)
                 cit_cliente.renovacion = datetime.now() + timedelta(days=RENOVACION_DIAS)
             cit_cliente.limite_citas_pendientes = limite_citas_pendientes
-            cit_cliente.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Cliente {cit_cliente.email}"),
-                url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                cit_cliente.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Cliente {cit_cliente.email}"),
+                    url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             # TODO: Agregar tarea en el fondo para enviar mensaje por correo electrónico
             return redirect(bitacora.url)
@@ -242,14 +251,15 @@ def delete(cit_cliente_id):
         abort(400)
     cit_cliente = CitCliente.query.get_or_404(cit_cliente_id)
     if cit_cliente.estatus == "A":
-        cit_cliente.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Cliente {cit_cliente.email}"),
-            url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_cliente.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Cliente {cit_cliente.email}"),
+                url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id))
 
@@ -263,13 +273,14 @@ def recover(cit_cliente_id):
         abort(400)
     cit_cliente = CitCliente.query.get_or_404(cit_cliente_id)
     if cit_cliente.estatus == "B":
-        cit_cliente.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Cliente {cit_cliente.email}"),
-            url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_cliente.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Cliente {cit_cliente.email}"),
+                url=url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_clientes.detail", cit_cliente_id=cit_cliente.id))
@@ -7,7 +7,13 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.datatables import (
+    CONTEO_CACHE,
+    count_datatable,
+    get_datatable_parameters,
+    output_datatable_json,
+    paginate_datatable_keyset,
+)
 from ...lib.safe_string import safe_email, safe_message, safe_string, safe_uuid
 from ..bitacoras.models import Bitacora
 from ..cit_clientes.models import CitCliente
@@ -18,6 +24,25 @@ from .models import CitClienteRecuperacion
 
 MODULO = "CIT CLIENTES RECUPERACIONES"
 
+# Perfil de carga del DataTable, solo las columnas que se usan para elaborar los datos
+DATATABLE_PERFIL = {
+    "columnas": (
+        CitClienteRecuperacion.id,
+        CitClienteRecuperacion.creado,
+        CitClienteRecuperacion.expiracion,
+        CitClienteRecuperacion.ya_recuperado,
+    ),
+    "relaciones": {
+        CitClienteRecuperacion.cit_cliente: (
+            CitCliente.id,
+            CitCliente.email,
+            CitCliente.nombres,
+            CitCliente.apellido_primero,
+            CitCliente.apellido_segundo,
+        ),
+    },
+}
+
 cit_clientes_recuperaciones = Blueprint("cit_clientes_recuperaciones", __name__, template_folder="templates")
 
 
@@ -63,14 +88,14 @@ def datatable_json():
         if cit_cliente_email != "":
             consulta = consulta.filter(CitCliente.email.contains(cit_cliente_email))
         if cit_cliente_nombres != "":
-            consulta = consulta.filter(CitCliente.nombres.contains(cit_cliente_nombres))
+            consulta = consulta.filter(CitCliente.nombres_busqueda.contains(cit_cliente_nombres))
         if cit_cliente_apellido_primero != "":
-            consulta = consulta.filter(CitCliente.apellido_primero.contains(cit_cliente_apellido_primero))
+            consulta = consulta.filter(CitCliente.apellido_primero_busqueda.contains(cit_cliente_apellido_primero))
         if cit_cliente_apellido_segundo != "":
-            consulta = consulta.filter(CitCliente.apellido_segundo.contains(cit_cliente_apellido_segundo))
+            consulta = consulta.filter(CitCliente.apellido_segundo_busqueda.contains(cit_cliente_apellido_segundo))
     # Ordenar y paginar
-    registros = consulta.order_by(CitClienteRecuperacion.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, CitClienteRecuperacion, start, rows_per_page, DATATABLE_PERFIL)
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_CACHE)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -94,7 +119,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @cit_clientes_recuperaciones.route("/cit_clientes_recuperaciones")
@@ -6,9 +6,7 @@ import os
 from datetime import datetime
 
 import pytz
-import sendgrid
 from dotenv import load_dotenv
-from sendgrid.helpers.mail import Content, Email, Mail, To
 
 from pjecz_casiopea_flask.lib.safe_string import safe_uuid
 from pjecz_casiopea_flask.main import app
@@ -20,6 +18,7 @@ from ....lib.exceptions import (
     MyNotValidParamError,
     MyRequestError,
 )
+from ....lib.sendgrid_client import send_email
 from ..models import CitClienteRegistro
 from . import bitacora
 
@@ -103,21 +102,9 @@ def enviar_a_sendgrid_mensaje_validar(cit_cliente_registro_id: str) -> tuple[str
     contenidos.append("<p>Este mensaje fue enviado por un programa. <em>NO RESPONDA ESTE MENSAJE.</em></p>")
     contenido_html = "\n".join(contenidos)
 
-    # Enviar el e-mail
-    send_grid = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
-    to_email = To(cit_cliente_registro.email)
-    remitente_email = Email(SENDGRID_FROM_EMAIL)
-    contenido = Content("text/html", contenido_html)
-    mail = Mail(
-        from_email=remitente_email,
-        to_emails=to_email,
-        subject=asunto_str,
-        html_content=contenido,
-    )
-
-    # Enviar mensaje de correo electrónico
+    # Enviar mensaje de correo electrónico, con el cliente de SendGrid del proceso que reintenta si falla
     try:
-        send_grid.send(mail)
+        send_email(SENDGRID_FROM_EMAIL, cit_cliente_registro.email, asunto_str, contenido_html)
     except Exception as error:
         mensaje_error = f"Error al enviar el mensaje por Sendgrid: {str(error)}"
         bitacora.error(mensaje_error)
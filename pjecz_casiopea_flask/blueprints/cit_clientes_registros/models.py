@@ -11,6 +11,7 @@ from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
 from ...config.extensions import database
+from ...lib.search import add_search_keys, trigram_indexes
 from ...lib.universal_mixin import UniversalMixin
 
 
@@ -20,6 +21,11 @@ class CitClienteRegistro(database.Model, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "cit_clientes_registros"
 
+    # Índices de trigramas para los filtros que buscan por fragmento
+    __table_args__ = trigram_indexes(
+        "cit_clientes_registros", "email", "nombres_busqueda", "apellido_primero_busqueda", "apellido_segundo_busqueda"
+    )
+
     # Clave primaria
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
@@ -27,6 +33,12 @@ class CitClienteRegistro(database.Model, UniversalMixin):
     nombres: Mapped[str] = mapped_column(String(256))
     apellido_primero: Mapped[str] = mapped_column(String(256))
     apellido_segundo: Mapped[str] = mapped_column(String(256))
+
+    # Llaves de búsqueda, se calculan al insertar y al actualizar
+    nombres_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+    apellido_primero_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+    apellido_segundo_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+
     curp: Mapped[str] = mapped_column(String(18), index=True)
     telefono: Mapped[str] = mapped_column(String(64))
     email: Mapped[str] = mapped_column(String(256), index=True)
@@ -46,3 +58,14 @@ class CitClienteRegistro(database.Model, UniversalMixin):
     def __repr__(self):
         """Representación"""
         return f"<CitClienteRegistro {self.id}>"
+
+
+# Calcular las llaves de búsqueda de los nombres y apellidos
+add_search_keys(
+    CitClienteRegistro,
+    {
+        "nombres_busqueda": "nombres",
+        "apellido_primero_busqueda": "apellido_primero",
+        "apellido_segundo_busqueda": "apellido_segundo",
+    },
+)
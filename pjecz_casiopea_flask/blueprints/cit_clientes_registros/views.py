@@ -7,7 +7,13 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.datatables import (
+    CONTEO_CACHE,
+    count_datatable,
+    get_datatable_parameters,
+    output_datatable_json,
+    paginate_datatable_keyset,
+)
 from ...lib.safe_string import safe_email, safe_message, safe_string, safe_uuid
 from ..bitacoras.models import Bitacora
 from ..modulos.models import Modulo
@@ -46,18 +52,18 @@ def datatable_json():
     if "nombres" in request.form:
         nombres = safe_string(request.form["nombres"], save_enie=True)
         if nombres != "":
-            consulta = consulta.filter(CitClienteRegistro.nombres.contains(nombres))
+            consulta = consulta.filter(CitClienteRegistro.nombres_busqueda.contains(nombres))
     if "apellido_primero" in request.form:
         apellido_primero = safe_string(request.form["apellido_primero"], save_enie=True)
         if apellido_primero != "":
-            consulta = consulta.filter(CitClienteRegistro.apellido_primero.contains(apellido_primero))
+            consulta = consulta.filter(CitClienteRegistro.apellido_primero_busqueda.contains(apellido_primero))
     if "apellido_segundo" in request.form:
         apellido_segundo = safe_string(request.form["apellido_segundo"], save_enie=True)
         if apellido_segundo != "":
-            consulta = consulta.filter(CitClienteRegistro.apellido_segundo.contains(apellido_segundo))
+            consulta = consulta.filter(CitClienteRegistro.apellido_segundo_busqueda.contains(apellido_segundo))
     # Ordenar y paginar
-    registros = consulta.order_by(CitClienteRegistro.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, CitClienteRegistro, start, rows_per_page)
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_CACHE)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -76,7 +82,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @cit_clientes_registros.route("/cit_clientes_registros")
@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import CitDiaInhabilForm
@@ -112,14 +113,16 @@ def new():
             fecha=fecha,
             descripcion=safe_string(form.descripcion.data, save_enie=True),
         )
-        cit_dia_inhabil.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Dia Inhábil {cit_dia_inhabil.fecha}"),
-            url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            cit_dia_inhabil.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Dia Inhábil {cit_dia_inhabil.fecha}"),
+                url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     return render_template("cit_dias_inhabiles/new.jinja2", form=form)
@@ -144,14 +147,15 @@ def edit(cit_dia_inhabil_id):
         # Guardar
         cit_dia_inhabil.fecha = fecha
         cit_dia_inhabil.descripcion = safe_string(form.descripcion.data, save_enie=True)
-        cit_dia_inhabil.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Editado Dia Inhábil {cit_dia_inhabil.fecha}"),
-            url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_dia_inhabil.save()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Editado Dia Inhábil {cit_dia_inhabil.fecha}"),
+                url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     form.fecha.data = cit_dia_inhabil.fecha
@@ -168,14 +172,15 @@ def delete(cit_dia_inhabil_id):
         abort(400)
     cit_dia_inhabil = CitDiaInhabil.query.get_or_404(cit_dia_inhabil_id)
     if cit_dia_inhabil.estatus == "A":
-        cit_dia_inhabil.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Dia Inhábil {cit_dia_inhabil.fecha}"),
-            url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_dia_inhabil.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Dia Inhábil {cit_dia_inhabil.fecha}"),
+                url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id))
 
@@ -189,13 +194,14 @@ def recover(cit_dia_inhabil_id):
         abort(400)
     cit_dia_inhabil = CitDiaInhabil.query.get_or_404(cit_dia_inhabil_id)
     if cit_dia_inhabil.estatus == "B":
-        cit_dia_inhabil.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Dia Inhábil {cit_dia_inhabil.fecha}"),
-            url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_dia_inhabil.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Dia Inhábil {cit_dia_inhabil.fecha}"),
+                url=url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_dias_inhabiles.detail", cit_dia_inhabil_id=cit_dia_inhabil.id))
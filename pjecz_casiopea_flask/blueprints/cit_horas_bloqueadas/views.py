@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.catalog_cache import get_catalog_by_clave
+from ...lib.datatables import count_datatable, get_datatable_parameters, output_datatable_json, paginate_datatable_keyset
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..oficinas.models import Oficina
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
@@ -50,8 +51,8 @@ def datatable_json():
         if descripcion != "":
             consulta = consulta.filter(CitHoraBloqueada.descripcion.contains(descripcion))
     # Ordenar y paginar
-    registros = consulta.order_by(CitHoraBloqueada.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, CitHoraBloqueada, start, rows_per_page)
+    total = count_datatable(consulta, start, rows_per_page, registros)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -67,7 +68,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @cit_horas_bloqueadas.route("/cit_horas_bloqueadas/admin_datatable_json", methods=["GET", "POST"])
@@ -93,8 +94,8 @@ def admin_datatable_json():
         if descripcion != "":
             consulta = consulta.filter(CitHoraBloqueada.descripcion.contains(descripcion))
     # Ordenar y paginar
-    registros = consulta.order_by(CitHoraBloqueada.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, CitHoraBloqueada, start, rows_per_page)
+    total = count_datatable(consulta, start, rows_per_page, registros)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -116,7 +117,7 @@ def admin_datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @cit_horas_bloqueadas.route("/cit_horas_bloqueadas")
@@ -204,16 +205,18 @@ def new():
                 termino=termino,
                 descripcion=safe_string(form.descripcion.data, save_enie=True),
             )
-            cit_hora_bloqueada.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(
-                    f"Nueva Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
-                ),
-                url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                cit_hora_bloqueada.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(
+                        f"Nueva Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
+                    ),
+                    url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     # Si es administrador, puede elegir la oficina
@@ -279,16 +282,17 @@ def edit(cit_hora_bloqueada_id):
             cit_hora_bloqueada.inicio = inicio
             cit_hora_bloqueada.termino = termino
             cit_hora_bloqueada.descripcion = safe_string(form.descripcion.data, save_enie=True)
-            cit_hora_bloqueada.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(
-                    f"Editada Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
-                ),
-                url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                cit_hora_bloqueada.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(
+                        f"Editada Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
+                    ),
+                    url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     # Cargar datos al formulario
@@ -318,16 +322,17 @@ def delete(cit_hora_bloqueada_id):
         flash("No tiene permiso para eliminar esta hora bloqueada", "warning")
         return redirect(url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id))
     if cit_hora_bloqueada.estatus == "A":
-        cit_hora_bloqueada.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(
-                f"Eliminada Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
-            ),
-            url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_hora_bloqueada.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(
+                    f"Eliminada Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
+                ),
+                url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id))
 
@@ -345,15 +350,16 @@ def recover(cit_hora_bloqueada_id):
         flash("No tiene permiso para recuperar esta hora bloqueada", "warning")
         return redirect(url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id))
     if cit_hora_bloqueada.estatus == "B":
-        cit_hora_bloqueada.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(
-                f"Recuperada Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
-            ),
-            url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_hora_bloqueada.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(
+                    f"Recuperada Hora Bloqueada {cit_hora_bloqueada.fecha} de {cit_hora_bloqueada.inicio} a {cit_hora_bloqueada.termino}"
+                ),
+                url=url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_horas_bloqueadas.detail", cit_hora_bloqueada_id=cit_hora_bloqueada.id))
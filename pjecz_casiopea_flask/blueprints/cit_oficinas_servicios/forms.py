@@ -6,8 +6,7 @@ from flask_wtf import FlaskForm
 from wtforms import SelectField, StringField, SubmitField
 from wtforms.validators import DataRequired
 
-from ..cit_servicios.models import CitServicio
-from ..oficinas.models import Oficina
+from ...lib.catalog_cache import get_catalog_records
 
 
 class CitOficinaServicioWithCitServicioForm(FlaskForm):
@@ -20,10 +19,7 @@ class CitOficinaServicioWithCitServicioForm(FlaskForm):
     def __init__(self):
         """Inicializar y cargar opciones para oficina"""
         super().__init__()
-        self.oficina.choices = [
-            (o.id, o.clave + " - " + o.descripcion_corta)
-            for o in Oficina.query.filter_by(estatus="A").order_by(Oficina.clave).all()
-        ]
+        self.oficina.choices = [(o.id, o.clave + " - " + o.descripcion_corta) for o in get_catalog_records("oficinas", "clave")]
 
 
 class CitOficinaServicioWithOficinaForm(FlaskForm):
@@ -37,6 +33,5 @@ class CitOficinaServicioWithOficinaForm(FlaskForm):
         """Inicializar y cargar opciones para cit_servicio"""
         super().__init__()
         self.cit_servicio.choices = [
-            (s.id, s.clave + " - " + s.descripcion)
-            for s in CitServicio.query.filter_by(estatus="A").order_by(CitServicio.clave).all()
+            (s.id, s.clave + " - " + s.descripcion) for s in get_catalog_records("cit_servicios", "clave")
         ]
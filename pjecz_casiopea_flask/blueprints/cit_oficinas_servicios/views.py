@@ -7,11 +7,12 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
 from ..cit_servicios.models import CitServicio
-from ..modulos.models import Modulo
 from ..oficinas.models import Oficina
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
@@ -170,14 +171,15 @@ def new_with_cit_servicio(cit_servicio_id):
             flash(f"Ya existe la combinación de {descripcion}", "warning")
             return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id))
         if puede_existir:
-            puede_existir.recover()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Recuperada Cit Oficina-Servicio con {descripcion}"),
-                url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                puede_existir.recover()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Recuperada Cit Oficina-Servicio con {descripcion}"),
+                    url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id))
         cit_oficina_servicio = CitOficinaServicio(
@@ -185,14 +187,16 @@ def new_with_cit_servicio(cit_servicio_id):
             oficina_id=oficina.id,
             descripcion=descripcion,
         )
-        cit_oficina_servicio.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Cit Oficina-Servicio {descripcion}"),
-            url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            cit_oficina_servicio.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Cit Oficina-Servicio {descripcion}"),
+                url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id))
     form.cit_servicio.data = f"{cit_servicio.clave} - {cit_servicio.descripcion}"  # Read only string field
@@ -225,14 +229,15 @@ def new_with_oficina(oficina_id):
             flash(f"Ya existe la combinación de {descripcion}", "warning")
             return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id))
         if puede_existir:
-            puede_existir.recover()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Recuperada Cit Oficina-Servicio con {descripcion}"),
-                url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                puede_existir.recover()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Recuperada Cit Oficina-Servicio con {descripcion}"),
+                    url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=puede_existir.id))
         cit_oficina_servicio = CitOficinaServicio(
@@ -240,14 +245,16 @@ def new_with_oficina(oficina_id):
             oficina_id=oficina.id,
             descripcion=descripcion,
         )
-        cit_oficina_servicio.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Cit Oficina-Servicio {descripcion}"),
-            url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            cit_oficina_servicio.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Cit Oficina-Servicio {descripcion}"),
+                url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id))
     form.oficina.data = f"{oficina.clave} - {oficina.descripcion_corta}"  # Read only string field
@@ -268,14 +275,15 @@ def delete(cit_oficina_servicio_id):
         abort(400)
     cit_oficina_servicio = CitOficinaServicio.query.get_or_404(cit_oficina_servicio_id)
     if cit_oficina_servicio.estatus == "A":
-        cit_oficina_servicio.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Cit Oficina-Servicio {cit_oficina_servicio.descripcion}"),
-            url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_oficina_servicio.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Cit Oficina-Servicio {cit_oficina_servicio.descripcion}"),
+                url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id))
 
@@ -289,14 +297,15 @@ def recover(cit_oficina_servicio_id):
         abort(400)
     cit_oficina_servicio = CitOficinaServicio.query.get_or_404(cit_oficina_servicio_id)
     if cit_oficina_servicio.estatus == "B":
-        cit_oficina_servicio.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Cit Oficina-Servicio {cit_oficina_servicio.descripcion}"),
-            url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_oficina_servicio.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Cit Oficina-Servicio {cit_oficina_servicio.descripcion}"),
+                url=url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_oficinas_servicios.detail", cit_oficina_servicio_id=cit_oficina_servicio.id))
 
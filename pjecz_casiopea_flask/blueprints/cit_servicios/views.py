@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import CitServicioForm
@@ -201,14 +202,17 @@ def new():
                 dias_habilitados=dias_habilitados,
                 es_activo=form.es_activo.data,
             )
-            cit_servicio.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nuevo Servicio {cit_servicio.clave}"),
-                url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                cit_servicio.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nuevo Servicio {cit_servicio.clave}"),
+                    url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("cit_servicios")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     # Si viene cit_categoria_id en el URL, seleccionar esa categoría
@@ -275,14 +279,16 @@ def edit(cit_servicio_id):
             cit_servicio.hasta = hasta
             cit_servicio.dias_habilitados = dias_habilitados
             cit_servicio.es_activo = form.es_activo.data
-            cit_servicio.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Servicio {cit_servicio.clave}"),
-                url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                cit_servicio.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Servicio {cit_servicio.clave}"),
+                    url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("cit_servicios")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     # Convertir los dias habilitados a textos, por ejemplo "23" a "MARTES, MIERCOLES"
@@ -313,14 +319,16 @@ def delete(cit_servicio_id):
         abort(400)
     cit_servicio = CitServicio.query.get_or_404(cit_servicio_id)
     if cit_servicio.estatus == "A":
-        cit_servicio.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Servicio {cit_servicio.clave}"),
-            url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_servicio.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Servicio {cit_servicio.clave}"),
+                url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("cit_servicios")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id))
 
@@ -334,14 +342,16 @@ def recover(cit_servicio_id):
         abort(400)
     cit_servicio = CitServicio.query.get_or_404(cit_servicio_id)
     if cit_servicio.estatus == "B":
-        cit_servicio.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Servicio {cit_servicio.clave}"),
-            url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            cit_servicio.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Servicio {cit_servicio.clave}"),
+                url=url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("cit_servicios")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("cit_servicios.detail", cit_servicio_id=cit_servicio.id))
 
@@ -362,6 +372,7 @@ def toggle_es_activo_json(cit_servicio_id):
     # Cambiar es_activo a su opuesto y guardar
     cit_servicio.es_activo = not cit_servicio.es_activo
     cit_servicio.save()
+    bump_catalog_version("cit_servicios")
 
     # Entregar JSON
     return {
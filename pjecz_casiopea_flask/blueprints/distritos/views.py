@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import DistritoForm
@@ -144,14 +145,17 @@ def new():
                 es_distrito=form.es_distrito.data,
                 es_jurisdiccional=form.es_jurisdiccional.data,
             )
-            distrito.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nuevo Distrito {distrito.clave}"),
-                url=url_for("distritos.detail", distrito_id=distrito.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                distrito.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nuevo Distrito {distrito.clave}"),
+                    url=url_for("distritos.detail", distrito_id=distrito.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("distritos")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     return render_template("distritos/new.jinja2", form=form)
@@ -191,14 +195,16 @@ def edit(distrito_id):
             distrito.es_distrito_judicial = form.es_distrito_judicial.data
             distrito.es_distrito = form.es_distrito.data
             distrito.es_jurisdiccional = form.es_jurisdiccional.data
-            distrito.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Distrito {distrito.clave}"),
-                url=url_for("distritos.detail", distrito_id=distrito.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                distrito.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Distrito {distrito.clave}"),
+                    url=url_for("distritos.detail", distrito_id=distrito.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("distritos")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = distrito.clave
@@ -220,14 +226,16 @@ def delete(distrito_id):
         abort(400)
     distrito = Distrito.query.get_or_404(distrito_id)
     if distrito.estatus == "A":
-        distrito.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Distrito {distrito.clave}"),
-            url=url_for("distritos.detail", distrito_id=distrito.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            distrito.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Distrito {distrito.clave}"),
+                url=url_for("distritos.detail", distrito_id=distrito.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("distritos")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("distritos.detail", distrito_id=distrito.id))
 
@@ -241,14 +249,16 @@ def recover(distrito_id):
         abort(400)
     distrito = Distrito.query.get_or_404(distrito_id)
     if distrito.estatus == "B":
-        distrito.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Distrito {distrito.clave}"),
-            url=url_for("distritos.detail", distrito_id=distrito.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            distrito.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Distrito {distrito.clave}"),
+                url=url_for("distritos.detail", distrito_id=distrito.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("distritos")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("distritos.detail", distrito_id=distrito.id))
 
@@ -279,6 +289,7 @@ def toggle_es_activo_json(distrito_id):
     # Cambiar es_activo a su opuesto y guardar
     distrito.es_activo = not distrito.es_activo
     distrito.save()
+    bump_catalog_version("distritos")
 
     # Entregar JSON
     return {
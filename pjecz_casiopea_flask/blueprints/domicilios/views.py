@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import DomicilioForm
@@ -157,14 +158,16 @@ def new():
             completo=f"{calle} #{num_ext} {num_int}, {colonia}, {municipio}, {estado}, C.P. {cp}",
             es_activo=es_activo,
         )
-        domicilio.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Domicilio {domicilio.edificio}"),
-            url=url_for("domicilios.detail", domicilio_id=domicilio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            domicilio.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Domicilio {domicilio.edificio}"),
+                url=url_for("domicilios.detail", domicilio_id=domicilio.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     return render_template("domicilios/new.jinja2", form=form)
@@ -208,14 +211,15 @@ def edit(domicilio_id):
             domicilio.cp = form.cp.data
             domicilio.completo = domicilio.elaborar_completo()
             domicilio.es_activo = form.es_activo.data
-            domicilio.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Domicilio {domicilio.edificio}"),
-                url=url_for("domicilios.detail", domicilio_id=domicilio.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                domicilio.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Domicilio {domicilio.edificio}"),
+                    url=url_for("domicilios.detail", domicilio_id=domicilio.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = domicilio.clave
@@ -240,14 +244,15 @@ def delete(domicilio_id):
         abort(400)
     domicilio = Domicilio.query.get_or_404(domicilio_id)
     if domicilio.estatus == "A":
-        domicilio.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Domicilio {domicilio.edificio}"),
-            url=url_for("domicilios.detail", domicilio_id=domicilio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            domicilio.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Domicilio {domicilio.edificio}"),
+                url=url_for("domicilios.detail", domicilio_id=domicilio.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("domicilios.detail", domicilio_id=domicilio.id))
 
@@ -261,14 +266,15 @@ def recover(domicilio_id):
         abort(400)
     domicilio = Domicilio.query.get_or_404(domicilio_id)
     if domicilio.estatus == "B":
-        domicilio.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Domicilio {domicilio.edificio}"),
-            url=url_for("domicilios.detail", domicilio_id=domicilio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            domicilio.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Domicilio {domicilio.edificio}"),
+                url=url_for("domicilios.detail", domicilio_id=domicilio.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("domicilios.detail", domicilio_id=domicilio.id))
 
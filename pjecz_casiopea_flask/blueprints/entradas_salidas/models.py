@@ -3,12 +3,16 @@ Entradas-Salidas
 """
 
 import uuid
+from datetime import datetime
 
-from sqlalchemy import Enum, ForeignKey, String
+from sqlalchemy import Enum, ForeignKey, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.functions import now
 
 from ...config.extensions import database
+from ...lib.audit_log import enqueue_audit_event
+from ...lib.partitions import add_default_partition
 from ...lib.universal_mixin import UniversalMixin
 
 
@@ -23,8 +27,15 @@ class EntradaSalida(database.Model, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "entradas_salidas"
 
-    # Clave primaria
+    # Índice para la paginación por llave (keyset) de los listados, particionada por mes con la columna creado
+    __table_args__ = (
+        Index("ix_entradas_salidas_creado_id", "creado", "id"),
+        {"postgresql_partition_by": "RANGE (creado)"},
+    )
+
+    # Clave primaria, incluye creado porque la llave de una tabla particionada debe contener la columna de partición
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    creado: Mapped[datetime] = mapped_column(primary_key=True, default=now(), server_default=now())
 
     # Claves foráneas
     usuario_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("usuarios.id"))
@@ -34,6 +45,22 @@ class EntradaSalida(database.Model, UniversalMixin):
     tipo: Mapped[str] = mapped_column(Enum(*TIPOS, name="entradas_salidas_tipos", native_enum=False), index=True)
     direccion_ip: Mapped[str] = mapped_column(String(64))
 
+    def enqueue(self):
+        """Encolar para que el auditor lo escriba en segundo plano, en lugar de insertarlo en la petición"""
+        enqueue_audit_event(
+            self.__tablename__,
+            {
+                "usuario_id": self.usuario_id,
+                "tipo": self.tipo,
+                "direccion_ip": self.direccion_ip,
+            },
+        )
+        return self
+
     def __repr__(self):
         """Representación"""
         return f"<EntradaSalida {self.id}>"
+
+
+# Crear la partición predeterminada junto con la tabla
+add_default_partition(EntradaSalida.__table__)
@@ -7,7 +7,13 @@ import json
 from flask import Blueprint, render_template, request, url_for
 from flask_login import login_required
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.datatables import (
+    CONTEO_ESTIMADO,
+    count_datatable,
+    get_datatable_parameters,
+    output_datatable_json,
+    paginate_datatable_keyset,
+)
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from ..usuarios.models import Usuario
@@ -15,6 +21,14 @@ from .models import EntradaSalida
 
 MODULO = "ENTRADAS SALIDAS"
 
+# Perfil de carga del DataTable, solo las columnas que se usan para elaborar los datos
+DATATABLE_PERFIL = {
+    "columnas": (EntradaSalida.id, EntradaSalida.creado, EntradaSalida.tipo, EntradaSalida.usuario_id),
+    "relaciones": {
+        EntradaSalida.usuario: (Usuario.id, Usuario.email),
+    },
+}
+
 entradas_salidas = Blueprint("entradas_salidas", __name__, template_folder="templates")
 
 
@@ -40,8 +54,8 @@ def datatable_json():
     if "usuario_id" in request.form:
         consulta = consulta.filter_by(usuario_id=request.form["usuario_id"])
     # Ordenar y paginar
-    registros = consulta.order_by(EntradaSalida.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, EntradaSalida, start, rows_per_page, DATATABLE_PERFIL)
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_ESTIMADO)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -56,7 +70,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @entradas_salidas.route("/entradas_salidas")
@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import MateriaForm
@@ -128,14 +129,17 @@ def new():
                 en_sentencias=form.en_sentencias.data,
                 en_exh_exhortos=form.en_exh_exhortos.data,
             )
-            materia.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nueva materia {materia.nombre}"),
-                url=url_for("materias.detail", materia_id=materia.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                materia.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nueva materia {materia.nombre}"),
+                    url=url_for("materias.detail", materia_id=materia.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("materias")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     return render_template("materias/new.jinja2", form=form)
@@ -173,14 +177,16 @@ def edit(materia_id):
             materia.descripcion = safe_string(form.descripcion.data, save_enie=True, to_uppercase=False)
             materia.en_sentencias = form.en_sentencias.data
             materia.en_exh_exhortos = form.en_exh_exhortos.data
-            materia.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editada materia {materia.nombre}"),
-                url=url_for("materias.detail", materia_id=materia.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                materia.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editada materia {materia.nombre}"),
+                    url=url_for("materias.detail", materia_id=materia.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("materias")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = materia.clave
@@ -200,14 +206,16 @@ def delete(materia_id):
         abort(400)
     materia = Materia.query.get_or_404(materia_id)
     if materia.estatus == "A":
-        materia.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminada materia {materia.nombre}"),
-            url=url_for("materias.detail", materia_id=materia.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            materia.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminada materia {materia.nombre}"),
+                url=url_for("materias.detail", materia_id=materia.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("materias")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("materias.detail", materia_id=materia.id))
 
@@ -221,14 +229,16 @@ def recover(materia_id):
         abort(400)
     materia = Materia.query.get_or_404(materia_id)
     if materia.estatus == "B":
-        materia.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperada materia {materia.nombre}"),
-            url=url_for("materias.detail", materia_id=materia.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            materia.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperada materia {materia.nombre}"),
+                url=url_for("materias.detail", materia_id=materia.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("materias")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("materias.detail", materia_id=materia.id))
 
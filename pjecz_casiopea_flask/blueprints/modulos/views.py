@@ -7,8 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.permissions_cache import bump_permissions_version
 from ...lib.safe_string import safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
@@ -115,14 +118,18 @@ def new():
             ruta=form.ruta.data,
             en_navegacion=form.en_navegacion.data,
         )
-        modulo.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Modulo {modulo.nombre}"),
-            url=url_for("modulos.detail", modulo_id=modulo.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            modulo.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Modulo {modulo.nombre}"),
+                url=url_for("modulos.detail", modulo_id=modulo.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
+        bump_catalog_version("modulos")
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     return render_template("modulos/new.jinja2", form=form)
@@ -153,14 +160,17 @@ def edit(modulo_id):
             modulo.icono = form.icono.data
             modulo.ruta = form.ruta.data
             modulo.en_navegacion = form.en_navegacion.data
-            modulo.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Modulo {modulo.nombre}"),
-                url=url_for("modulos.detail", modulo_id=modulo.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                modulo.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Modulo {modulo.nombre}"),
+                    url=url_for("modulos.detail", modulo_id=modulo.id),
+                )
+                bitacora.enqueue()
+            bump_permissions_version()
+            bump_catalog_version("modulos")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.nombre.data = modulo.nombre
@@ -181,18 +191,21 @@ def delete(modulo_id):
     este_modulo = Modulo.query.get_or_404(modulo_id)
     if este_modulo.estatus == "A":
         # Dar de baja el modulo
-        este_modulo.delete()
-        # Dar de baja los permisos asociados
-        for permiso in este_modulo.permisos:
-            permiso.delete()
-        # Guardar en la bitacora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Modulo {este_modulo.nombre}"),
-            url=url_for("modulos.detail", modulo_id=este_modulo.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            este_modulo.delete()
+            # Dar de baja los permisos asociados
+            for permiso in este_modulo.permisos:
+                permiso.delete()
+            # Guardar en la bitacora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Modulo {este_modulo.nombre}"),
+                url=url_for("modulos.detail", modulo_id=este_modulo.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
+        bump_catalog_version("modulos")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("modulos.detail", modulo_id=este_modulo.id))
 
@@ -207,18 +220,21 @@ def recover(modulo_id):
     este_modulo = Modulo.query.get_or_404(modulo_id)
     if este_modulo.estatus == "B":
         # Dar de alta el modulo
-        este_modulo.recover()
-        # Dar de alta los permisos asociados
-        for permiso in este_modulo.permisos:
-            permiso.recover()
-        # Guardar en la bitacora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Modulo {este_modulo.nombre}"),
-            url=url_for("modulos.detail", modulo_id=este_modulo.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            este_modulo.recover()
+            # Dar de alta los permisos asociados
+            for permiso in este_modulo.permisos:
+                permiso.recover()
+            # Guardar en la bitacora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Modulo {este_modulo.nombre}"),
+                url=url_for("modulos.detail", modulo_id=este_modulo.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
+        bump_catalog_version("modulos")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("modulos.detail", modulo_id=este_modulo.id))
 
@@ -6,8 +6,8 @@ from flask_wtf import FlaskForm
 from wtforms import BooleanField, IntegerField, SelectField, StringField, SubmitField, TimeField
 from wtforms.validators import DataRequired, Length, Optional, Regexp
 
+from ...lib.catalog_cache import get_catalog_records
 from ...lib.safe_string import CLAVE_REGEXP
-from ..distritos.models import Distrito
 from ..domicilios.models import Domicilio
 
 
@@ -31,9 +31,7 @@ class OficinaForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         """Inicializar y cargar opciones en domicilio"""
         super().__init__(*args, **kwargs)
-        self.distrito.choices = [
-            (d.id, d.nombre_corto) for d in Distrito.query.filter_by(estatus="A").order_by(Distrito.nombre_corto).all()
-        ]
+        self.distrito.choices = [(d.id, d.nombre_corto) for d in get_catalog_records("distritos", "nombre_corto")]
         self.domicilio.choices = [
             (d.id, d.edificio) for d in Domicilio.query.filter_by(estatus="A").order_by(Domicilio.edificio).all()
         ]
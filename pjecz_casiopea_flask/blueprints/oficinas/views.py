@@ -8,10 +8,11 @@ from flask import Blueprint, abort, flash, redirect, render_template, request, u
 from flask_login import current_user, login_required
 from sqlalchemy import or_
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import OficinaForm
@@ -150,14 +151,17 @@ def new():
             puede_enviar_qr=form.puede_enviar_qr.data,
             es_activo=form.es_activo.data,
         )
-        oficina.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Oficina {oficina.clave}"),
-            url=url_for("oficinas.detail", oficina_id=oficina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            oficina.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Oficina {oficina.clave}"),
+                url=url_for("oficinas.detail", oficina_id=oficina.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("oficinas")
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     return render_template("oficinas/new.jinja2", form=form)
@@ -194,14 +198,16 @@ def edit(oficina_id):
             oficina.puede_agendar_citas = form.puede_agendar_citas.data
             oficina.puede_enviar_qr = form.puede_enviar_qr.data
             oficina.es_activo = form.es_activo.data
-            oficina.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Oficina {oficina.clave}"),
-                url=url_for("oficinas.detail", oficina_id=oficina.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                oficina.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Oficina {oficina.clave}"),
+                    url=url_for("oficinas.detail", oficina_id=oficina.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("oficinas")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = oficina.clave
@@ -227,14 +233,16 @@ def delete(oficina_id):
         abort(400)
     oficina = Oficina.query.get_or_404(oficina_id)
     if oficina.estatus == "A":
-        oficina.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Oficina {oficina.clave}"),
-            url=url_for("oficinas.detail", oficina_id=oficina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            oficina.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Oficina {oficina.clave}"),
+                url=url_for("oficinas.detail", oficina_id=oficina.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("oficinas")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("oficinas.detail", oficina_id=oficina.id))
 
@@ -248,14 +256,16 @@ def recover(oficina_id):
         abort(400)
     oficina = Oficina.query.get_or_404(oficina_id)
     if oficina.estatus == "B":
-        oficina.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Oficina {oficina.clave}"),
-            url=url_for("oficinas.detail", oficina_id=oficina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            oficina.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Oficina {oficina.clave}"),
+                url=url_for("oficinas.detail", oficina_id=oficina.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("oficinas")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("oficinas.detail", oficina_id=oficina.id))
 
@@ -295,6 +305,7 @@ def toggle_es_activo_json(oficina_id):
     # Cambiar es_activo a su opuesto y guardar
     oficina.es_activo = not oficina.es_activo
     oficina.save()
+    bump_catalog_version("oficinas")
 
     # Entregar JSON
     return {
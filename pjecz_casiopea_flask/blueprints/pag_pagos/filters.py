@@ -0,0 +1,58 @@
+"""
+Pag Pagos, filtros
+"""
+
+from ...lib.safe_string import safe_email, safe_string
+from ..cit_clientes.models import CitCliente
+from .models import PagPago
+
+
+def filter_pag_pagos(consulta, filtros: dict, con_cit_cliente: bool = False):
+    """Filtrar la consulta de Pag Pagos con los filtros del DataTable, con_cit_cliente agrega la unión para exportar"""
+    # Primero filtrar por columnas propias
+    if "estatus" in filtros:
+        consulta = consulta.filter(PagPago.estatus == filtros["estatus"])
+    else:
+        consulta = consulta.filter(PagPago.estatus == "A")
+    if "autoridad_id" in filtros:
+        consulta = consulta.filter(PagPago.autoridad_id == filtros["autoridad_id"])
+    if "cit_cliente_id" in filtros:
+        consulta = consulta.filter(PagPago.cit_cliente_id == filtros["cit_cliente_id"])
+    if "distrito_id" in filtros:
+        consulta = consulta.filter(PagPago.distrito_id == filtros["distrito_id"])
+    if "pag_tramite_servicio_id" in filtros:
+        consulta = consulta.filter(PagPago.pag_tramite_servicio_id == filtros["pag_tramite_servicio_id"])
+    if "estado" in filtros:
+        estado = safe_string(filtros["estado"])
+        if estado != "":
+            consulta = consulta.filter(PagPago.estado == estado)
+    # Luego filtrar por columnas de otras tablas
+    cit_cliente_email = ""
+    if "cit_cliente_email" in filtros:
+        cit_cliente_email = safe_email(filtros["cit_cliente_email"], search_fragment=True)
+    cit_cliente_nombres = ""
+    if "cit_cliente_nombres" in filtros:
+        cit_cliente_nombres = safe_string(filtros["cit_cliente_nombres"], save_enie=True)
+    cit_cliente_apellido_primero = ""
+    if "cit_cliente_apellido_primero" in filtros:
+        cit_cliente_apellido_primero = safe_string(filtros["cit_cliente_apellido_primero"], save_enie=True)
+    cit_cliente_apellido_segundo = ""
+    if "cit_cliente_apellido_segundo" in filtros:
+        cit_cliente_apellido_segundo = safe_string(filtros["cit_cliente_apellido_segundo"], save_enie=True)
+    if (
+        con_cit_cliente
+        or cit_cliente_email != ""
+        or cit_cliente_nombres != ""
+        or cit_cliente_apellido_primero != ""
+        or cit_cliente_apellido_segundo != ""
+    ):
+        consulta = consulta.join(CitCliente)
+        if cit_cliente_email != "":
+            consulta = consulta.filter(CitCliente.email.contains(cit_cliente_email))
+        if cit_cliente_nombres != "":
+            consulta = consulta.filter(CitCliente.nombres_busqueda.contains(cit_cliente_nombres))
+        if cit_cliente_apellido_primero != "":
+            consulta = consulta.filter(CitCliente.apellido_primero_busqueda.contains(cit_cliente_apellido_primero))
+        if cit_cliente_apellido_segundo != "":
+            consulta = consulta.filter(CitCliente.apellido_segundo_busqueda.contains(cit_cliente_apellido_segundo))
+    return consulta
@@ -0,0 +1,79 @@
+"""
+Pag Pagos, tareas en el fondo
+"""
+
+from ...lib.catalog_cache import get_catalog
+from ...lib.exceptions import MyAnyError
+from ...lib.exports import export_download_url, export_query
+from ...lib.tasks import set_task_error, set_task_progress
+from ..cit_clientes.models import CitCliente
+from .filters import filter_pag_pagos
+from .models import PagPago
+
+# Columnas y encabezados de la exportación, el distrito, la autoridad y el trámite se toman del catálogo en memoria
+EXPORTAR_COLUMNAS = (
+    PagPago.creado,
+    PagPago.folio,
+    PagPago.estado,
+    PagPago.cantidad,
+    PagPago.total,
+    PagPago.caducidad,
+    PagPago.email,
+    PagPago.distrito_id,
+    PagPago.autoridad_id,
+    PagPago.pag_tramite_servicio_id,
+    CitCliente.nombres,
+    CitCliente.apellido_primero,
+    CitCliente.apellido_segundo,
+)
+EXPORTAR_ENCABEZADOS = (
+    "Creado",
+    "Folio",
+    "Estado",
+    "Cantidad",
+    "Total",
+    "Caducidad",
+    "Correo electrónico",
+    "Distrito",
+    "Autoridad",
+    "Trámite o servicio",
+    "Nombres",
+    "Primer apellido",
+    "Segundo apellido",
+)
+
+
+def lanzar_exportar(filtros: dict, formato: str) -> str:
+    """Lanzar tarea en el fondo para exportar los pagos a un archivo CSV o XLSX"""
+    set_task_progress(0, "Se ha lanzado la tarea en el fondo para exportar los pagos")
+
+    # Tomar una sola vez los catálogos de distritos, autoridades y trámites
+    distritos = get_catalog("distritos").por_id
+    autoridades = get_catalog("autoridades").por_id
+    pag_tramites_servicios = get_catalog("pag_tramites_servicios").por_id
+
+    # Convertir cada renglón, cambiando los id del distrito, la autoridad y el trámite por sus claves
+    def convertir(renglon) -> tuple:
+        """Convertir el renglón de la consulta en el renglón del archivo"""
+        distrito = distritos.get(renglon.distrito_id)
+        autoridad = autoridades.get(renglon.autoridad_id)
+        pag_tramite_servicio = pag_tramites_servicios.get(renglon.pag_tramite_servicio_id)
+        return (
+            *renglon[:7],
+            distrito.clave if distrito else "",
+            autoridad.clave if autoridad else "",
+            pag_tramite_servicio.clave if pag_tramite_servicio else "",
+            *renglon[10:],
+        )
+
+    # Exportar
+    consulta = filter_pag_pagos(PagPago.query, filtros, con_cit_cliente=True).order_by(PagPago.creado, PagPago.id)
+    try:
+        ruta, cantidad = export_query(consulta, EXPORTAR_COLUMNAS, EXPORTAR_ENCABEZADOS, convertir, "pagos", formato)
+    except MyAnyError as error:
+        mensaje_error = str(error)
+        set_task_error(mensaje_error)
+        return mensaje_error
+    mensaje_termino = f"Se han exportado {cantidad} pagos a {ruta.name}"
+    set_task_progress(100, mensaje_termino, ruta.name, export_download_url())
+    return mensaje_termino
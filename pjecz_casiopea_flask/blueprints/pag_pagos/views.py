@@ -7,17 +7,53 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
-from ...lib.safe_string import safe_email, safe_message, safe_string, safe_uuid
+from ...lib.catalog_cache import get_catalog_by_clave
+from ...lib.datatables import (
+    CONTEO_ESTIMADO,
+    count_datatable,
+    get_datatable_parameters,
+    output_datatable_json,
+    paginate_datatable_keyset,
+)
+from ...lib.exports import EXPORTACION_FORMATOS, EXPORTACION_SEGUNDOS, get_export_filters
+from ...lib.safe_string import safe_message, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
+from ..autoridades.models import Autoridad
 from ..bitacoras.models import Bitacora
 from ..cit_clientes.models import CitCliente
-from ..modulos.models import Modulo
+from ..distritos.models import Distrito
+from ..pag_tramites_servicios.models import PagTramiteServicio
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
+from .filters import filter_pag_pagos
 from .models import PagPago
 
 MODULO = "PAG PAGOS"
 
+# Perfil de carga del DataTable, solo las columnas que se usan para elaborar los datos
+DATATABLE_PERFIL = {
+    "columnas": (
+        PagPago.id,
+        PagPago.creado,
+        PagPago.cit_cliente_id,
+        PagPago.estado,
+        PagPago.folio,
+        PagPago.total,
+    ),
+    "relaciones": {
+        PagPago.autoridad: (Autoridad.id, Autoridad.clave),
+        PagPago.cit_cliente: (
+            CitCliente.id,
+            CitCliente.email,
+            CitCliente.nombres,
+            CitCliente.apellido_primero,
+            CitCliente.apellido_segundo,
+        ),
+        PagPago.distrito: (Distrito.id, Distrito.clave),
+        PagPago.pag_tramite_servicio: (PagTramiteServicio.id, PagTramiteServicio.clave, PagTramiteServicio.descripcion),
+    },
+}
+
 pag_pagos = Blueprint("pag_pagos", __name__, template_folder="templates")
 
 
@@ -34,55 +70,10 @@ def datatable_json():
     # Tomar parámetros de Datatables
     draw, start, rows_per_page = get_datatable_parameters()
     # Consultar
-    consulta = PagPago.query
-    # Primero filtrar por columnas propias
-    if "estatus" in request.form:
-        consulta = consulta.filter(PagPago.estatus == request.form["estatus"])
-    else:
-        consulta = consulta.filter(PagPago.estatus == "A")
-    if "autoridad_id" in request.form:
-        consulta = consulta.filter(PagPago.autoridad_id == request.form["autoridad_id"])
-    if "cit_cliente_id" in request.form:
-        consulta = consulta.filter(PagPago.cit_cliente_id == request.form["cit_cliente_id"])
-    if "distrito_id" in request.form:
-        consulta = consulta.filter(PagPago.distrito_id == request.form["distrito_id"])
-    if "pag_tramite_servicio_id" in request.form:
-        consulta = consulta.filter(PagPago.pag_tramite_servicio_id == request.form["pag_tramite_servicio_id"])
-    if "estado" in request.form:
-        estado = safe_string(request.form["estado"])
-        if estado != "":
-            consulta = consulta.filter(PagPago.estado == estado)
-    # Luego filtrar por columnas de otras tablas
-    cit_cliente_email = ""
-    if "cit_cliente_email" in request.form:
-        cit_cliente_email = safe_email(request.form["cit_cliente_email"], search_fragment=True)
-    cit_cliente_nombres = ""
-    if "cit_cliente_nombres" in request.form:
-        cit_cliente_nombres = safe_string(request.form["cit_cliente_nombres"], save_enie=True)
-    cit_cliente_apellido_primero = ""
-    if "cit_cliente_apellido_primero" in request.form:
-        cit_cliente_apellido_primero = safe_string(request.form["cit_cliente_apellido_primero"], save_enie=True)
-    cit_cliente_apellido_segundo = ""
-    if "cit_cliente_apellido_segundo" in request.form:
-        cit_cliente_apellido_segundo = safe_string(request.form["cit_cliente_apellido_segundo"], save_enie=True)
-    if (
-        cit_cliente_email != ""
-        or cit_cliente_nombres != ""
-        or cit_cliente_apellido_primero != ""
-        or cit_cliente_apellido_segundo != ""
-    ):
-        consulta = consulta.join(CitCliente)
-        if cit_cliente_email != "":
-            consulta = consulta.filter(CitCliente.email.contains(cit_cliente_email))
-        if cit_cliente_nombres != "":
-            consulta = consulta.filter(CitCliente.nombres.contains(cit_cliente_nombres))
-        if cit_cliente_apellido_primero != "":
-            consulta = consulta.filter(CitCliente.apellido_primero.contains(cit_cliente_apellido_primero))
-        if cit_cliente_apellido_segundo != "":
-            consulta = consulta.filter(CitCliente.apellido_segundo.contains(cit_cliente_apellido_segundo))
+    consulta = filter_pag_pagos(PagPago.query, request.form)
     # Ordenar y paginar
-    registros = consulta.order_by(PagPago.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, PagPago, start, rows_per_page, DATATABLE_PERFIL)
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_ESTIMADO)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -121,7 +112,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @pag_pagos.route("/pag_pagos")
@@ -147,6 +138,30 @@ def list_inactive():
     )
 
 
+@pag_pagos.route("/pag_pagos/exportar/<formato>")
+@permission_required(MODULO, Permiso.ADMINISTRAR)
+def export(formato):
+    """Lanzar la tarea en el fondo para exportar los pagos a un archivo CSV o XLSX, con los filtros del listado"""
+    if formato not in EXPORTACION_FORMATOS:
+        abort(400)
+    comando = "pag_pagos.tasks.lanzar_exportar"
+    # Si ya hay una exportación en proceso, mostrarla en lugar de lanzar otra
+    tarea = current_user.get_task_in_progress(comando)
+    if tarea is not None:
+        flash("Ya hay una exportación de pagos en proceso, espere a que termine", "warning")
+        return redirect(url_for("tareas.detail", tarea_id=tarea.id))
+    # Lanzar la tarea en el fondo
+    tarea = current_user.launch_task(
+        comando=comando,
+        mensaje=f"Exportando los pagos a {formato.upper()}",
+        filtros=get_export_filters(),
+        formato=formato,
+        job_timeout=EXPORTACION_SEGUNDOS,
+    )
+    flash(f"Se ha lanzado la tarea en el fondo para exportar los pagos a {formato.upper()}", "info")
+    return redirect(url_for("tareas.detail", tarea_id=tarea.id))
+
+
 @pag_pagos.route("/pag_pagos/<pag_pago_id>")
 def detail(pag_pago_id):
     """Detalle de un pago"""
@@ -169,14 +184,15 @@ def delete(pag_pago_id):
         abort(400)
     pag_pago = PagPago.query.get_or_404(pag_pago_id)
     if pag_pago.estatus == "A":
-        pag_pago.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado pago {pag_pago.id}"),
-            url=url_for("pag_pagos.detail", pag_pago_id=pag_pago.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            pag_pago.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado pago {pag_pago.id}"),
+                url=url_for("pag_pagos.detail", pag_pago_id=pag_pago.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("pag_pagos.detail", pag_pago_id=pag_pago.id))
 
@@ -190,13 +206,14 @@ def recover(pag_pago_id):
         abort(400)
     pag_pago = PagPago.query.get_or_404(pag_pago_id)
     if pag_pago.estatus == "B":
-        pag_pago.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Pago {pag_pago.id}"),
-            url=url_for("pag_pagos.detail", pag_pago_id=pag_pago.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            pag_pago.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Pago {pag_pago.id}"),
+                url=url_for("pag_pagos.detail", pag_pago_id=pag_pago.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("pag_pagos.detail", pag_pago_id=pag_pago.id))
@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import bump_catalog_version, get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_url, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import PagTramiteServicioForm
@@ -132,14 +133,17 @@ def new():
         # Si es válido, guardar
         if es_valido:
             pag_tramite_servicio = PagTramiteServicio(clave=clave, descripcion=descripcion, costo=costo, url=url)
-            pag_tramite_servicio.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nuevo Trámite o Servicio {pag_tramite_servicio.clave}"),
-                url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                pag_tramite_servicio.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nuevo Trámite o Servicio {pag_tramite_servicio.clave}"),
+                    url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("pag_tramites_servicios")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     return render_template("pag_tramites_servicios/new.jinja2", form=form)
@@ -169,14 +173,16 @@ def edit(pag_tramite_servicio_id):
             pag_tramite_servicio.descripcion = safe_string(form.descripcion.data, save_enie=True)
             pag_tramite_servicio.costo = form.costo.data
             pag_tramite_servicio.url = safe_url(form.url.data)
-            pag_tramite_servicio.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Trámite o Servicio {pag_tramite_servicio.clave}"),
-                url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                pag_tramite_servicio.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Trámite o Servicio {pag_tramite_servicio.clave}"),
+                    url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
+                )
+                bitacora.enqueue()
+            bump_catalog_version("pag_tramites_servicios")
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = pag_tramite_servicio.clave
@@ -195,14 +201,16 @@ def delete(pag_tramite_servicio_id):
         abort(400)
     pag_tramite_servicio = PagTramiteServicio.query.get_or_404(pag_tramite_servicio_id)
     if pag_tramite_servicio.estatus == "A":
-        pag_tramite_servicio.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado PagTramiteServicio {pag_tramite_servicio.clave}"),
-            url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            pag_tramite_servicio.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado PagTramiteServicio {pag_tramite_servicio.clave}"),
+                url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("pag_tramites_servicios")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id))
 
@@ -216,14 +224,16 @@ def recover(pag_tramite_servicio_id):
         abort(400)
     pag_tramite_servicio = PagTramiteServicio.query.get_or_404(pag_tramite_servicio_id)
     if pag_tramite_servicio.estatus == "B":
-        pag_tramite_servicio.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado PagTramiteServicio {pag_tramite_servicio.clave}"),
-            url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            pag_tramite_servicio.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado PagTramiteServicio {pag_tramite_servicio.clave}"),
+                url=url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id),
+            )
+            bitacora.enqueue()
+        bump_catalog_version("pag_tramites_servicios")
         flash(bitacora.descripcion, "success")
     return redirect(url_for("pag_tramites_servicios.detail", pag_tramite_servicio_id=pag_tramite_servicio.id))
 
@@ -246,6 +256,7 @@ def toggle_es_activo_json(pag_tramite_servicio_id):
     # Cambiar es_activo a su opuesto y guardar
     pag_tramite_servicio.es_activo = not pag_tramite_servicio.es_activo
     pag_tramite_servicio.save()
+    bump_catalog_version("pag_tramites_servicios")
 
     # Entregar JSON
     return {
@@ -6,7 +6,7 @@ from flask_wtf import FlaskForm
 from wtforms import RadioField, SelectField, StringField, SubmitField
 from wtforms.validators import DataRequired
 
-from ..modulos.models import Modulo
+from ...lib.catalog_cache import get_catalog_records
 from ..roles.models import Rol
 
 NIVELES = [
@@ -51,4 +51,4 @@ class PermisoNewWithRolForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         """Inicializar y cargar opciones en módulo"""
         super().__init__(*args, **kwargs)
-        self.modulo.choices = [(m.id, m.nombre) for m in Modulo.query.filter_by(estatus="A").order_by(Modulo.nombre).all()]
+        self.modulo.choices = [(m.id, m.nombre) for m in get_catalog_records("modulos", "nombre")]
@@ -7,8 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.permissions_cache import bump_permissions_version
 from ...lib.safe_string import safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
 from ..modulos.models import Modulo
 from ..roles.models import Rol
@@ -131,6 +134,7 @@ def new_with_rol(rol_id):
                 permiso_existente.nivel = nivel
                 permiso_existente.estatus = "A"
                 permiso_existente.save()
+                bump_permissions_version()
                 flash(f"Se ha recuperado {nombre}.", "success")
             else:
                 flash(f"Ya existe {nombre}. Nada por hacer.", "warning")
@@ -142,6 +146,7 @@ def new_with_rol(rol_id):
             nivel=nivel,
         )
         permiso.save()
+        bump_permissions_version()
         flash(safe_message(f"Nuevo permiso {nombre}"), "success")
         return redirect(url_for("roles.detail", rol_id=rol.id))
     form.rol.data = rol.nombre  # Solo lectura
@@ -172,6 +177,7 @@ def new_with_modulo(modulo_id):
                 permiso_existente.nivel = nivel
                 permiso_existente.estatus = "A"
                 permiso_existente.save()
+                bump_permissions_version()
                 flash(f"Se ha recuperado {nombre}.", "success")
             else:
                 flash(f"Ya existe {nombre}. Nada por hacer.", "warning")
@@ -183,6 +189,7 @@ def new_with_modulo(modulo_id):
             nivel=nivel,
         )
         permiso.save()
+        bump_permissions_version()
         flash(safe_message(f"Nuevo permiso {nombre}"), "success")
         return redirect(url_for("modulos.detail", modulo_id=modulo.id))
     form.modulo.data = modulo.nombre  # Solo lectura
@@ -206,14 +213,16 @@ def edit(permiso_id):
     if form.validate_on_submit():
         permiso.nivel = form.nivel.data
         permiso.nombre = f"{permiso.rol.nombre} puede {Permiso.NIVELES[permiso.nivel]} en {permiso.modulo.nombre}"
-        permiso.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Editado Permiso {permiso.nombre}"),
-            url=url_for("permisos.detail", permiso_id=permiso.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            permiso.save()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Editado Permiso {permiso.nombre}"),
+                url=url_for("permisos.detail", permiso_id=permiso.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     form.modulo.data = permiso.modulo.nombre  # Solo lectura
@@ -231,14 +240,16 @@ def delete(permiso_id):
         abort(400)
     permiso = Permiso.query.get_or_404(permiso_id)
     if permiso.estatus == "A":
-        permiso.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Permiso {permiso.nombre}"),
-            url=url_for("permisos.detail", permiso_id=permiso.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            permiso.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Permiso {permiso.nombre}"),
+                url=url_for("permisos.detail", permiso_id=permiso.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("permisos.detail", permiso_id=permiso.id))
 
@@ -252,13 +263,15 @@ def recover(permiso_id):
         abort(400)
     permiso = Permiso.query.get_or_404(permiso_id)
     if permiso.estatus == "B":
-        permiso.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Permiso {permiso.nombre}"),
-            url=url_for("permisos.detail", permiso_id=permiso.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            permiso.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Permiso {permiso.nombre}"),
+                url=url_for("permisos.detail", permiso_id=permiso.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("permisos.detail", permiso_id=permiso.id))
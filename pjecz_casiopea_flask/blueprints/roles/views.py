@@ -7,10 +7,12 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.permissions_cache import bump_permissions_version
 from ...lib.safe_string import safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import RolForm
@@ -108,14 +110,17 @@ def new():
             return render_template("roles/new.jinja2", form=form)
         # Guardar
         rol = Rol(nombre=nombre)
-        rol.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Rol {rol.nombre}"),
-            url=url_for("roles.detail", rol_id=rol.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            rol.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Rol {rol.nombre}"),
+                url=url_for("roles.detail", rol_id=rol.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     return render_template("roles/new.jinja2", form=form)
@@ -142,14 +147,16 @@ def edit(rol_id):
         # Si es valido actualizar
         if es_valido:
             rol.nombre = nombre
-            rol.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Rol {rol.nombre}"),
-                url=url_for("roles.detail", rol_id=rol.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                rol.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Rol {rol.nombre}"),
+                    url=url_for("roles.detail", rol_id=rol.id),
+                )
+                bitacora.enqueue()
+            bump_permissions_version()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.nombre.data = rol.nombre
@@ -166,21 +173,23 @@ def delete(rol_id):
     rol = Rol.query.get_or_404(rol_id)
     if rol.estatus == "A":
         # Dar de baja el rol
-        rol.delete()
-        # Dar de baja los permisos del rol
-        for permiso in rol.permisos:
-            permiso.delete()
-        # Dar de baja los usuarios del rol
-        for usuario_rol in rol.usuarios_roles:
-            usuario_rol.delete()
-        # Guardar en la bitacora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Rol {rol.nombre}"),
-            url=url_for("roles.detail", rol_id=rol.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            rol.delete()
+            # Dar de baja los permisos del rol
+            for permiso in rol.permisos:
+                permiso.delete()
+            # Dar de baja los usuarios del rol
+            for usuario_rol in rol.usuarios_roles:
+                usuario_rol.delete()
+            # Guardar en la bitacora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Rol {rol.nombre}"),
+                url=url_for("roles.detail", rol_id=rol.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("roles.detail", rol_id=rol.id))
 
@@ -195,21 +204,23 @@ def recover(rol_id):
     rol = Rol.query.get_or_404(rol_id)
     if rol.estatus == "B":
         # Dar de alta el rol
-        rol.recover()
-        # Dar de alta los permisos del rol
-        for permiso in rol.permisos:
-            permiso.recover()
-        # Dar de alta los usuarios del rol
-        for usuario_rol in rol.usuarios_roles:
-            usuario_rol.recover()
-        # Guardar en la bitacora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Rol {rol.nombre}"),
-            url=url_for("roles.detail", rol_id=rol.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            rol.recover()
+            # Dar de alta los permisos del rol
+            for permiso in rol.permisos:
+                permiso.recover()
+            # Dar de alta los usuarios del rol
+            for usuario_rol in rol.usuarios_roles:
+                usuario_rol.recover()
+            # Guardar en la bitacora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Rol {rol.nombre}"),
+                url=url_for("roles.detail", rol_id=rol.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("roles.detail", rol_id=rol.id))
 
@@ -0,0 +1,63 @@
+"""
+Tareas, eventos de Socket.IO
+
+Los workers publican el progreso de las tareas en un canal de Redis (ver lib/tasks.py). Cada proceso de la aplicación
+se suscribe una sola vez a ese canal, al conectarse el primer navegador, y reenvía cada evento al cuarto del usuario
+dueño de la tarea. Así el navegador recibe el avance sin consultar el DataTable una y otra vez.
+"""
+
+import json
+import threading
+
+from flask import current_app
+from flask_login import current_user
+from flask_socketio import Namespace, join_room
+from redis.exceptions import RedisError
+
+from ...config.extensions import socketio
+from ...lib.tasks import PROGRESO_CANAL
+
+TAREAS_NAMESPACE = "/tareas"
+RETRANSMISOR_REINTENTO_SEGUNDOS = 5
+
+retransmisor_candado = threading.Lock()
+retransmisor_iniciado = threading.Event()
+
+
+def relay_task_progress(redis_client) -> None:
+    """Escuchar el canal de progreso y reenviar cada evento al cuarto de su usuario, reconectándose si falla Redis"""
+    while True:
+        try:
+            suscripcion = redis_client.pubsub(ignore_subscribe_messages=True)
+            suscripcion.subscribe(PROGRESO_CANAL)
+            for mensaje in suscripcion.listen():
+                try:
+                    evento = json.loads(mensaje["data"])
+                except (TypeError, ValueError):
+                    continue
+                usuario_id = evento.pop("usuario_id", "")
+                if usuario_id != "":
+                    socketio.emit("progreso", evento, namespace=TAREAS_NAMESPACE, to=usuario_id)
+        except RedisError:
+            socketio.sleep(RETRANSMISOR_REINTENTO_SEGUNDOS)
+
+
+def start_task_progress_relay(redis_client) -> None:
+    """Iniciar el retransmisor en segundo plano, solo una vez por proceso"""
+    with retransmisor_candado:
+        if retransmisor_iniciado.is_set():
+            return
+        socketio.start_background_task(relay_task_progress, redis_client)
+        retransmisor_iniciado.set()
+
+
+class TareasNamespace(Namespace):
+    """Namespace de Socket.IO con el progreso de las tareas"""
+
+    def on_connect(self, auth=None):
+        """Solo se conectan los usuarios autenticados, cada uno a su propio cuarto"""
+        if not current_user.is_authenticated:
+            return False
+        start_task_progress_relay(current_app.redis)
+        join_room(str(current_user.id))
+        return True
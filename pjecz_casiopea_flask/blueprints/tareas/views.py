@@ -4,17 +4,26 @@ Tareas, vistas
 
 import json
 
-from flask import Blueprint, abort, render_template, request, url_for
+from flask import Blueprint, abort, current_app, render_template, request, send_from_directory, url_for
 from flask_login import current_user, login_required
 
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.datatables import count_datatable, get_datatable_parameters, output_datatable_json, paginate_datatable_keyset
 from ...lib.safe_string import safe_uuid
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
+from ..usuarios.models import Usuario
 from .models import Tarea
 
 MODULO = "TAREAS"
 
+# Perfil de carga del DataTable, solo las columnas que se usan para elaborar los datos
+DATATABLE_PERFIL = {
+    "columnas": (Tarea.id, Tarea.creado, Tarea.comando, Tarea.ha_terminado, Tarea.mensaje, Tarea.usuario_id),
+    "relaciones": {
+        Tarea.usuario: (Usuario.id, Usuario.email),
+    },
+}
+
 tareas = Blueprint("tareas", __name__, template_folder="templates")
 
 
@@ -44,8 +53,8 @@ def datatable_json():
     if "usuario_id" in request.form:
         consulta = consulta.filter_by(usuario_id=request.form["usuario_id"])
     # Ordenar y paginar
-    registros = consulta.order_by(Tarea.creado.desc()).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    registros, cursor = paginate_datatable_keyset(consulta, Tarea, start, rows_per_page, DATATABLE_PERFIL)
+    total = count_datatable(consulta, start, rows_per_page, registros)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -67,7 +76,7 @@ def datatable_json():
             }
         )
     # Entregar JSON
-    return output_datatable_json(draw, total, data)
+    return output_datatable_json(draw, total, data, cursor)
 
 
 @tareas.route("/tareas")
@@ -105,3 +114,18 @@ def detail(tarea_id):
         abort(400)
     tarea = Tarea.query.get_or_404(tarea_id)
     return render_template("tareas/detail.jinja2", tarea=tarea)
+
+
+@tareas.route("/tareas/descargar/<tarea_id>")
+@login_required
+def download(tarea_id):
+    """Descargar el archivo de una Tarea, solo para su usuario o para quien administra las tareas"""
+    tarea_id = safe_uuid(tarea_id)
+    if tarea_id == "":
+        abort(400)
+    tarea = Tarea.query.get_or_404(tarea_id)
+    if tarea.usuario_id != current_user.id and not current_user.can_admin(MODULO):
+        abort(403)
+    if tarea.archivo == "" or current_app.config["EXPORTS_DIR"] == "":
+        abort(404)
+    return send_from_directory(current_app.config["EXPORTS_DIR"], tarea.archivo, as_attachment=True)
@@ -13,6 +13,10 @@ from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ...config.extensions import database, pwd_context
+from ...lib.cryptography_api_key import decode_api_key, verify_api_key
+from ...lib.permissions_cache import get_user_permissions
+from ...lib.search import add_search_keys, trigram_indexes
+from ...lib.tasks import get_task_priority
 from ...lib.universal_mixin import UniversalMixin
 from ..permisos.models import Permiso
 from ..tareas.models import Tarea
@@ -25,6 +29,11 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
     # Nombre de la tabla
     __tablename__ = "usuarios"
 
+    # Índices de trigramas para los filtros que buscan por fragmento
+    __table_args__ = trigram_indexes(
+        "usuarios", "email", "nombres_busqueda", "apellido_paterno_busqueda", "apellido_materno_busqueda", "puesto"
+    )
+
     # Clave primaria
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
@@ -37,6 +46,12 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
     nombres: Mapped[str] = mapped_column(String(256))
     apellido_paterno: Mapped[str] = mapped_column(String(256))
     apellido_materno: Mapped[str] = mapped_column(String(256))
+
+    # Llaves de búsqueda, se calculan al insertar y al actualizar
+    nombres_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+    apellido_paterno_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+    apellido_materno_busqueda: Mapped[str] = mapped_column(String(256), default="", server_default="")
+
     puesto: Mapped[str] = mapped_column(String(256))
     api_key: Mapped[Optional[str]] = mapped_column(String(128))
     api_key_expiracion: Mapped[Optional[datetime]]
@@ -49,10 +64,6 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
     usuarios_roles: Mapped[List["UsuarioRol"]] = relationship("UsuarioRol", back_populates="usuario")
     usuarios_oficinas: Mapped[List["UsuarioOficina"]] = relationship("UsuarioOficina", back_populates="usuario")
 
-    # Propiedades
-    modulos_menu_principal_consultados = []
-    permisos_consultados = {}
-
     @property
     def nombre(self):
         """Junta nombres, apellido_paterno y apellido materno"""
@@ -61,46 +72,29 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
     @property
     def modulos_menu_principal(self):
         """Elaborar listado con los módulos ordenados para el menu principal"""
-        if len(self.modulos_menu_principal_consultados) > 0:
-            return self.modulos_menu_principal_consultados
-        modulos = []
-        modulos_nombres = []
-        for usuario_rol in self.usuarios_roles:
-            if usuario_rol.estatus == "A":
-                for permiso in usuario_rol.rol.permisos:
-                    if (
-                        permiso.modulo.nombre not in modulos_nombres
-                        and permiso.estatus == "A"
-                        and permiso.nivel > 0
-                        and permiso.modulo.en_navegacion
-                    ):
-                        if current_app.config["ENVIRONMENT"].lower() == "production" and current_app.config["PREFIX"]:
-                            permiso.modulo.ruta = f"{current_app.config['PREFIX']}{permiso.modulo.ruta}"
-                        modulos.append(permiso.modulo)
-                        modulos_nombres.append(permiso.modulo.nombre)
-        self.modulos_menu_principal_consultados = sorted(modulos, key=lambda x: x.nombre_corto)
-        return self.modulos_menu_principal_consultados
+        return get_user_permissions(self.id).menu
 
     @property
     def permisos(self):
         """Entrega un diccionario con todos los permisos"""
-        if len(self.permisos_consultados) > 0:
-            return self.permisos_consultados
-        self.permisos_consultados = {}
-        for usuario_rol in self.usuarios_roles:
-            if usuario_rol.estatus == "A":
-                for permiso in usuario_rol.rol.permisos:
-                    if permiso.estatus == "A":
-                        etiqueta = permiso.modulo.nombre
-                        if etiqueta not in self.permisos_consultados or permiso.nivel > self.permisos_consultados[etiqueta]:
-                            self.permisos_consultados[etiqueta] = permiso.nivel
-        return self.permisos_consultados
+        return get_user_permissions(self.id).permisos
 
     @classmethod
     def find_by_identity(cls, identity):
         """Encontrar a un usuario por su correo electrónico"""
         return Usuario.query.filter(Usuario.email == identity).first()
 
+    @classmethod
+    def find_by_api_key(cls, api_key: str):
+        """Encontrar a un usuario activo por su API Key vigente, el descifrado se memoriza y la consulta es por e-mail"""
+        email = decode_api_key(api_key)
+        if email == "":
+            return None
+        usuario = Usuario.query.filter(Usuario.email == email).filter(Usuario.estatus == "A").first()
+        if usuario is None or verify_api_key(api_key, usuario.api_key, usuario.api_key_expiracion) == "":
+            return None
+        return usuario
+
     @property
     def is_active(self):
         """¿Es activo?"""
@@ -141,7 +135,13 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
 
     def launch_task(self, comando, mensaje, *args, **kwargs):
         """Lanzar tarea en el fondo"""
-        rq_job = current_app.task_queue.enqueue(f"pjecz_casiopea_flask.blueprints.{comando}", *args, **kwargs)
+        # La cola depende de la prioridad del comando y el usuario va en el meta para publicarle el progreso
+        rq_job = current_app.task_queues[get_task_priority(comando)].enqueue(
+            f"pjecz_casiopea_flask.blueprints.{comando}",
+            *args,
+            meta={"usuario_id": str(self.id)},
+            **kwargs,
+        )
         tarea = Tarea(id=rq_job.get_id(), comando=comando, mensaje=mensaje, usuario=self)
         tarea.save()
         return tarea
@@ -157,3 +157,14 @@ class Usuario(database.Model, UserMixin, UniversalMixin):
     def __repr__(self):
         """Representación"""
         return f"<Usuario {self.email}>"
+
+
+# Calcular las llaves de búsqueda de los nombres y apellidos
+add_search_keys(
+    Usuario,
+    {
+        "nombres_busqueda": "nombres",
+        "apellido_paterno_busqueda": "apellido_paterno",
+        "apellido_materno_busqueda": "apellido_materno",
+    },
+)
@@ -13,16 +13,18 @@ from flask_login import current_user, login_required, login_user, logout_user
 from pytz import timezone
 
 from ...config.firebase import get_firebase_settings
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.cryptography_api_key import generate_api_key
-from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.datatables import CONTEO_CACHE, count_datatable, get_datatable_parameters, output_datatable_json
+from ...lib.permissions_cache import bump_permissions_version
 from ...lib.pwgen import generar_contrasena
 from ...lib.safe_next_url import safe_next_url
 from ...lib.safe_string import CONTRASENA_REGEXP, EMAIL_REGEXP, TOKEN_REGEXP, safe_email, safe_message, safe_string, safe_uuid
-from ..autoridades.models import Autoridad
+from ...lib.search import search_key
+from ...lib.universal_mixin import UniversalMixin
+from ...lib.user_session_cache import delete_user_snapshot
 from ..bitacoras.models import Bitacora
-from ..distritos.models import Distrito
 from ..entradas_salidas.models import EntradaSalida
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from .decorators import anonymous_required, permission_required
 from .forms import AccesoForm, UsuarioForm
@@ -62,7 +64,7 @@ def login():
                                 usuario_id=usuario.id,
                                 tipo="INGRESO",
                                 direccion_ip=request.remote_addr,
-                            ).save()
+                            ).enqueue()
                             if siguiente_url:
                                 return redirect(safe_next_url(siguiente_url))
                             return redirect(url_for("sistemas.start"))
@@ -88,7 +90,7 @@ def login():
                             usuario_id=usuario.id,
                             tipo="INGRESO",
                             direccion_ip=request.remote_addr,
-                        ).save()
+                        ).enqueue()
                         if siguiente_url:
                             return redirect(safe_next_url(siguiente_url))
                         return redirect(url_for("sistemas.start"))
@@ -112,7 +114,7 @@ def logout():
         usuario_id=current_user.id,
         tipo="SALIO",
         direccion_ip=request.remote_addr,
-    ).save()
+    ).enqueue()
     logout_user()
     flash("Ha salido de este sistema.", "success")
     return redirect(url_for("usuarios.login"))
@@ -153,18 +155,18 @@ def datatable_json():
         consulta = consulta.filter(Usuario.autoridad_id != request.form["autoridad_id_diferente_a"])
     # Filtrar por las columnas de texto de Usuario
     if "nombres" in request.form:
-        consulta = consulta.filter(Usuario.nombres.contains(safe_string(request.form["nombres"])))
+        consulta = consulta.filter(Usuario.nombres_busqueda.contains(search_key(request.form["nombres"])))
     if "apellido_paterno" in request.form:
-        consulta = consulta.filter(Usuario.apellido_paterno.contains(safe_string(request.form["apellido_paterno"])))
+        consulta = consulta.filter(Usuario.apellido_paterno_busqueda.contains(search_key(request.form["apellido_paterno"])))
     if "apellido_materno" in request.form:
-        consulta = consulta.filter(Usuario.apellido_materno.contains(safe_string(request.form["apellido_materno"])))
+        consulta = consulta.filter(Usuario.apellido_materno_busqueda.contains(search_key(request.form["apellido_materno"])))
     if "puesto" in request.form:
         consulta = consulta.filter(Usuario.puesto.contains(safe_string(request.form["puesto"])))
     if "email" in request.form:
         consulta = consulta.filter(Usuario.email.contains(safe_email(request.form["email"], search_fragment=True)))
     # Ordenar y paginar
     registros = consulta.order_by(Usuario.email).offset(start).limit(rows_per_page).all()
-    total = consulta.count()
+    total = count_datatable(consulta, start, rows_per_page, registros, CONTEO_CACHE)
     # Elaborar datos para DataTable
     data = []
     for resultado in registros:
@@ -213,15 +215,16 @@ def request_api_key_json(usuario_id):
     if "action" in request.form and request.form["action"] == "clean":
         usuario.api_key = ""
         usuario.api_key_expiracion = datetime(year=2000, month=1, day=1)
-        usuario.save()
-        mensaje = f"La API Key de {usuario.email} fue eliminada"
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=mensaje,
-            url=url_for("usuarios.detail", usuario_id=usuario.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario.save()
+            mensaje = f"La API Key de {usuario.email} fue eliminada"
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=mensaje,
+                url=url_for("usuarios.detail", usuario_id=usuario.id),
+            )
+            bitacora.enqueue()
         return {
             "success": True,
             "message": mensaje,
@@ -237,15 +240,16 @@ def request_api_key_json(usuario_id):
             days = 90
         usuario.api_key = generate_api_key(usuario.email)
         usuario.api_key_expiracion = datetime.now() + timedelta(days=days)
-        usuario.save()
-        mensaje = f"Nueva API Key para {usuario.email} con expiración en {days} días"
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=mensaje,
-            url=url_for("usuarios.detail", usuario_id=usuario.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario.save()
+            mensaje = f"Nueva API Key para {usuario.email} con expiración en {days} días"
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=mensaje,
+                url=url_for("usuarios.detail", usuario_id=usuario.id),
+            )
+            bitacora.enqueue()
         return {
             "success": True,
             "message": mensaje,
@@ -358,24 +362,26 @@ def new():
                 api_key_expiracion=datetime(year=2000, month=1, day=1, hour=0, minute=0, second=0),
                 contrasena=generar_contrasena(),
             )
-            usuario.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nuevo Usuario {usuario.email}"),
-                url=url_for("usuarios.detail", usuario_id=usuario.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                usuario.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nuevo Usuario {usuario.email}"),
+                    url=url_for("usuarios.detail", usuario_id=usuario.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     # Consultar el distrito NO DEFINIDO
     distrito_no_definido_id = None
-    distrito_no_definido = Distrito.query.filter_by(clave="ND").first()
+    distrito_no_definido = get_catalog_by_clave("distritos", "ND")
     if distrito_no_definido:
         distrito_no_definido_id = str(distrito_no_definido.id)  # Es un SelectField
     # Consultar la autoridad NO DEFINIDO
     autoridad_no_definida_id = None
-    autoridad_no_definida = Autoridad.query.filter_by(clave="ND").first()
+    autoridad_no_definida = get_catalog_by_clave("autoridades", "ND")
     if autoridad_no_definida:
         autoridad_no_definida_id = str(autoridad_no_definida.id)  # Es un SelectField
     # Entregar formulario
@@ -414,14 +420,16 @@ def edit(usuario_id):
             usuario.apellido_paterno = safe_string(form.apellido_paterno.data, save_enie=True)
             usuario.apellido_materno = safe_string(form.apellido_materno.data, save_enie=True)
             usuario.puesto = safe_string(form.puesto.data)
-            usuario.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Usuario {usuario.email}"),
-                url=url_for("usuarios.detail", usuario_id=usuario.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                usuario.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Usuario {usuario.email}"),
+                    url=url_for("usuarios.detail", usuario_id=usuario.id),
+                )
+                bitacora.enqueue()
+            delete_user_snapshot(usuario.id)
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     # No es necesario pasar autoridad_id porque se va a tomar de usuario con JS
@@ -445,18 +453,21 @@ def delete(usuario_id):
     usuario = Usuario.query.get_or_404(usuario_id)
     if usuario.estatus == "A":
         # Dar de baja al usuario
-        usuario.delete()
-        # Dar de baja los roles del usuario
-        for usuario_rol in usuario.usuarios_roles:
-            usuario_rol.delete()
-        # Guardar en la bitacora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Usuario {usuario.email}"),
-            url=url_for("usuarios.detail", usuario_id=usuario.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario.delete()
+            # Dar de baja los roles del usuario
+            for usuario_rol in usuario.usuarios_roles:
+                usuario_rol.delete()
+            # Guardar en la bitacora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Usuario {usuario.email}"),
+                url=url_for("usuarios.detail", usuario_id=usuario.id),
+            )
+            bitacora.enqueue()
+        delete_user_snapshot(usuario.id)
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios.detail", usuario_id=usuario.id))
 
@@ -472,18 +483,21 @@ def recover(usuario_id):
     usuario = Usuario.query.get_or_404(usuario_id)
     if usuario.estatus == "B":
         # Recuperar al usuario
-        usuario.recover()
-        # Recuperar los roles del usuario
-        for usuario_rol in usuario.usuarios_roles:
-            usuario_rol.recover()
-        # Guardar en la bitacora
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Usuario {usuario.email}"),
-            url=url_for("usuarios.detail", usuario_id=usuario.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario.recover()
+            # Recuperar los roles del usuario
+            for usuario_rol in usuario.usuarios_roles:
+                usuario_rol.recover()
+            # Guardar en la bitacora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Usuario {usuario.email}"),
+                url=url_for("usuarios.detail", usuario_id=usuario.id),
+            )
+            bitacora.enqueue()
+        delete_user_snapshot(usuario.id)
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios.detail", usuario_id=usuario.id))
 
@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..oficinas.models import Oficina
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
@@ -132,14 +133,15 @@ def new_with_oficina(oficina_id):
             flash(f"Ya existe la combinación de {descripcion}", "warning")
             return redirect(url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id))
         if puede_existir:
-            puede_existir.recover()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Recuperado Usuario-Oficina con {descripcion}"),
-                url=url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                puede_existir.recover()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Recuperado Usuario-Oficina con {descripcion}"),
+                    url=url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id))
         usuario_oficina = UsuarioOficina(
@@ -147,14 +149,16 @@ def new_with_oficina(oficina_id):
             usuario_id=usuario.id,
             descripcion=descripcion,
         )
-        usuario_oficina.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Usuario-Oficina {descripcion}"),
-            url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            usuario_oficina.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Usuario-Oficina {descripcion}"),
+                url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(url_for("oficinas.detail", oficina_id=oficina.id))
     form.oficina.data = f"{oficina.clave} - {oficina.descripcion_corta}"  # Read only string field
@@ -187,14 +191,15 @@ def new_with_usuario(usuario_id):
             flash(f"Ya existe la combinación de {descripcion}", "warning")
             return redirect(url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id))
         if puede_existir:
-            puede_existir.recover()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Recuperado Usuario-Oficina con {descripcion}"),
-                url=url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                puede_existir.recover()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Recuperado Usuario-Oficina con {descripcion}"),
+                    url=url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(url_for("usuarios_oficinas.detail", usuario_oficina_id=puede_existir.id))
         usuario_oficina = UsuarioOficina(
@@ -202,14 +207,16 @@ def new_with_usuario(usuario_id):
             usuario_id=usuario.id,
             descripcion=descripcion,
         )
-        usuario_oficina.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Usuario-Oficina {descripcion}"),
-            url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch() as sesion:
+            usuario_oficina.save()
+            sesion.flush()  # Para tener el id en la bitácora
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Usuario-Oficina {descripcion}"),
+                url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(url_for("usuarios.detail", usuario_id=usuario.id))
     form.usuario_email.data = usuario.email  # Read only string field
@@ -231,14 +238,15 @@ def delete(usuario_oficina_id):
         abort(400)
     usuario_oficina = UsuarioOficina.query.get_or_404(usuario_oficina_id)
     if usuario_oficina.estatus == "A":
-        usuario_oficina.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Usuario-Oficina {usuario_oficina.descripcion}"),
-            url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario_oficina.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Usuario-Oficina {usuario_oficina.descripcion}"),
+                url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id))
 
@@ -252,13 +260,14 @@ def recover(usuario_oficina_id):
         abort(400)
     usuario_oficina = UsuarioOficina.query.get_or_404(usuario_oficina_id)
     if usuario_oficina.estatus == "B":
-        usuario_oficina.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Usuario-Oficina {usuario_oficina.descripcion}"),
-            url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario_oficina.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Usuario-Oficina {usuario_oficina.descripcion}"),
+                url=url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios_oficinas.detail", usuario_oficina_id=usuario_oficina.id))
@@ -5,10 +5,12 @@ Usuarios-Roles, vistas
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
+from ...lib.permissions_cache import bump_permissions_version
 from ...lib.safe_string import safe_email, safe_message, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..roles.models import Rol
 from ..usuarios.decorators import permission_required
@@ -146,14 +148,16 @@ def new_with_rol(rol_id):
             usuario=usuario,
             descripcion=descripcion,
         )
-        usuario_rol.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("roles.detail", rol_id=rol.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario_rol.save()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("roles.detail", rol_id=rol.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     form.rol_nombre.data = rol.nombre  # Solo lectura
@@ -191,14 +195,16 @@ def new_with_usuario(usuario_id):
             usuario=usuario,
             descripcion=descripcion,
         )
-        usuario_rol.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("usuarios.detail", usuario_id=usuario.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario_rol.save()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Nuevo Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("usuarios.detail", usuario_id=usuario.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     form.usuario_email.data = usuario.email  # Solo lectura
@@ -221,14 +227,16 @@ def delete(usuario_rol_id):
         abort(400)
     usuario_rol = UsuarioRol.query.get_or_404(usuario_rol_id)
     if usuario_rol.estatus == "A":
-        usuario_rol.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario_rol.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id))
 
@@ -242,14 +250,16 @@ def recover(usuario_rol_id):
         abort(400)
     usuario_rol = UsuarioRol.query.get_or_404(usuario_rol_id)
     if usuario_rol.estatus == "B":
-        usuario_rol.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Usuario-Rol {usuario_rol.descripcion}"),
-            url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            usuario_rol.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Usuario-Rol {usuario_rol.descripcion}"),
+                url=url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id),
+            )
+            bitacora.enqueue()
+        bump_permissions_version()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("usuarios_roles.detail", usuario_rol_id=usuario_rol.id))
 
@@ -275,6 +285,7 @@ def toggle_estatus_json(usuario_rol_id):
 
     # Guardar
     usuario_rol.save()
+    bump_permissions_version()
 
     # Entregar JSON
     return {
@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_string, safe_url, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from ..web_paginas.models import WebPagina
@@ -133,14 +134,16 @@ def new(web_pagina_id):
                 archivo=form.archivo.data.strip(),
                 url=safe_url(form.url.data),
             )
-            web_archivo.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nuevo Web Archivo {web_archivo.clave}"),
-                url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                web_archivo.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nuevo Web Archivo {web_archivo.clave}"),
+                    url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = web_pagina.clave
@@ -173,14 +176,15 @@ def edit(web_archivo_id):
             web_archivo.archivo = form.archivo.data.strip()
             web_archivo.url = safe_url(form.url.data)
             web_archivo.esta_archivado = form.esta_archivado.data
-            web_archivo.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Web Archivo {web_archivo.clave}"),
-                url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                web_archivo.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Web Archivo {web_archivo.clave}"),
+                    url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = web_archivo.clave
@@ -201,14 +205,15 @@ def delete(web_archivo_id):
         abort(400)
     web_archivo = WebArchivo.query.get_or_404(web_archivo_id)
     if web_archivo.estatus == "A":
-        web_archivo.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Web Archivo {web_archivo.clave}"),
-            url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            web_archivo.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Web Archivo {web_archivo.clave}"),
+                url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("web_archivos.detail", web_archivo_id=web_archivo.id))
 
@@ -222,13 +227,14 @@ def recover(web_archivo_id):
         abort(400)
     web_archivo = WebArchivo.query.get_or_404(web_archivo_id)
     if web_archivo.estatus == "B":
-        web_archivo.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Web Archivo {web_archivo.clave}"),
-            url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            web_archivo.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Web Archivo {web_archivo.clave}"),
+                url=url_for("web_archivos.detail", web_archivo_id=web_archivo.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("web_archivos.detail", web_archivo_id=web_archivo.id))
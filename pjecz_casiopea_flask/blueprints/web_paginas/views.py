@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_path, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from ..web_ramas.models import WebRama
@@ -138,14 +139,16 @@ def new(web_rama_id):
                 titulo=safe_string(form.titulo.data, do_unidecode=False, save_enie=True, to_uppercase=False),
                 ruta=safe_path(form.ruta.data),
             )
-            web_pagina.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nueva Web Página {web_pagina.clave}"),
-                url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                web_pagina.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nueva Web Página {web_pagina.clave}"),
+                    url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = web_rama.clave
@@ -184,14 +187,15 @@ def edit(web_pagina_id):
             web_pagina.tiempo_publicar = form.tiempo_publicar.data
             web_pagina.tiempo_archivar = form.tiempo_archivar.data
             web_pagina.esta_archivado = form.esta_archivado.data
-            web_pagina.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Web Página {web_pagina.clave}"),
-                url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                web_pagina.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Web Página {web_pagina.clave}"),
+                    url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = web_pagina.clave
@@ -220,14 +224,15 @@ def edit_ckeditor5(web_pagina_id):
     if form.validate_on_submit():
         web_pagina.contenido_html = form.contenido_html.data.strip()
         web_pagina.contenido_md = form.contenido_md.data.strip()
-        web_pagina.save()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Editado contenido de Web Página {web_pagina.clave} con CKEditor5"),
-            url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            web_pagina.save()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Editado contenido de Web Página {web_pagina.clave} con CKEditor5"),
+                url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
         return redirect(bitacora.url)
     form.contenido_html.data = web_pagina.contenido_html
@@ -241,14 +246,15 @@ def delete(web_pagina_id):
     """Eliminar Web Página"""
     web_pagina = WebPagina.query.get_or_404(web_pagina_id)
     if web_pagina.estatus == "A":
-        web_pagina.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Web Página {web_pagina.clave}"),
-            url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            web_pagina.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Web Página {web_pagina.clave}"),
+                url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("web_paginas.detail", web_pagina_id=web_pagina.id))
 
@@ -259,13 +265,14 @@ def recover(web_pagina_id):
     """Recuperar Web Página"""
     web_pagina = WebPagina.query.get_or_404(web_pagina_id)
     if web_pagina.estatus == "B":
-        web_pagina.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Web Página {web_pagina.clave}"),
-            url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            web_pagina.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Web Página {web_pagina.clave}"),
+                url=url_for("web_paginas.detail", web_pagina_id=web_pagina.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("web_paginas.detail", web_pagina_id=web_pagina.id))
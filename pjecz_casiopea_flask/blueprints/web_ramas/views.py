@@ -7,10 +7,11 @@ import json
 from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required
 
+from ...lib.catalog_cache import get_catalog_by_clave
 from ...lib.datatables import get_datatable_parameters, output_datatable_json
 from ...lib.safe_string import safe_clave, safe_message, safe_path, safe_string, safe_uuid
+from ...lib.universal_mixin import UniversalMixin
 from ..bitacoras.models import Bitacora
-from ..modulos.models import Modulo
 from ..permisos.models import Permiso
 from ..usuarios.decorators import permission_required
 from .forms import WebRamaEditForm, WebRamaNewForm
@@ -126,14 +127,16 @@ def new():
                 unidad_compartida=form.unidad_compartida.data,
                 directorio=form.directorio.data,
             )
-            web_rama.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Nueva Web Rama {web_rama.clave}"),
-                url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch() as sesion:
+                web_rama.save()
+                sesion.flush()  # Para tener el id en la bitácora
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Nueva Web Rama {web_rama.clave}"),
+                    url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     return render_template("web_ramas/new.jinja2", form=form)
@@ -162,14 +165,15 @@ def edit(web_rama_id):
             web_rama.unidad_compartida = form.unidad_compartida.data
             web_rama.directorio = form.directorio.data
             web_rama.esta_archivado = form.esta_archivado.data
-            web_rama.save()
-            bitacora = Bitacora(
-                modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-                usuario=current_user,
-                descripcion=safe_message(f"Editado Web Rama {web_rama.clave}"),
-                url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
-            )
-            bitacora.save()
+            with UniversalMixin.batch():
+                web_rama.save()
+                bitacora = Bitacora(
+                    modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                    usuario_id=current_user.id,
+                    descripcion=safe_message(f"Editado Web Rama {web_rama.clave}"),
+                    url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
+                )
+                bitacora.enqueue()
             flash(bitacora.descripcion, "success")
             return redirect(bitacora.url)
     form.clave.data = web_rama.clave
@@ -187,14 +191,15 @@ def delete(web_rama_id):
     """Eliminar Web Rama"""
     web_rama = WebRama.query.get_or_404(web_rama_id)
     if web_rama.estatus == "A":
-        web_rama.delete()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Eliminado Web Rama {web_rama.clave}"),
-            url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            web_rama.delete()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Eliminado Web Rama {web_rama.clave}"),
+                url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("web_ramas.detail", web_rama_id=web_rama.id))
 
@@ -205,13 +210,14 @@ def recover(web_rama_id):
     """Recuperar Web Rama"""
     web_rama = WebRama.query.get_or_404(web_rama_id)
     if web_rama.estatus == "B":
-        web_rama.recover()
-        bitacora = Bitacora(
-            modulo=Modulo.query.filter_by(nombre=MODULO).first(),
-            usuario=current_user,
-            descripcion=safe_message(f"Recuperado Web Rama {web_rama.clave}"),
-            url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
-        )
-        bitacora.save()
+        with UniversalMixin.batch():
+            web_rama.recover()
+            bitacora = Bitacora(
+                modulo_id=get_catalog_by_clave("modulos", MODULO).id,
+                usuario_id=current_user.id,
+                descripcion=safe_message(f"Recuperado Web Rama {web_rama.clave}"),
+                url=url_for("web_ramas.detail", web_rama_id=web_rama.id),
+            )
+            bitacora.enqueue()
         flash(bitacora.descripcion, "success")
     return redirect(url_for("web_ramas.detail", web_rama_id=web_rama.id))
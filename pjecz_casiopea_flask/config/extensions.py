@@ -4,6 +4,7 @@ Flask Extensions
 
 from flask_login import LoginManager
 from flask_moment import Moment
+from flask_socketio import SocketIO
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import CSRFProtect
 from passlib.context import CryptContext
@@ -12,12 +13,14 @@ csrf = CSRFProtect()
 database = SQLAlchemy()
 login_manager = LoginManager()
 moment = Moment()
+socketio = SocketIO()
 pwd_context = CryptContext(schemes=["pbkdf2_sha256", "des_crypt"], deprecated="auto")
 
 
 def authentication(user_model):
     """Flask-Login authentication"""
+    from ..lib.user_session_cache import load_user_cached
 
     @login_manager.user_loader
     def load_user(uid):
-        return user_model.query.get(uid)
+        return load_user_cached(user_model, uid)
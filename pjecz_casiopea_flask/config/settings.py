@@ -13,6 +13,7 @@ class Settings(BaseSettings):
 
     # Variables de entorno
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
+    EXPORTS_DIR: str = os.getenv("EXPORTS_DIR", "")
     FERNET_KEY: str = os.getenv("FERNET_KEY", "")
     HOST: str = os.getenv("HOST", "")
     PREFIX: str = os.getenv("PREFIX", "")
@@ -23,6 +24,9 @@ class Settings(BaseSettings):
     SQLALCHEMY_DATABASE_URI: str = os.getenv("SQLALCHEMY_DATABASE_URI", "")
     TASK_QUEUE_NAME: str = os.getenv("TASK_QUEUE_NAME", "pjecz_casiopea")
     TZ: str = os.getenv("TZ", "America/Mexico_City")
+    WORKER_MAX_JOBS: int = int(os.getenv("WORKER_MAX_JOBS", "200"))
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", "3"))
+    WORKER_PROCESSES_ALTA: int = int(os.getenv("WORKER_PROCESSES_ALTA", "1"))
 
     # Incrementar el tamaño de lo que se sube en los formularios
     MAX_CONTENT_LENGTH: int | None = None
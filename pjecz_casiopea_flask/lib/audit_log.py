@@ -0,0 +1,219 @@
+"""
+Bitácoras y entradas-salidas, escritura en segundo plano
+
+Las vistas no insertan los registros de auditoría, los encolan en Redis y el auditor (auditor.py) los toma por lotes
+y los escribe con un INSERT de varios renglones cada cierto número de eventos o de milisegundos. Si se encolan dentro
+de UniversalMixin.batch, se envían hasta que se hace el commit y se descartan si hay rollback. Si Redis no está
+disponible, se guardan en un búfer del proceso que un hilo vacía cada AUDITORIA_MILISEGUNDOS, a Redis si ya volvió
+o directo a la base de datos. La columna creado se toma al encolar el evento, en UTC, para conservar el orden de los
+eventos y que caigan en la partición mensual de cuando ocurrieron aunque el auditor se atrase; modificado lo pone la
+base de datos al insertar.
+"""
+
+import atexit
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..config.extensions import database
+
+AUDITORIA_COLA = "pjecz_casiopea:auditoria"
+AUDITORIA_LOTE = 500
+AUDITORIA_MILISEGUNDOS = 1000
+AUDITORIA_PENDIENTES = "auditoria_pendientes"
+
+# Tablas que se pueden escribir y sus columnas que son UUID
+AUDITORIA_TABLAS = {
+    "bitacoras": {"uuid": ("id", "modulo_id", "usuario_id")},
+    "entradas_salidas": {"uuid": ("id", "usuario_id")},
+}
+
+# Búfer del proceso para cuando Redis no está disponible
+bufer = deque()
+bufer_candado = threading.Lock()
+bufer_desde = 0.0
+bufer_app = None
+bufer_hilo = None
+
+
+def build_audit_event(tabla: str, valores: dict) -> str:
+    """Elaborar el evento en JSON, con id, estatus y creado en UTC, modificado queda al default de la base de datos"""
+    if tabla not in AUDITORIA_TABLAS:
+        raise ValueError(f"No se puede auditar la tabla {tabla}")
+    renglon = {"id": uuid.uuid4(), "creado": datetime.now(timezone.utc), "estatus": "A"}
+    renglon.update(valores)
+    return json.dumps({"tabla": tabla, "valores": renglon}, default=str)
+
+
+def parse_audit_event(evento) -> tuple[str, dict]:
+    """Descomponer el evento en la tabla y el renglón listo para insertar"""
+    datos = json.loads(evento)
+    tabla = datos["tabla"]
+    renglon = datos["valores"]
+    for columna in AUDITORIA_TABLAS[tabla]["uuid"]:
+        if renglon.get(columna) is not None:
+            renglon[columna] = uuid.UUID(renglon[columna])
+    # Todos los renglones deben tener las mismas columnas para el INSERT de varios renglones: los eventos encolados por
+    # versiones anteriores pueden traer modificado o no traer creado
+    if renglon.get("creado") is not None:
+        renglon["creado"] = datetime.fromisoformat(renglon["creado"])
+    else:
+        renglon["creado"] = datetime.now(timezone.utc)
+    renglon.pop("modificado", None)
+    return tabla, renglon
+
+
+def write_audit_events(eventos: list) -> int:
+    """Escribir los eventos con un INSERT de varios renglones por tabla, en una sola transacción"""
+    por_tabla = {}
+    for evento in eventos:
+        tabla, renglon = parse_audit_event(evento)
+        por_tabla.setdefault(tabla, []).append(renglon)
+    with database.engine.begin() as conexion:
+        for tabla, renglones in por_tabla.items():
+            conexion.execute(database.metadata.tables[tabla].insert(), renglones)
+    return len(eventos)
+
+
+def push_audit_events(eventos: list) -> bool:
+    """Agregar los eventos a la cola en Redis, entrega falso si no se pudo"""
+    redis = getattr(current_app, "redis", None) if has_app_context() else None
+    if redis is None:
+        return False
+    try:
+        redis.rpush(AUDITORIA_COLA, *eventos)
+    except RedisError:
+        return False
+    return True
+
+
+def flush_fallback_buffer(forzar: bool = False) -> None:
+    """Vaciar el búfer del proceso a Redis o si no se puede a la base de datos, al llenarse, al vencer o si se fuerza"""
+    global bufer_desde
+    with bufer_candado:
+        if not bufer:
+            return
+        vencido = (time.monotonic() - bufer_desde) * 1000 >= AUDITORIA_MILISEGUNDOS
+        if not forzar and len(bufer) < AUDITORIA_LOTE and not vencido:
+            return
+        eventos = list(bufer)
+        bufer.clear()
+    if push_audit_events(eventos):
+        return
+    try:
+        if has_app_context():
+            write_audit_events(eventos)
+        else:
+            with bufer_app.app_context():
+                write_audit_events(eventos)
+    except Exception:
+        # Regresar los eventos al búfer para intentarlo en la siguiente ocasión, sin interrumpir la petición
+        with bufer_candado:
+            bufer.extendleft(reversed(eventos))
+            bufer_desde = time.monotonic()
+
+
+def flush_fallback_buffer_periodically() -> None:
+    """Vaciar el búfer cada AUDITORIA_MILISEGUNDOS, para no esperar al siguiente evento ni a que termine el proceso"""
+    while True:
+        time.sleep(AUDITORIA_MILISEGUNDOS / 1000)
+        with bufer_app.app_context():
+            flush_fallback_buffer()
+
+
+def start_fallback_flusher() -> None:
+    """Iniciar el hilo que vacía el búfer, uno por proceso, se vuelve a iniciar en los procesos creados con fork"""
+    global bufer_hilo
+    if bufer_hilo is not None and bufer_hilo.is_alive():
+        return
+    bufer_hilo = threading.Thread(target=flush_fallback_buffer_periodically, name="auditoria_bufer", daemon=True)
+    bufer_hilo.start()
+
+
+def send_audit_events(eventos: list) -> None:
+    """Enviar los eventos a Redis, si no está disponible guardarlos en el búfer del proceso"""
+    global bufer_app, bufer_desde
+    if not eventos:
+        return
+    if push_audit_events(eventos):
+        flush_fallback_buffer(forzar=True)
+        return
+    with bufer_candado:
+        if not bufer:
+            bufer_desde = time.monotonic()
+        bufer.extend(eventos)
+        if bufer_app is None and has_app_context():
+            bufer_app = current_app._get_current_object()
+        if bufer_app is not None:
+            start_fallback_flusher()
+    flush_fallback_buffer()
+
+
+def enqueue_audit_event(tabla: str, valores: dict) -> None:
+    """Encolar un evento de auditoría, si hay un batch abierto se envía hasta que se haga el commit"""
+    evento = build_audit_event(tabla, valores)
+    sesion = database.session
+    if sesion.info.get("universal_mixin_batch", 0) > 0:
+        sesion.info.setdefault(AUDITORIA_PENDIENTES, []).append(evento)
+        return
+    send_audit_events([evento])
+
+
+@event.listens_for(Session, "after_commit")
+def send_pending_audit_events(sesion):
+    """Al hacer el commit, enviar los eventos que se encolaron dentro del batch"""
+    send_audit_events(sesion.info.pop(AUDITORIA_PENDIENTES, []))
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_pending_audit_events(sesion):
+    """Al hacer rollback, descartar los eventos que se encolaron dentro del batch"""
+    sesion.info.pop(AUDITORIA_PENDIENTES, None)
+
+
+@atexit.register
+def flush_fallback_buffer_at_exit():
+    """Al terminar el proceso, escribir lo que quede en el búfer"""
+    if bufer_app is not None:
+        flush_fallback_buffer(forzar=True)
+
+
+def consume_audit_events(redis, lote: int = AUDITORIA_LOTE, milisegundos: int = AUDITORIA_MILISEGUNDOS, detener=None) -> int:
+    """Tomar los eventos de la cola y escribirlos cada lote o cada tantos milisegundos, hasta que detener sea verdadero"""
+    escritos = 0
+    eventos = []
+    limite = time.monotonic() + milisegundos / 1000
+    while True:
+        terminar = detener is not None and detener()
+        # Esperar el primer evento o tomar los que falten para el lote
+        if not terminar:
+            if not eventos:
+                espera = max(milisegundos / 1000, 0.1)
+                sacado = redis.blpop([AUDITORIA_COLA], timeout=espera)
+                if sacado is not None:
+                    eventos.append(sacado[1])
+                    limite = time.monotonic() + milisegundos / 1000
+            sacados = redis.lpop(AUDITORIA_COLA, lote - len(eventos)) if len(eventos) < lote else None
+            if sacados:
+                eventos.extend(sacados)
+            elif len(eventos) < lote and time.monotonic() < limite:
+                time.sleep(min(0.05, max(limite - time.monotonic(), 0)))
+        # Escribir si se completó el lote, si venció el tiempo o si hay que terminar
+        if eventos and (len(eventos) >= lote or time.monotonic() >= limite or terminar):
+            try:
+                escritos += write_audit_events(eventos)
+            except Exception:
+                # Regresar los eventos al inicio de la cola para no perderlos
+                redis.lpush(AUDITORIA_COLA, *reversed(eventos))
+                raise
+            eventos = []
+        if terminar:
+            return escritos
@@ -0,0 +1,129 @@
+"""
+Catálogos, caché del proceso
+
+Los catálogos (distritos, materias, autoridades, oficinas, categorías, servicios, módulos y trámites) cambian pocas
+veces al año. Cada proceso guarda una foto de cada catálogo como registros inmutables, con índices por id y por clave.
+La versión de cada catálogo se guarda en un hash de Redis para compartirla entre procesos; las vistas que agregan,
+modifican, eliminan o recuperan la incrementan y la foto se vuelve a consultar en la siguiente petición. Como en los
+permisos, cada foto vence a los CATALOGOS_CACHE_SEGUNDOS aunque no cambie la versión, así si Redis no está disponible
+los cambios hechos en otros procesos se ven a más tardar en ese tiempo.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import current_app, g, has_app_context, has_request_context
+from redis.exceptions import RedisError
+
+from ..blueprints.autoridades.models import Autoridad
+from ..blueprints.cit_categorias.models import CitCategoria
+from ..blueprints.cit_servicios.models import CitServicio
+from ..blueprints.distritos.models import Distrito
+from ..blueprints.materias.models import Materia
+from ..blueprints.modulos.models import Modulo
+from ..blueprints.oficinas.models import Oficina
+from ..blueprints.pag_tramites_servicios.models import PagTramiteServicio
+
+CATALOGOS_VERSIONES_LLAVE = "pjecz_casiopea:catalogos_versiones"
+CATALOGOS_CACHE_SEGUNDOS = 600
+
+# Catálogos: modelo y columna que sirve de clave, los módulos no tienen clave y se buscan por nombre
+CATALOGOS = {
+    "autoridades": (Autoridad, "clave"),
+    "cit_categorias": (CitCategoria, "clave"),
+    "cit_servicios": (CitServicio, "clave"),
+    "distritos": (Distrito, "clave"),
+    "materias": (Materia, "clave"),
+    "modulos": (Modulo, "nombre"),
+    "oficinas": (Oficina, "clave"),
+    "pag_tramites_servicios": (PagTramiteServicio, "clave"),
+}
+
+# Foto de un catálogo: versión, vencimiento, registros e índices de solo lectura
+FotoCatalogo = namedtuple("FotoCatalogo", ["version", "vence", "registros", "por_id", "por_clave"])
+
+# Registro inmutable de cada catálogo, con las columnas de su tabla
+registros_tipos = {
+    tabla: namedtuple(f"{modelo.__name__}Registro", [columna.name for columna in modelo.__table__.columns])
+    for tabla, (modelo, _) in CATALOGOS.items()
+}
+
+catalogos_cache = {}
+catalogos_cache_candado = threading.Lock()
+catalogos_versiones_locales = {}
+
+
+def get_catalog_versions() -> dict:
+    """Consultar las versiones de los catálogos, una sola vez por petición"""
+    if has_request_context() and "catalogos_versiones" in g:
+        return g.catalogos_versiones
+    versiones = dict(catalogos_versiones_locales)
+    if has_app_context() and getattr(current_app, "redis", None) is not None:
+        try:
+            for tabla, version in current_app.redis.hgetall(CATALOGOS_VERSIONES_LLAVE).items():
+                versiones[tabla.decode("utf-8") if isinstance(tabla, bytes) else tabla] = int(version)
+        except RedisError:
+            pass
+    if has_request_context():
+        g.catalogos_versiones = versiones
+    return versiones
+
+
+def bump_catalog_version(tabla: str) -> None:
+    """Incrementar la versión de un catálogo para que todos los procesos lo vuelvan a consultar"""
+    with catalogos_cache_candado:
+        catalogos_versiones_locales[tabla] = catalogos_versiones_locales.get(tabla, 0) + 1
+        catalogos_cache.pop(tabla, None)
+    if has_app_context() and getattr(current_app, "redis", None) is not None:
+        try:
+            current_app.redis.hincrby(CATALOGOS_VERSIONES_LLAVE, tabla, 1)
+        except RedisError:
+            pass
+    if has_request_context():
+        g.pop("catalogos_versiones", None)
+
+
+def load_catalog(tabla: str, version: int) -> FotoCatalogo:
+    """Consultar todos los registros del catálogo y elaborar la foto con sus índices"""
+    modelo, columna_clave = CATALOGOS[tabla]
+    registro_tipo = registros_tipos[tabla]
+    columnas = [getattr(modelo, nombre) for nombre in registro_tipo._fields]
+    registros = tuple(registro_tipo(*renglon) for renglon in modelo.query.with_entities(*columnas).all())
+    por_id = {registro.id: registro for registro in registros}
+    por_id.update({str(registro.id): registro for registro in registros})
+    por_clave = {getattr(registro, columna_clave): registro for registro in registros}
+    vence = time.monotonic() + CATALOGOS_CACHE_SEGUNDOS
+    return FotoCatalogo(version, vence, registros, MappingProxyType(por_id), MappingProxyType(por_clave))
+
+
+def get_catalog(tabla: str) -> FotoCatalogo:
+    """Entregar la foto vigente del catálogo, si cambió la versión o ya venció consultarla de nuevo"""
+    version = get_catalog_versions().get(tabla, 0)
+    with catalogos_cache_candado:
+        foto = catalogos_cache.get(tabla)
+    if foto is not None and foto.version == version and foto.vence > time.monotonic():
+        return foto
+    foto = load_catalog(tabla, version)
+    with catalogos_cache_candado:
+        catalogos_cache[tabla] = foto
+    return foto
+
+
+def get_catalog_by_id(tabla: str, registro_id):
+    """Buscar un registro del catálogo por su id, acepta UUID o texto, entrega None si no existe"""
+    return get_catalog(tabla).por_id.get(registro_id)
+
+
+def get_catalog_by_clave(tabla: str, clave: str):
+    """Buscar un registro del catálogo por su clave (por su nombre en módulos), entrega None si no existe"""
+    return get_catalog(tabla).por_clave.get(clave)
+
+
+def get_catalog_records(tabla: str, orden: str | None = None) -> list:
+    """Entregar los registros activos del catálogo, ordenados por la columna indicada"""
+    registros = [registro for registro in get_catalog(tabla).registros if registro.estatus == "A"]
+    if orden is not None:
+        registros.sort(key=lambda registro: getattr(registro, orden))
+    return registros
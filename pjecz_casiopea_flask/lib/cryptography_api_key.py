@@ -1,21 +1,32 @@
 """
 Cryptography API Key generator and decoder
+
+FERNET_KEY may hold several comma separated keys to rotate them: the first one encrypts and all of them decrypt.
+The Fernet objects are built once per process and the derived keys and decoded API keys are memoized.
 """
 
 import base64
+import hmac
+from datetime import datetime
+from functools import lru_cache
 
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 from ..config.settings import get_settings
 
+DECODED_API_KEYS_CACHE_SIZE = 4096
+DERIVED_KEYS_CACHE_SIZE = 32
+FERNET_KEYS_SEPARATOR = ","
+
 settings = get_settings()
 
 
+@lru_cache(maxsize=DERIVED_KEYS_CACHE_SIZE)
 def convert_string_to_fernet_key(input_string: str) -> bytes:
-    """Converts a string to a Fernet compatible encryption key"""
+    """Converts a string to a Fernet compatible encryption key, memoized because PBKDF2 is slow on purpose"""
     input_string_bytes = input_string.encode("utf-8")
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
@@ -28,20 +39,52 @@ def convert_string_to_fernet_key(input_string: str) -> bytes:
     return base64.urlsafe_b64encode(derived_key_bytes)
 
 
+@lru_cache(maxsize=1)
+def get_fernet() -> MultiFernet:
+    """Build once per process the MultiFernet with the keys in FERNET_KEY, the first one is used to encrypt"""
+    keys = [key.strip() for key in settings.FERNET_KEY.split(FERNET_KEYS_SEPARATOR) if key.strip() != ""]
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+def reset_keys() -> None:
+    """Forget the Fernet objects, derived keys and decoded API keys, after changing FERNET_KEY or SALT"""
+    get_fernet.cache_clear()
+    convert_string_to_fernet_key.cache_clear()
+    decode_api_key.cache_clear()
+
+
 def generate_api_key(email: str) -> str:
     """Generarte API Key"""
-    fernet = Fernet(settings.FERNET_KEY)
     email_bytes = email.encode("utf-8")
-    encrypted_email_bytes = fernet.encrypt(email_bytes)
+    encrypted_email_bytes = get_fernet().encrypt(email_bytes)
     return encrypted_email_bytes.decode("utf-8")
 
 
+@lru_cache(maxsize=DECODED_API_KEYS_CACHE_SIZE)
 def decode_api_key(api_key: str) -> str:
     """Decode API Key"""
-    fernet = Fernet(settings.FERNET_KEY)
     api_key_bytes = api_key.encode("utf-8")
     try:
-        decrypted_email_bytes = fernet.decrypt(api_key_bytes)
+        decrypted_email_bytes = get_fernet().decrypt(api_key_bytes)
         return decrypted_email_bytes.decode("utf-8")
     except InvalidToken:
         return ""
+
+
+def rotate_api_key(api_key: str) -> str:
+    """Re-encrypt an API Key with the first key, keeping its timestamp, returns an empty string if it is invalid"""
+    try:
+        return get_fernet().rotate(api_key.encode("utf-8")).decode("utf-8")
+    except InvalidToken:
+        return ""
+
+
+def verify_api_key(api_key: str, stored_api_key: str, expiration: datetime | None) -> str:
+    """Verify an API Key against the stored one and its expiration, returns the email or an empty string"""
+    if not api_key or not stored_api_key:
+        return ""
+    if not hmac.compare_digest(api_key.encode("utf-8"), stored_api_key.encode("utf-8")):
+        return ""
+    if expiration is None or expiration < datetime.now():
+        return ""
+    return decode_api_key(api_key)
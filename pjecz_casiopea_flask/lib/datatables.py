@@ -2,7 +2,37 @@
 Datatables
 """
 
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+
 from flask import request
+from flask_login import current_user
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from ..config.extensions import database
+from .safe_string import safe_uuid
+
+CURSOR_SEPARADOR = "|"
+
+# Estrategias para obtener el total de registros
+CONTEO_EXACTO = "exacto"
+CONTEO_CACHE = "cache"
+CONTEO_ESTIMADO = "estimado"
+CONTEO_CACHE_SEGUNDOS = 30
+CONTEO_CACHE_MAXIMO = 1024
+CONTEO_ESTIMADO_MINIMO = 10000
+
+# Parámetros propios de DataTables que no son filtros
+PARAMETROS_DATATABLES = ("draw", "start", "length", "cursor")
+PREFIJOS_DATATABLES = ("columns[", "order[", "search[")
+
+# Caché en memoria del proceso con los totales por usuario, endpoint y filtros
+conteos_cache = {}
+conteos_cache_candado = threading.Lock()
 
 
 def get_datatable_parameters():
@@ -18,11 +48,142 @@ def get_datatable_parameters():
     return draw, start, rows_per_page
 
 
-def output_datatable_json(draw, total, data):
+def encode_datatable_cursor(start: int, creado: datetime, registro_id) -> str:
+    """Elaborar el cursor para la paginación por llave (keyset) con el inicio, creado e id"""
+    return CURSOR_SEPARADOR.join([str(start), creado.isoformat(), str(registro_id)])
+
+
+def decode_datatable_cursor(cursor: str) -> tuple[int, datetime, str] | None:
+    """Descomponer el cursor en inicio, creado e id, entrega None si no es válido"""
+    if not isinstance(cursor, str) or cursor.count(CURSOR_SEPARADOR) != 2:
+        return None
+    start_str, creado_str, registro_id = cursor.split(CURSOR_SEPARADOR)
+    try:
+        start = int(start_str)
+        creado = datetime.fromisoformat(creado_str)
+    except ValueError:
+        return None
+    registro_id = safe_uuid(registro_id)
+    if registro_id == "":
+        return None
+    return start, creado, registro_id
+
+
+def get_datatable_cursor(start: int) -> tuple[datetime, str] | None:
+    """Tomar el cursor que envía DataTables, solo si corresponde al inicio de la página solicitada"""
+    cursor = decode_datatable_cursor(request.form.get("cursor", ""))
+    if cursor is None or cursor[0] != start:
+        return None
+    return cursor[1], cursor[2]
+
+
+def load_datatable_profile(consulta, perfil: dict | None = None):
+    """Aplicar el perfil de carga del endpoint: solo las columnas propias y de las relaciones que usa el DataTable"""
+    if not perfil:
+        return consulta
+    opciones = []
+    if perfil.get("columnas"):
+        opciones.append(load_only(*perfil["columnas"]))
+    for relacion, columnas in perfil.get("relaciones", {}).items():
+        # Las relaciones a muchos se cargan con un SELECT IN, las relaciones a uno con un JOIN
+        if relacion.property.uselist:
+            opciones.append(selectinload(relacion).load_only(*columnas))
+        else:
+            opciones.append(joinedload(relacion, innerjoin=True).load_only(*columnas))
+    return consulta.options(*opciones)
+
+
+def paginate_datatable_keyset(consulta, modelo, start: int, rows_per_page: int, perfil: dict | None = None):
+    """Ordenar por creado e id descendentes y paginar con el cursor si lo hay, de lo contrario con offset"""
+    consulta = load_datatable_profile(consulta, perfil)
+    consulta = consulta.order_by(modelo.creado.desc(), modelo.id.desc())
+    cursor = get_datatable_cursor(start)
+    if cursor is None:
+        registros = consulta.offset(start).limit(rows_per_page).all()
+    else:
+        consulta = consulta.filter(tuple_(modelo.creado, modelo.id) < tuple_(*cursor))
+        registros = consulta.limit(rows_per_page).all()
+    # Elaborar el cursor de la siguiente página si esta página está completa
+    siguiente_cursor = ""
+    if rows_per_page > 0 and len(registros) == rows_per_page:
+        siguiente_cursor = encode_datatable_cursor(start + rows_per_page, registros[-1].creado, registros[-1].id)
+    return registros, siguiente_cursor
+
+
+def get_datatable_filters() -> dict:
+    """Tomar los filtros recibidos, sin los parámetros propios de DataTables"""
+    filtros = {}
+    for llave, valor in request.form.items():
+        if llave in PARAMETROS_DATATABLES or llave.startswith(PREFIJOS_DATATABLES):
+            continue
+        valor = valor.strip()
+        if valor != "":
+            filtros[llave] = valor
+    return filtros
+
+
+def estimate_datatable_total(consulta) -> int:
+    """Estimar el total de registros con el planificador de PostgreSQL (EXPLAIN), sin recorrer la tabla"""
+    compilado = consulta.statement.compile(dialect=database.engine.dialect)
+    resultado = database.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compilado}", compilado.params)
+    plan = resultado.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_datatable_cached(consulta, filtros: dict) -> int:
+    """Contar los registros y guardar el total unos segundos, con llave el usuario, el endpoint y los filtros normalizados"""
+    # El usuario va en la llave para que un total que dependa de sus permisos no se entregue a otro usuario
+    filtros_json = json.dumps(filtros, sort_keys=True)
+    usuario_id = getattr(current_user, "id", "")
+    llave = f"{usuario_id}:{request.endpoint}:{hashlib.sha1(filtros_json.encode('utf-8')).hexdigest()}"
+    ahora = time.monotonic()
+    with conteos_cache_candado:
+        guardado = conteos_cache.get(llave)
+        if guardado is not None and guardado[0] > ahora:
+            return guardado[1]
+    total = consulta.count()
+    with conteos_cache_candado:
+        # Si se llena la caché, quitar los vencidos y si no basta, vaciarla
+        if len(conteos_cache) >= CONTEO_CACHE_MAXIMO:
+            for vencida in [k for k, v in conteos_cache.items() if v[0] <= ahora]:
+                del conteos_cache[vencida]
+            if len(conteos_cache) >= CONTEO_CACHE_MAXIMO:
+                conteos_cache.clear()
+        conteos_cache[llave] = (ahora + CONTEO_CACHE_SEGUNDOS, total)
+    return total
+
+
+def count_datatable(consulta, start: int, rows_per_page: int, registros: list, estrategia: str = CONTEO_EXACTO) -> int:
+    """Obtener el total de registros según la estrategia de conteo elegida por el endpoint"""
+    # Si la página no está completa, el total se conoce sin consultar
+    if len(registros) < rows_per_page and (start == 0 or len(registros) > 0):
+        return start + len(registros)
+    # Contar con el total guardado unos segundos
+    filtros = get_datatable_filters()
+    if estrategia == CONTEO_CACHE:
+        return count_datatable_cached(consulta, filtros)
+    # Estimar solo cuando no hay más filtros que el estatus, porque con filtros selectivos el estimado no es confiable
+    if estrategia == CONTEO_ESTIMADO and set(filtros) <= {"estatus"}:
+        estimado = estimate_datatable_total(consulta)
+        if estimado >= CONTEO_ESTIMADO_MINIMO:
+            return estimado
+    # Contar exacto
+    return consulta.count()
+
+
+def output_datatable_json(draw, total, data, cursor=""):
     """Entregar JSON"""
-    return {
+    salida = {
         "draw": draw,
         "iTotalRecords": total,
         "iTotalDisplayRecords": total,
         "aaData": data,
     }
+    # Si hay cursor, se entrega junto con el inicio de la página a la que corresponde
+    decodificado = decode_datatable_cursor(cursor)
+    if decodificado is not None:
+        salida["cursor"] = cursor
+        salida["cursor_start"] = decodificado[0]
+    return salida
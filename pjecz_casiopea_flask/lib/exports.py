@@ -0,0 +1,129 @@
+"""
+Exportaciones
+
+Los listados grandes (citas, clientes, pagos y bitácoras) se exportan a un archivo CSV o XLSX con una tarea en el
+fondo. Los renglones se leen por trozos de un cursor del lado del servidor, en una conexión propia para que guardar
+el progreso de la tarea no cierre el cursor, y se escriben conforme llegan sin crear objetos del ORM. Así la memoria
+se mantiene constante sin importar cuántos renglones se exporten.
+"""
+
+import csv
+from datetime import datetime
+from pathlib import Path
+
+from flask import request
+from openpyxl import Workbook
+from rq import get_current_job
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..config.extensions import database
+from ..config.settings import get_settings
+from .datatables import estimate_datatable_total
+from .exceptions import MyMissingConfigurationError, MyNotValidParamError, MyUnknownError
+from .tasks import set_task_progress
+
+EXPORTACION_FORMATOS = ("csv", "xlsx")
+EXPORTACION_TROZO = 5000
+EXPORTACION_SEGUNDOS = 4 * 60 * 60  # Tiempo límite de la tarea en el fondo
+XLSX_HOJA_MAXIMO = 1048576 - 1  # Renglones de una hoja, sin el encabezado
+
+settings = get_settings()
+
+
+def export_file_path(nombre: str, formato: str) -> Path:
+    """Elaborar la ruta del archivo en el directorio de exportaciones, con el nombre y la fecha-hora"""
+    if settings.EXPORTS_DIR == "":
+        raise MyMissingConfigurationError("Falta EXPORTS_DIR, el directorio compartido por el worker y la aplicación")
+    directorio = Path(settings.EXPORTS_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio / f"{nombre}-{datetime.now():%Y-%m-%d-%H%M%S}.{formato}"
+
+
+def get_export_filters() -> dict:
+    """Tomar los filtros de la exportación del query string, los mismos que recibe el DataTable"""
+    filtros = {}
+    for llave, valor in request.args.items():
+        valor = valor.strip()
+        if valor != "":
+            filtros[llave] = valor
+    return filtros
+
+
+def export_download_url() -> str:
+    """Elaborar el URL para descargar el archivo de la tarea en curso"""
+    job = get_current_job()
+    if job is None:
+        return ""
+    return f"{settings.HOST}{settings.PREFIX}/tareas/descargar/{job.get_id()}"
+
+
+def stream_rows(consulta, columnas: list, trozo: int = EXPORTACION_TROZO):
+    """Leer los renglones de la consulta con un cursor del lado del servidor, entregando listas de hasta trozo"""
+    sentencia = consulta.with_entities(*columnas).statement
+    with database.engine.connect() as conexion:
+        resultado = conexion.execution_options(stream_results=True, yield_per=trozo).execute(sentencia)
+        yield from resultado.partitions(trozo)
+
+
+def write_csv(ruta: Path, encabezados: list, trozos) -> int:
+    """Escribir los trozos de renglones en un archivo CSV, con BOM para que Excel reconozca los acentos"""
+    cantidad = 0
+    with open(ruta, "w", encoding="utf-8-sig", newline="") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(encabezados)
+        for renglones in trozos:
+            escritor.writerows(renglones)
+            cantidad += len(renglones)
+    return cantidad
+
+
+def write_xlsx(ruta: Path, encabezados: list, trozos) -> int:
+    """Escribir los trozos de renglones en un archivo XLSX en modo de solo escritura, con otra hoja al llenarse una"""
+    libro = Workbook(write_only=True)
+    hoja = None
+    en_hoja = XLSX_HOJA_MAXIMO
+    cantidad = 0
+    for renglones in trozos:
+        for renglon in renglones:
+            if en_hoja >= XLSX_HOJA_MAXIMO:
+                hoja = libro.create_sheet()
+                hoja.append(encabezados)
+                en_hoja = 0
+            hoja.append(renglon)
+            en_hoja += 1
+        cantidad += len(renglones)
+    # Si no hubo renglones, entregar una hoja solo con el encabezado
+    if hoja is None:
+        libro.create_sheet().append(encabezados)
+    libro.save(ruta)
+    return cantidad
+
+
+def export_query(consulta, columnas: list, encabezados: list, convertir, nombre: str, formato: str) -> tuple[Path, int]:
+    """Exportar la consulta al archivo CSV o XLSX, convirtiendo cada renglón e informando el progreso de la tarea"""
+    if formato not in EXPORTACION_FORMATOS:
+        raise MyNotValidParamError(f"El formato {formato} no es válido, debe ser CSV o XLSX")
+
+    # El total es el estimado del planificador, solo sirve para el porcentaje de avance
+    total = max(estimate_datatable_total(consulta), 1)
+
+    # Convertir los renglones y guardar el progreso después de cada trozo
+    def trozos_convertidos():
+        """Convertir los trozos de renglones e informar el progreso"""
+        exportados = 0
+        for renglones in stream_rows(consulta, columnas):
+            yield [convertir(renglon) for renglon in renglones]
+            exportados += len(renglones)
+            set_task_progress(min(exportados * 100 // total, 99), f"Se han exportado {exportados} renglones")
+
+    # Escribir el archivo
+    ruta = export_file_path(nombre, formato)
+    try:
+        if formato == "xlsx":
+            cantidad = write_xlsx(ruta, encabezados, trozos_convertidos())
+        else:
+            cantidad = write_csv(ruta, encabezados, trozos_convertidos())
+    except (OSError, SQLAlchemyError) as error:
+        ruta.unlink(missing_ok=True)
+        raise MyUnknownError(f"No se pudo exportar a {ruta.name}: {error}") from error
+    return ruta, cantidad
@@ -0,0 +1,133 @@
+"""
+Particiones por mes
+
+Las tablas de bitácoras y entradas-salidas están particionadas por rango de la columna creado, una partición por mes
+más una partición predeterminada para lo que no tenga su mes. Los listados, que ordenan por creado descendente, solo
+leen las particiones recientes y la retención separa o borra particiones completas en lugar de eliminar renglones.
+"""
+
+import re
+from datetime import date, datetime
+
+from sqlalchemy import DDL, event, text
+
+PARTICION_SUFIJO = "_p"
+PARTICION_PREDETERMINADA_SUFIJO = "_default"
+ARCHIVO_ESQUEMA = "archivo"
+
+
+def add_months(mes: date, meses: int) -> date:
+    """Sumar (o restar) meses al primer día de un mes"""
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def partition_name(tabla: str, mes: date) -> str:
+    """Elaborar el nombre de la partición del mes, por ejemplo bitacoras_p2025_01"""
+    return f"{tabla}{PARTICION_SUFIJO}{mes.year:04d}_{mes.month:02d}"
+
+
+def partition_month(tabla: str, nombre: str) -> date | None:
+    """Obtener el mes de una partición a partir de su nombre, None si no es una partición mensual"""
+    coincidencia = re.fullmatch(rf"{re.escape(tabla)}{PARTICION_SUFIJO}(\d{{4}})_(\d{{2}})", nombre)
+    if coincidencia is None:
+        return None
+    return date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)
+
+
+def add_default_partition(tabla) -> None:
+    """Crear la partición predeterminada al crear la tabla, para que los INSERT no fallen si aún no existe el mes"""
+    event.listen(
+        tabla,
+        "after_create",
+        DDL(f"CREATE TABLE {tabla.name}{PARTICION_PREDETERMINADA_SUFIJO} PARTITION OF {tabla.name} DEFAULT"),
+    )
+
+
+def is_partitioned(conexion, tabla: str) -> bool:
+    """¿La tabla ya está particionada?"""
+    sql = "SELECT count(*) FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)"
+    return conexion.execute(text(sql), {"tabla": tabla}).scalar() > 0
+
+
+def list_partitions(conexion, tabla: str) -> dict:
+    """Consultar las particiones mensuales de la tabla, entrega un diccionario con el mes y el nombre"""
+    sql = """
+        SELECT hija.relname
+        FROM pg_inherits
+        JOIN pg_class AS hija ON hija.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(:tabla)
+    """
+    particiones = {}
+    for (nombre,) in conexion.execute(text(sql), {"tabla": tabla}):
+        mes = partition_month(tabla, nombre)
+        if mes is not None:
+            particiones[mes] = nombre
+    return dict(sorted(particiones.items()))
+
+
+def create_partition(conexion, tabla: str, mes: date) -> str:
+    """Crear la partición del mes, moviendo los renglones de ese mes que hayan caído en la predeterminada"""
+    nombre = partition_name(tabla, mes)
+    predeterminada = f"{tabla}{PARTICION_PREDETERMINADA_SUFIJO}"
+    desde = mes.isoformat()
+    hasta = add_months(mes, 1).isoformat()
+    # Crear la tabla con las mismas columnas, valores por defecto y restricciones, para después agregarla
+    conexion.execute(text(f"CREATE TABLE {nombre} (LIKE {tabla} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    # Mover los renglones del mes que estén en la predeterminada, de lo contrario no se puede agregar la partición
+    condicion = f"creado >= '{desde}' AND creado < '{hasta}'"
+    conexion.execute(text(f"INSERT INTO {nombre} SELECT * FROM {predeterminada} WHERE {condicion}"))
+    conexion.execute(text(f"DELETE FROM {predeterminada} WHERE {condicion}"))
+    # Agregar la partición, los índices de la tabla principal se crean en ella
+    conexion.execute(text(f"ALTER TABLE {tabla} ATTACH PARTITION {nombre} FOR VALUES FROM ('{desde}') TO ('{hasta}')"))
+    return nombre
+
+
+def create_partitions(conexion, tabla: str, desde: date, hasta: date) -> list:
+    """Crear las particiones que falten de los meses entre desde y hasta, entrega los nombres de las creadas"""
+    existentes = list_partitions(conexion, tabla)
+    creadas = []
+    mes = date(desde.year, desde.month, 1)
+    while mes <= hasta:
+        if mes not in existentes:
+            creadas.append(create_partition(conexion, tabla, mes))
+        mes = add_months(mes, 1)
+    return creadas
+
+
+def retire_partitions(conexion, tabla: str, antes_de: date, archivar: bool = True) -> list:
+    """Separar las particiones de los meses anteriores a antes_de y moverlas al esquema archivo o borrarlas"""
+    retiradas = []
+    if archivar:
+        conexion.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVO_ESQUEMA}"))
+    for mes, nombre in list_partitions(conexion, tabla).items():
+        if mes >= antes_de:
+            break
+        conexion.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {nombre}"))
+        if archivar:
+            conexion.execute(text(f"ALTER TABLE {nombre} SET SCHEMA {ARCHIVO_ESQUEMA}"))
+        else:
+            conexion.execute(text(f"DROP TABLE {nombre}"))
+        retiradas.append(nombre)
+    return retiradas
+
+
+def convert_to_partitioned(conexion, tabla, hasta: date) -> tuple[str, int]:
+    """Convertir una tabla sin particiones: renombrarla, crear la particionada con sus meses y copiar los renglones"""
+    anterior = f"{tabla.name}_anterior"
+    # Renombrar la tabla y sus índices, porque los nombres de los índices no se pueden repetir en el esquema
+    indices = conexion.execute(
+        text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :tabla"),
+        {"tabla": tabla.name},
+    ).scalars()
+    for indice in list(indices):
+        conexion.execute(text(f"ALTER INDEX {indice} RENAME TO {indice}_anterior"))
+    conexion.execute(text(f"ALTER TABLE {tabla.name} RENAME TO {anterior}"))
+    # Crear la tabla particionada, con su partición predeterminada, y los meses desde el registro más antiguo
+    tabla.create(conexion)
+    primero = conexion.execute(text(f"SELECT min(creado) FROM {anterior}")).scalar() or datetime.now()
+    create_partitions(conexion, tabla.name, primero.date(), hasta)
+    # Copiar los renglones
+    columnas = ", ".join(columna.name for columna in tabla.columns)
+    copiados = conexion.execute(text(f"INSERT INTO {tabla.name} ({columnas}) SELECT {columnas} FROM {anterior}")).rowcount
+    return anterior, copiados
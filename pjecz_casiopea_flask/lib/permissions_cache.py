@@ -0,0 +1,128 @@
+"""
+Permisos, resolución y caché
+
+Los permisos de un usuario se resuelven con una sola consulta agregada y se guardan en una caché LRU del proceso,
+con llave el id del usuario y la versión de los permisos. La versión se guarda en Redis para compartirla entre
+procesos y se incrementa cuando se guardan roles, permisos, módulos o usuarios-roles.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+from flask import current_app, g, has_app_context, has_request_context
+from redis.exceptions import RedisError
+from sqlalchemy.sql import func
+
+from ..blueprints.modulos.models import Modulo
+from ..blueprints.permisos.models import Permiso
+from ..blueprints.usuarios_roles.models import UsuarioRol
+from ..config.extensions import database
+
+PERMISOS_VERSION_LLAVE = "pjecz_casiopea:permisos_version"
+PERMISOS_CACHE_MAXIMO = 1024
+PERMISOS_CACHE_SEGUNDOS = 600
+
+# Opción del menú principal, inmutable para compartirla entre hilos
+ModuloMenu = namedtuple("ModuloMenu", ["nombre", "nombre_corto", "icono", "ruta"])
+
+# Permisos resueltos de un usuario: diccionario de solo lectura con el nivel por módulo y el menú principal
+PermisosResueltos = namedtuple("PermisosResueltos", ["permisos", "menu"])
+
+permisos_cache = OrderedDict()
+permisos_cache_candado = threading.Lock()
+permisos_version_local = 0
+
+
+def get_permissions_version() -> int:
+    """Consultar la versión de los permisos, una sola vez por petición"""
+    if has_request_context() and "permisos_version" in g:
+        return g.permisos_version
+    version = permisos_version_local
+    if has_app_context() and getattr(current_app, "redis", None) is not None:
+        try:
+            version = int(current_app.redis.get(PERMISOS_VERSION_LLAVE) or 0)
+        except RedisError:
+            pass
+    if has_request_context():
+        g.permisos_version = version
+    return version
+
+
+def bump_permissions_version() -> None:
+    """Incrementar la versión de los permisos para invalidar lo resuelto en todos los procesos"""
+    global permisos_version_local
+    with permisos_cache_candado:
+        permisos_version_local += 1
+        permisos_cache.clear()
+    if has_app_context() and getattr(current_app, "redis", None) is not None:
+        try:
+            current_app.redis.incr(PERMISOS_VERSION_LLAVE)
+        except RedisError:
+            pass
+    if has_request_context():
+        g.pop("permisos_version", None)
+        g.pop("permisos_resueltos", None)
+
+
+def resolve_user_permissions(usuario_id) -> PermisosResueltos:
+    """Consultar con una sola consulta agregada el nivel máximo por módulo de los roles activos del usuario"""
+    renglones = (
+        database.session.query(
+            Modulo.nombre,
+            Modulo.nombre_corto,
+            Modulo.icono,
+            Modulo.ruta,
+            Modulo.en_navegacion,
+            func.max(Permiso.nivel),
+        )
+        .join(Permiso, Permiso.modulo_id == Modulo.id)
+        .join(UsuarioRol, UsuarioRol.rol_id == Permiso.rol_id)
+        .filter(UsuarioRol.usuario_id == usuario_id)
+        .filter(UsuarioRol.estatus == "A")
+        .filter(Permiso.estatus == "A")
+        .group_by(Modulo.id)
+        .all()
+    )
+    # En producción las rutas del menú llevan el prefijo
+    prefijo = ""
+    if current_app.config["ENVIRONMENT"].lower() == "production" and current_app.config["PREFIX"]:
+        prefijo = current_app.config["PREFIX"]
+    permisos = {}
+    menu = []
+    for nombre, nombre_corto, icono, ruta, en_navegacion, nivel in renglones:
+        permisos[nombre] = nivel
+        if nivel > 0 and en_navegacion:
+            menu.append(ModuloMenu(nombre, nombre_corto, icono, f"{prefijo}{ruta}"))
+    return PermisosResueltos(MappingProxyType(permisos), tuple(sorted(menu, key=lambda x: x.nombre_corto)))
+
+
+def get_user_permissions(usuario_id) -> PermisosResueltos:
+    """Entregar los permisos resueltos del usuario, de la petición, de la caché del proceso o de la base de datos"""
+    # Si ya se resolvieron en esta petición, entregarlos
+    if has_request_context():
+        resueltos = g.setdefault("permisos_resueltos", {})
+        if usuario_id in resueltos:
+            return resueltos[usuario_id]
+    # Buscar en la caché del proceso con la versión vigente
+    llave = (str(usuario_id), get_permissions_version())
+    ahora = time.monotonic()
+    with permisos_cache_candado:
+        guardado = permisos_cache.get(llave)
+        if guardado is not None and guardado[0] > ahora:
+            permisos_cache.move_to_end(llave)
+            permisos_resueltos = guardado[1]
+        else:
+            permisos_resueltos = None
+    # Si no está, resolver y guardar, quitando el menos usado si se llena
+    if permisos_resueltos is None:
+        permisos_resueltos = resolve_user_permissions(usuario_id)
+        with permisos_cache_candado:
+            permisos_cache[llave] = (ahora + PERMISOS_CACHE_SEGUNDOS, permisos_resueltos)
+            permisos_cache.move_to_end(llave)
+            while len(permisos_cache) > PERMISOS_CACHE_MAXIMO:
+                permisos_cache.popitem(last=False)
+    if has_request_context():
+        g.permisos_resueltos[usuario_id] = permisos_resueltos
+    return permisos_resueltos
@@ -1,9 +1,13 @@
 """
 Safe String
+
+Las expresiones regulares se compilan una sola vez al cargar el módulo. Para conservar la Ñ se usa una tabla de
+traducción por carácter que guarda lo que entrega unidecode la primera vez que se encuentra cada carácter.
 """
 
 import re
 import uuid
+from collections.abc import Iterable
 from datetime import date
 
 from unidecode import unidecode
@@ -19,6 +23,33 @@ TOKEN_REGEXP = r"^[a-zA-Z0-9_.=+-]+$"
 UNIDAD_COMPARTIDA_REGEXP = r"^([^\W_]| )+$"
 URL_REGEXP = r"^(https?:\/\/)[0-9a-z-_]*(\.[0-9a-z-_]+)*(\.[a-z]+)+(:(\d+))?(\/[0-9a-z%-_]*)*?\/?$"
 
+# Expresiones regulares compiladas
+CURP_PATRON = re.compile(CURP_REGEXP)
+EMAIL_PATRON = re.compile(EMAIL_REGEXP)
+EMAIL_FRAGMENTO_PATRON = re.compile(r"^[\w.-]*@*[\w.-]*\.*\w*$")
+TELEFONO_PATRON = re.compile(TELEFONO_REGEXP)
+URL_PATRON = re.compile(URL_REGEXP)
+NO_ALFANUMERICOS_PATRON = re.compile(r"[^a-zA-Z0-9]+")
+NO_DIGITOS_PATRON = re.compile(r"[^0-9]+")
+NO_PERMITIDOS_PATRON = re.compile(r"[^a-zA-Z0-9.()/-]+")
+NO_PERMITIDOS_ACENTOS_PATRON = re.compile(r"[^a-záéíóúüA-ZÁÉÍÓÚÜ0-9.()/-]+")
+NO_PERMITIDOS_ACENTOS_ENIE_PATRON = re.compile(r"[^a-záéíóúüñA-ZÁÉÍÓÚÜÑ0-9.()/-]+")
+ESPACIOS_PATRON = re.compile(r"\s+")
+
+
+class UnidecodeEnieTable(dict):
+    """Tabla de traducción para str.translate que conserva la Ñ y guarda lo que entrega unidecode por cada carácter"""
+
+    def __missing__(self, ordinal):
+        traducido = unidecode(chr(ordinal))
+        self[ordinal] = traducido
+        return traducido
+
+
+# Los caracteres ASCII quedan igual, la ñ y la Ñ se conservan
+UNIDECODE_ENIE_TABLA = UnidecodeEnieTable({ordinal: chr(ordinal) for ordinal in range(128)})
+UNIDECODE_ENIE_TABLA.update({ord("ñ"): "ñ", ord("Ñ"): "Ñ"})
+
 
 def safe_clave(input_str, max_len=16, only_digits=False, separator="-") -> str:
     """Safe clave"""
@@ -28,10 +59,10 @@ def safe_clave(input_str, max_len=16, only_digits=False, separator="-") -> str:
     if stripped == "":
         return ""
     if only_digits:
-        clean_string = re.sub(r"[^0-9]+", separator, stripped)
+        clean_string = NO_DIGITOS_PATRON.sub(separator, stripped)
     else:
-        clean_string = re.sub(r"[^a-zA-Z0-9]+", separator, unidecode(stripped))
-    without_spaces = re.sub(r"\s+", "", clean_string)
+        clean_string = NO_ALFANUMERICOS_PATRON.sub(separator, unidecode(stripped))
+    without_spaces = ESPACIOS_PATRON.sub("", clean_string)
     final = without_spaces.upper()
     if len(final) > max_len:
         return final[:max_len]
@@ -45,10 +76,10 @@ def safe_curp(input_str, is_optional=False, search_fragment=False) -> str:
     stripped = input_str.strip()
     if is_optional and stripped == "":
         return ""
-    clean_string = re.sub(r"[^a-zA-Z0-9]+", " ", unidecode(stripped))
-    without_spaces = re.sub(r"\s+", "", clean_string)
+    clean_string = NO_ALFANUMERICOS_PATRON.sub(" ", unidecode(stripped))
+    without_spaces = ESPACIOS_PATRON.sub("", clean_string)
     final = without_spaces.upper()
-    if search_fragment is False and re.match(CURP_REGEXP, final) is None:
+    if search_fragment is False and CURP_PATRON.match(final) is None:
         raise ValueError("CURP inválida")
     return final
 
@@ -61,10 +92,10 @@ def safe_email(input_str, search_fragment=False) -> str:
     if final == "":
         return ""
     if search_fragment:
-        if re.match(r"^[\w.-]*@*[\w.-]*\.*\w*$", final) is None:
+        if EMAIL_FRAGMENTO_PATRON.match(final) is None:
             return ""
         return final
-    if re.match(EMAIL_REGEXP, final) is None:
+    if EMAIL_PATRON.match(final) is None:
         raise ValueError("E-mail inválido")
     return final
 
@@ -91,24 +122,16 @@ def safe_string(input_str, max_len=250, do_unidecode=True, save_enie=False, to_u
     if not isinstance(input_str, str):
         return ""
     if do_unidecode:
-        new_string = re.sub(r"[^a-zA-Z0-9.()/-]+", " ", input_str)
         if save_enie:
-            new_string = ""
-            for char in input_str:
-                if char == "ñ":
-                    new_string += "ñ"
-                elif char == "Ñ":
-                    new_string += "Ñ"
-                else:
-                    new_string += unidecode(char)
+            new_string = input_str.translate(UNIDECODE_ENIE_TABLA)
         else:
-            new_string = re.sub(r"[^a-zA-Z0-9.()/-]+", " ", unidecode(input_str))
+            new_string = NO_PERMITIDOS_PATRON.sub(" ", unidecode(input_str))
     else:
         if save_enie is False:
-            new_string = re.sub(r"[^a-záéíóúüA-ZÁÉÍÓÚÜ0-9.()/-]+", " ", input_str)
+            new_string = NO_PERMITIDOS_ACENTOS_PATRON.sub(" ", input_str)
         else:
-            new_string = re.sub(r"[^a-záéíóúüñA-ZÁÉÍÓÚÜÑ0-9.()/-]+", " ", input_str)
-    removed_multiple_spaces = re.sub(r"\s+", " ", new_string)
+            new_string = NO_PERMITIDOS_ACENTOS_ENIE_PATRON.sub(" ", input_str)
+    removed_multiple_spaces = ESPACIOS_PATRON.sub(" ", new_string)
     final = removed_multiple_spaces.strip()
     if to_uppercase:
         final = final.upper()
@@ -117,12 +140,17 @@ def safe_string(input_str, max_len=250, do_unidecode=True, save_enie=False, to_u
     return (final[:max_len] + "…") if len(final) > max_len else final
 
 
+def safe_string_many(input_strs: Iterable, max_len=250, do_unidecode=True, save_enie=False, to_uppercase=True) -> list:
+    """Safe string de varios textos, por ejemplo las columnas de un renglón CSV"""
+    return [safe_string(input_str, max_len, do_unidecode, save_enie, to_uppercase) for input_str in input_strs]
+
+
 def safe_telefono(input_str):
     """Safe telefono, debe ser de 10 digitos"""
     if not isinstance(input_str, str) or input_str.strip() == "":
         return ""
     input_str = input_str.strip()
-    if re.match(TELEFONO_REGEXP, input_str) is None:
+    if TELEFONO_PATRON.match(input_str) is None:
         return ""
     return input_str
 
@@ -132,7 +160,7 @@ def safe_url(input_str):
     if not isinstance(input_str, str) or input_str.strip() == "":
         return ""
     input_str = input_str.strip()
-    if re.match(URL_REGEXP, input_str) is None:
+    if URL_PATRON.match(input_str) is None:
         return ""
     return input_str
 
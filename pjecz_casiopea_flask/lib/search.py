@@ -0,0 +1,73 @@
+"""
+Búsquedas por fragmento de texto
+
+Los filtros "contiene" se compilan a LIKE '%texto%', que no puede usar un índice btree. Las columnas de nombres y
+correos electrónicos que se buscan así tienen índices GIN de trigramas (pg_trgm), que sí sirven para LIKE con
+comodines al inicio cuando el fragmento tiene al menos tres caracteres.
+
+Los nombres y apellidos se buscan en llaves de búsqueda, columnas que se calculan al insertar y al actualizar con
+las mismas reglas de safe_string (sin acentos, en mayúsculas y conservando la Ñ), así la búsqueda no depende de
+cómo se capturaron los datos y se resuelve con el índice de una sola columna.
+"""
+
+from sqlalchemy import DDL, Index, event
+
+from ..config.extensions import database
+from .safe_string import safe_string
+
+TRIGRAMAS_EXTENSION = "pg_trgm"
+TRIGRAMAS_OPERADORES = "gin_trgm_ops"
+TRIGRAMAS_MINIMO = 3
+LLAVE_BUSQUEDA_LARGO = 256
+
+# Índices de trigramas declarados en los modelos, para crearlos en una base de datos existente
+indices_trigramas = []
+
+# Modelos con llaves de búsqueda y sus columnas, para rellenarlas en una base de datos existente
+modelos_llaves_busqueda = []
+
+# Crear la extensión antes de crear las tablas
+event.listen(database.metadata, "before_create", DDL(f"CREATE EXTENSION IF NOT EXISTS {TRIGRAMAS_EXTENSION}"))
+
+
+def trigram_indexes(tabla: str, *columnas: str) -> tuple:
+    """Elaborar los índices GIN de trigramas de las columnas, para agregarlos en __table_args__"""
+    indices = tuple(
+        Index(
+            f"ix_{tabla}_{columna}_trgm",
+            columna,
+            postgresql_using="gin",
+            postgresql_ops={columna: TRIGRAMAS_OPERADORES},
+        )
+        for columna in columnas
+    )
+    indices_trigramas.extend(indices)
+    return indices
+
+
+def trigram_index_sql(indice: Index) -> str:
+    """Elaborar el CREATE INDEX CONCURRENTLY del índice de trigramas, para no bloquear la tabla mientras se crea"""
+    columna = indice.expressions[0]
+    columna = getattr(columna, "name", columna)
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {indice.name} "
+        f"ON {indice.table.name} USING gin ({columna} {TRIGRAMAS_OPERADORES})"
+    )
+
+
+def search_key(texto) -> str:
+    """Normalizar un texto para su llave de búsqueda, con las mismas reglas que safe_string aplica a lo que se busca"""
+    return safe_string(texto, max_len=0, save_enie=True)[:LLAVE_BUSQUEDA_LARGO]
+
+
+def add_search_keys(modelo, llaves: dict) -> None:
+    """Calcular las llaves de búsqueda del modelo al insertar y al actualizar, llaves es {llave: columna}"""
+    modelos_llaves_busqueda.append((modelo, llaves))
+
+    def calcular_llaves(mapper, connection, objetivo):
+        """Calcular las llaves de búsqueda a partir de sus columnas"""
+        for llave, columna in llaves.items():
+            setattr(objetivo, llave, search_key(getattr(objetivo, columna)))
+
+    event.listen(modelo, "before_insert", calcular_llaves)
+    event.listen(modelo, "before_update", calcular_llaves)
@@ -0,0 +1,146 @@
+"""
+SendGrid, envío de mensajes de correo electrónico
+
+Un solo transporte por proceso con una sesión HTTP que conserva abiertas las conexiones (keep-alive) con SendGrid.
+Los mensajes se envían en lotes, una petición lleva hasta SENDGRID_LOTE_MAXIMO destinatarios, cada uno en su propia
+personalización con sus sustituciones. Si SendGrid responde 429 o 5xx, o falla la conexión, se reintenta esperando
+cada vez más (backoff exponencial con variación aleatoria), respetando Retry-After si viene en la respuesta.
+
+Con la variable de entorno SENDGRID_TRANSPORT=fake, o con set_sendgrid_transport, los mensajes no salen del proceso
+y se guardan en SendGridFakeTransport para revisarlos en pruebas y en desarrollo.
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from sendgrid.helpers.mail import Content, Email, Mail, Personalization, Substitution, To
+
+from .exceptions import MyMissingConfigurationError, MyRequestError
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+SENDGRID_LOTE_MAXIMO = 1000  # Límite de personalizaciones por petición de SendGrid
+SENDGRID_CONEXIONES = 10
+SENDGRID_TIMEOUT_SEGUNDOS = 30
+SENDGRID_REINTENTOS = 5
+SENDGRID_ESPERA_SEGUNDOS = 1.0
+SENDGRID_ESPERA_MAXIMA_SEGUNDOS = 60.0
+
+# Transporte del proceso, con el pid para crear otro después de un fork
+transporte_actual = {}
+transporte_candado = threading.Lock()
+
+
+class SendGridTransport:
+    """Transporte HTTP con una sesión y un pool de conexiones keep-alive hacia SendGrid"""
+
+    def __init__(self, api_key: str):
+        self.sesion = requests.Session()
+        self.sesion.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=SENDGRID_CONEXIONES)
+        self.sesion.mount("https://", adaptador)
+
+    def post(self, payload: dict) -> tuple[int, dict]:
+        """Enviar la petición, entrega el código de estado y los encabezados de la respuesta"""
+        respuesta = self.sesion.post(SENDGRID_URL, json=payload, timeout=SENDGRID_TIMEOUT_SEGUNDOS)
+        return respuesta.status_code, dict(respuesta.headers)
+
+
+class SendGridFakeTransport:
+    """Transporte local que guarda las peticiones, los códigos de estado a responder se pueden encolar"""
+
+    def __init__(self, respuestas: list | None = None):
+        self.peticiones = []
+        self.respuestas = list(respuestas or [])
+
+    def post(self, payload: dict) -> tuple[int, dict]:
+        """Guardar la petición y responder el siguiente código encolado o 202"""
+        self.peticiones.append(payload)
+        codigo = self.respuestas.pop(0) if self.respuestas else 202
+        return codigo, {}
+
+    def destinatarios(self) -> list:
+        """Entregar los correos electrónicos de todos los destinatarios de las peticiones guardadas"""
+        return [to["email"] for peticion in self.peticiones for p in peticion["personalizations"] for to in p["to"]]
+
+
+def get_sendgrid_transport():
+    """Entregar el transporte del proceso, creándolo la primera vez"""
+    pid = os.getpid()
+    with transporte_candado:
+        if transporte_actual.get("pid") != pid:
+            if os.getenv("SENDGRID_TRANSPORT", "") == "fake":
+                transporte = SendGridFakeTransport()
+            else:
+                api_key = os.getenv("SENDGRID_API_KEY", "")
+                if api_key == "":
+                    raise MyMissingConfigurationError("La variable de entorno SENDGRID_API_KEY no está definida")
+                transporte = SendGridTransport(api_key)
+            transporte_actual.update({"pid": pid, "transporte": transporte})
+        return transporte_actual["transporte"]
+
+
+def set_sendgrid_transport(transporte) -> None:
+    """Cambiar el transporte del proceso, por ejemplo por un SendGridFakeTransport en las pruebas"""
+    with transporte_candado:
+        transporte_actual.update({"pid": os.getpid(), "transporte": transporte})
+
+
+def build_sendgrid_mail(remitente: str, asunto: str, contenido_html: str, destinatarios: list) -> dict:
+    """Elaborar la petición con una personalización por destinatario, destinatarios es [(email, sustituciones)]"""
+    mail = Mail(from_email=Email(remitente), subject=asunto, html_content=Content("text/html", contenido_html))
+    for email, sustituciones in destinatarios:
+        personalizacion = Personalization()
+        personalizacion.add_to(To(email))
+        for clave, valor in sustituciones.items():
+            personalizacion.add_substitution(Substitution(clave, valor))
+        mail.add_personalization(personalizacion)
+    return mail.get()
+
+
+def retry_wait_seconds(intento: int, encabezados: dict) -> float:
+    """Calcular la espera antes del siguiente intento, Retry-After manda si viene en la respuesta"""
+    try:
+        return min(float(encabezados["Retry-After"]), SENDGRID_ESPERA_MAXIMA_SEGUNDOS)
+    except (KeyError, TypeError, ValueError):
+        pass
+    return random.uniform(0, min(SENDGRID_ESPERA_SEGUNDOS * 2**intento, SENDGRID_ESPERA_MAXIMA_SEGUNDOS))
+
+
+def post_with_retry(transporte, payload: dict) -> int:
+    """Enviar la petición reintentando en 429, 5xx y fallas de conexión, entrega el código de estado"""
+    descripcion = ""
+    for intento in range(SENDGRID_REINTENTOS + 1):
+        encabezados = {}
+        try:
+            codigo, encabezados = transporte.post(payload)
+        except requests.RequestException as error:
+            codigo, descripcion = None, str(error)
+        if codigo is not None:
+            if codigo < 300:
+                return codigo
+            descripcion = f"SendGrid respondió {codigo}"
+            if codigo != 429 and codigo < 500:
+                raise MyRequestError(descripcion)
+        if intento < SENDGRID_REINTENTOS:
+            time.sleep(retry_wait_seconds(intento, encabezados))
+    raise MyRequestError(f"{descripcion} después de {SENDGRID_REINTENTOS} reintentos")
+
+
+def send_emails_batch(remitente: str, asunto: str, contenido_html: str, destinatarios: list) -> int:
+    """Enviar el mismo mensaje a muchos destinatarios en lotes, entrega cuántos se enviaron"""
+    transporte = get_sendgrid_transport()
+    enviados = 0
+    for inicio in range(0, len(destinatarios), SENDGRID_LOTE_MAXIMO):
+        lote = destinatarios[inicio : inicio + SENDGRID_LOTE_MAXIMO]
+        post_with_retry(transporte, build_sendgrid_mail(remitente, asunto, contenido_html, lote))
+        enviados += len(lote)
+    return enviados
+
+
+def send_email(remitente: str, destinatario: str, asunto: str, contenido_html: str) -> None:
+    """Enviar un mensaje a un destinatario"""
+    send_emails_batch(remitente, asunto, contenido_html, [(destinatario, {})])
@@ -1,49 +1,188 @@
 """
 Tareas en el fondo
+
+El progreso se agrupa para que las tareas puedan informarlo renglón por renglón: en Redis se guarda a lo más cada
+PROGRESO_MILISEGUNDOS o cuando avanza PROGRESO_PORCENTAJE, y en la base de datos solo cuando cambia el mensaje (a lo
+más cada PROGRESO_BD_SEGUNDOS), el archivo o el URL, y de inmediato al terminar o al fallar.
+
+Cada vez que se guarda, el progreso se publica en el canal PROGRESO_CANAL de Redis con el usuario dueño de la tarea,
+la aplicación lo reenvía por Socket.IO a su navegador (ver blueprints/tareas/events.py).
 """
 
+import json
+import time
+
+from redis.exceptions import RedisError
 from rq import get_current_job
 
 from ..blueprints.tareas.models import Tarea
+from ..config.extensions import database
+
+PROGRESO_MILISEGUNDOS = 1000
+PROGRESO_PORCENTAJE = 5
+PROGRESO_BD_SEGUNDOS = 10
+PROGRESO_CANAL = "pjecz_casiopea:tareas_progreso"
+
+# Colas por prioridad, la de alta conserva el nombre TASK_QUEUE_NAME porque ahí encola la API los mensajes de
+# cit_clientes_registros y cit_clientes_recuperaciones, la de baja agrega el sufijo y recibe las tareas largas
+COLA_ALTA = "alta"
+COLA_BAJA = "baja"
+COLAS_SUFIJOS = {COLA_ALTA: "", COLA_BAJA: "_baja"}
+
+# Comandos que van a la cola de baja prioridad, los demás van a la de alta
+COMANDOS_COLA_BAJA = {
+    "bitacoras.tasks.lanzar_exportar",
+    "cit_citas.tasks.lanzar_exportar",
+    "cit_clientes.tasks.lanzar_exportar",
+    "pag_pagos.tasks.lanzar_exportar",
+}
+
+# Progreso de la tarea en curso, en un worker se ejecuta una tarea a la vez por proceso
+progresos = {}
+
+
+class TaskProgress:
+    """Progreso de una tarea en el fondo, guarda los cambios agrupados en Redis y en la base de datos"""
+
+    def __init__(self, job):
+        self.job = job
+        self.progress = 0
+        self.message = None
+        self.archivo = ""
+        self.url = ""
+        # Lo último que se guardó en Redis y en la base de datos
+        self.redis_progress = None
+        self.redis_tiempo = 0.0
+        self.bd_tiempo = None
+        self.bd_pendiente = False
+        self.bd_ha_terminado = False
+
+    def update(self, progress: int, message: str, archivo: str = "", url: str = "") -> None:
+        """Cambiar el progreso, solo se guarda cuando pasa el tiempo o el avance mínimo, cambia el archivo o se termina"""
+        ahora = time.monotonic()
+        urgente = (progress >= 100) != self.bd_ha_terminado
+        self.progress = progress
+        if message != self.message:
+            self.message = message
+            self.bd_pendiente = True
+        if archivo != "" and archivo != self.archivo:
+            self.archivo = archivo
+            self.bd_pendiente = urgente = True
+        if url != "" and url != self.url:
+            self.url = url
+            self.bd_pendiente = urgente = True
+        guardado = False
+        # Guardar en Redis si pasó el tiempo, si avanzó lo suficiente o si cambió el estado de terminado
+        if (
+            urgente
+            or self.redis_progress is None
+            or abs(progress - self.redis_progress) >= PROGRESO_PORCENTAJE
+            or (ahora - self.redis_tiempo) * 1000 >= PROGRESO_MILISEGUNDOS
+        ):
+            self.save_redis(ahora)
+            guardado = True
+        # Guardar en la base de datos si hay cambios y es urgente, es la primera vez o ya pasó el tiempo
+        if self.bd_pendiente and (urgente or self.bd_tiempo is None or ahora - self.bd_tiempo >= PROGRESO_BD_SEGUNDOS):
+            self.save_database(ahora)
+            guardado = True
+        # Publicar lo que se guardó
+        if guardado:
+            self.publish()
+
+    def fail(self, message: str) -> None:
+        """Terminar la tarea con el mensaje de error, guardándolo de inmediato"""
+        self.progress = 100
+        self.message = message
+        self.bd_pendiente = True
+        self.flush()
+
+    def flush(self) -> None:
+        """Guardar lo pendiente en Redis y en la base de datos"""
+        ahora = time.monotonic()
+        guardado = False
+        if self.progress != self.redis_progress:
+            self.save_redis(ahora)
+            guardado = True
+        if self.bd_pendiente or (self.progress >= 100) != self.bd_ha_terminado:
+            self.save_database(ahora)
+            guardado = True
+        if guardado:
+            self.publish()
+
+    def save_redis(self, ahora: float) -> None:
+        """Guardar el progreso en el meta del job de RQ"""
+        self.job.meta["progress"] = self.progress
+        self.job.save_meta()
+        self.redis_progress = self.progress
+        self.redis_tiempo = ahora
+
+    def save_database(self, ahora: float) -> None:
+        """Guardar el mensaje, el archivo, el URL y si ha terminado, con un UPDATE sin consultar antes la tarea"""
+        valores = {"ha_terminado": self.progress >= 100}
+        if self.message is not None:
+            valores["mensaje"] = self.message
+        if self.archivo != "":
+            valores["archivo"] = self.archivo
+        if self.url != "":
+            valores["url"] = self.url
+        Tarea.query.filter_by(id=self.job.get_id()).update(valores, synchronize_session=False)
+        database.session.commit()
+        self.bd_tiempo = ahora
+        self.bd_pendiente = False
+        self.bd_ha_terminado = valores["ha_terminado"]
+
+    def publish(self) -> None:
+        """Publicar el progreso en el canal de Redis, sin fallar la tarea si no se puede"""
+        usuario_id = self.job.meta.get("usuario_id", "")
+        if usuario_id == "":
+            return
+        evento = {
+            "tarea_id": self.job.get_id(),
+            "usuario_id": usuario_id,
+            "progress": self.progress,
+            "mensaje": self.message or "",
+            "ha_terminado": self.progress >= 100,
+        }
+        try:
+            self.job.connection.publish(PROGRESO_CANAL, json.dumps(evento))
+        except RedisError:
+            pass
+
+
+def task_queue_name(nombre: str, prioridad: str) -> str:
+    """Elaborar el nombre de la cola de la prioridad, a partir de TASK_QUEUE_NAME"""
+    return f"{nombre}{COLAS_SUFIJOS[prioridad]}"
+
+
+def get_task_priority(comando: str) -> str:
+    """Elegir la cola del comando"""
+    return COLA_BAJA if comando in COMANDOS_COLA_BAJA else COLA_ALTA
+
+
+def get_task_progress() -> TaskProgress | None:
+    """Entregar el progreso de la tarea en curso, None si no se ejecuta en un worker"""
+    job = get_current_job()
+    if job is None:
+        return None
+    progreso = progresos.get(job.get_id())
+    if progreso is None:
+        progresos.clear()
+        progreso = progresos[job.get_id()] = TaskProgress(job)
+    return progreso
 
 
 def set_task_progress(progress: int, message: str, archivo: str = "", url: str = "") -> None:
     """Cambiar el progreso de la tarea"""
-    job = get_current_job()
-    if job:
-        job.meta["progress"] = progress
-        job.save_meta()
-        tarea = Tarea.query.get(job.get_id())
-        if tarea:
-            hay_cambios = False
-            if archivo != "" and archivo != tarea.archivo:
-                tarea.archivo = archivo
-                hay_cambios = True
-            if url != "" and url != tarea.url:
-                tarea.url = url
-                hay_cambios = True
-            if progress < 100 and tarea.ha_terminado is True:
-                tarea.ha_terminado = False
-                hay_cambios = True
-            if progress >= 100 and tarea.ha_terminado is False:
-                tarea.ha_terminado = True
-                hay_cambios = True
-            if message != tarea.mensaje:
-                tarea.mensaje = message
-                hay_cambios = True
-            if hay_cambios:
-                tarea.save()
+    progreso = get_task_progress()
+    if progreso:
+        progreso.update(progress, message, archivo, url)
+        if progress >= 100:
+            progreso.flush()
 
 
 def set_task_error(message: str) -> str:
     """Al fallar la tarea debe tomar el message y terminarla"""
-    job = get_current_job()
-    if job:
-        job.meta["progress"] = 100
-        job.save_meta()
-        tarea = Tarea.query.get(job.get_id())
-        if tarea:
-            tarea.ha_terminado = True
-            tarea.mensaje = message
-            tarea.save()
+    progreso = get_task_progress()
+    if progreso:
+        progreso.fail(message)
     return message
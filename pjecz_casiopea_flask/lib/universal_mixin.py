@@ -2,8 +2,10 @@
 Universal Mixin
 """
 
+from contextlib import contextmanager
 from datetime import datetime
 
+from sqlalchemy import select, update
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql.functions import now
 from sqlalchemy.types import CHAR
@@ -14,6 +16,9 @@ from ..config.extensions import database
 class UniversalMixin:
     """Columnas y metodos universales"""
 
+    # Cantidad de registros por cada UPDATE y commit de los cambios masivos de estatus
+    BULK_CHUNK_SIZE = 1000
+
     creado: Mapped[datetime] = mapped_column(default=now(), server_default=now())
     modificado: Mapped[datetime] = mapped_column(default=now(), onupdate=now(), server_default=now())
     estatus: Mapped[str] = mapped_column(CHAR, default="A", server_default="A")
@@ -33,8 +38,61 @@ class UniversalMixin:
             return self.save()
         return None
 
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """Agrupar varios save en una sola transacción, dentro del bloque save solo agrega y al salir se hace un commit"""
+        sesion = database.session
+        profundidad = sesion.info.get("universal_mixin_batch", 0)
+        sesion.info["universal_mixin_batch"] = profundidad + 1
+        try:
+            yield sesion
+            if profundidad == 0:
+                sesion.commit()
+        except Exception:
+            if profundidad == 0:
+                sesion.rollback()
+            raise
+        finally:
+            sesion.info["universal_mixin_batch"] = profundidad
+
+    @classmethod
+    def bulk_change_estatus(cls, estatus_actual: str, estatus_nuevo: str, *criterios, chunk_size: int = None) -> int:
+        """Cambiar el estatus de los registros que cumplan los criterios, por bloques con un commit por bloque"""
+        chunk_size = chunk_size or cls.BULK_CHUNK_SIZE
+        contador = 0
+        while True:
+            # Consultar los ids del siguiente bloque, los ya cambiados dejan de cumplir el estatus actual
+            ids = database.session.scalars(
+                select(cls.id).where(cls.estatus == estatus_actual, *criterios).limit(chunk_size)
+            ).all()
+            if not ids:
+                break
+            database.session.execute(
+                update(cls).where(cls.id.in_(ids)).values(estatus=estatus_nuevo).execution_options(synchronize_session=False)
+            )
+            cls.after_bulk_change_estatus(ids, estatus_nuevo)
+            database.session.commit()
+            contador += len(ids)
+        return contador
+
+    @classmethod
+    def after_bulk_change_estatus(cls, ids: list, estatus_nuevo: str):
+        """Se ejecuta en la misma transacción de cada bloque, para que los modelos actualicen lo que dependa del estatus"""
+
+    @classmethod
+    def bulk_delete(cls, *criterios, chunk_size: int = None) -> int:
+        """Eliminar (borrado lógico) los registros que cumplan los criterios, entrega la cantidad"""
+        return cls.bulk_change_estatus("A", "B", *criterios, chunk_size=chunk_size)
+
+    @classmethod
+    def bulk_recover(cls, *criterios, chunk_size: int = None) -> int:
+        """Recuperar los registros que cumplan los criterios, entrega la cantidad"""
+        return cls.bulk_change_estatus("B", "A", *criterios, chunk_size=chunk_size)
+
     def save(self):
-        """Guardar registro"""
+        """Guardar registro, si está dentro de batch solo lo agrega, quien necesite el id antes del commit hace flush"""
         database.session.add(self)
-        database.session.commit()
+        if database.session.info.get("universal_mixin_batch", 0) == 0:
+            database.session.commit()
         return self
@@ -0,0 +1,98 @@
+"""
+Usuarios, caché de la sesión
+
+Flask-Login carga al usuario en cada petición. Para no consultar la tabla usuarios cada vez, se guarda en Redis
+una foto compacta del usuario (id, email, estatus, autoridad, nombres, puesto y permisos resueltos) con vencimiento.
+Con la foto se reconstruye la instancia y se agrega a la sesión de SQLAlchemy sin consultar la base de datos.
+"""
+
+import json
+import uuid
+from types import MappingProxyType
+
+from flask import current_app, g, has_app_context, has_request_context
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
+
+from ..config.extensions import database
+from .permissions_cache import ModuloMenu, PermisosResueltos, get_permissions_version, get_user_permissions
+
+USUARIO_SESION_PREFIJO = "pjecz_casiopea:usuario_sesion:"
+USUARIO_SESION_SEGUNDOS = 300
+
+# Columnas del usuario que se guardan en la foto, las demás se cargan de la base de datos si se usan
+USUARIO_SESION_COLUMNAS = ("email", "estatus", "nombres", "apellido_paterno", "apellido_materno", "puesto")
+
+
+def get_redis():
+    """Entregar la conexión a Redis de la aplicación, o None si no la hay"""
+    if has_app_context():
+        return getattr(current_app, "redis", None)
+    return None
+
+
+def build_user_snapshot(usuario) -> dict:
+    """Elaborar la foto compacta del usuario con sus permisos resueltos y la versión de éstos"""
+    foto = {columna: getattr(usuario, columna) for columna in USUARIO_SESION_COLUMNAS}
+    foto["id"] = str(usuario.id)
+    foto["autoridad_id"] = str(usuario.autoridad_id)
+    foto["permisos_version"] = get_permissions_version()
+    permisos_resueltos = get_user_permissions(usuario.id)
+    foto["permisos"] = dict(permisos_resueltos.permisos)
+    foto["menu"] = [list(modulo) for modulo in permisos_resueltos.menu]
+    return foto
+
+
+def restore_user_snapshot(user_model, foto: dict):
+    """Reconstruir al usuario desde la foto y agregarlo a la sesión sin consultar la base de datos"""
+    usuario = user_model(
+        id=uuid.UUID(foto["id"]),
+        autoridad_id=uuid.UUID(foto["autoridad_id"]),
+        **{columna: foto[columna] for columna in USUARIO_SESION_COLUMNAS},
+    )
+    make_transient_to_detached(usuario)
+    usuario = database.session.merge(usuario, load=False)
+    # Si los permisos de la foto siguen vigentes, dejarlos resueltos para esta petición
+    if has_request_context() and foto.get("permisos_version") == get_permissions_version():
+        menu = tuple(ModuloMenu(*modulo) for modulo in foto["menu"])
+        resueltos = g.setdefault("permisos_resueltos", {})
+        resueltos[usuario.id] = PermisosResueltos(MappingProxyType(foto["permisos"]), menu)
+    return usuario
+
+
+def load_user_cached(user_model, uid):
+    """Cargar al usuario desde la foto en Redis, si no está consultarlo y guardar la foto"""
+    redis = get_redis()
+    llave = f"{USUARIO_SESION_PREFIJO}{uid}"
+    # Consultar la foto en Redis
+    if redis is not None:
+        try:
+            guardado = redis.get(llave)
+        except RedisError:
+            guardado = None
+        if guardado is not None:
+            try:
+                return restore_user_snapshot(user_model, json.loads(guardado))
+            except (KeyError, TypeError, ValueError):
+                pass
+    # Consultar al usuario en la base de datos
+    usuario = user_model.query.get(uid)
+    if usuario is None or redis is None:
+        return usuario
+    # Guardar la foto con vencimiento
+    try:
+        redis.set(llave, json.dumps(build_user_snapshot(usuario)), ex=USUARIO_SESION_SEGUNDOS)
+    except RedisError:
+        pass
+    return usuario
+
+
+def delete_user_snapshot(uid) -> None:
+    """Borrar la foto del usuario para que la siguiente petición lo consulte de la base de datos"""
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        redis.delete(f"{USUARIO_SESION_PREFIJO}{uid}")
+    except RedisError:
+        pass
@@ -29,6 +29,7 @@ from .blueprints.pag_tramites_servicios.views import pag_tramites_servicios
 from .blueprints.permisos.views import permisos
 from .blueprints.roles.views import roles
 from .blueprints.sistemas.views import sistemas
+from .blueprints.tareas.events import TAREAS_NAMESPACE, TareasNamespace
 from .blueprints.tareas.views import tareas
 from .blueprints.usuarios.models import Usuario
 from .blueprints.usuarios.views import usuarios
@@ -37,8 +38,9 @@ from .blueprints.usuarios_roles.views import usuarios_roles
 from .blueprints.web_archivos.views import web_archivos
 from .blueprints.web_paginas.views import web_paginas
 from .blueprints.web_ramas.views import web_ramas
-from .config.extensions import authentication, csrf, database, login_manager, moment
+from .config.extensions import authentication, csrf, database, login_manager, moment, socketio
 from .config.settings import Settings
+from .lib.tasks import COLA_ALTA, COLAS_SUFIJOS, task_queue_name
 
 
 # Clase para interceptar las peticiones para que en producción se inyecte el prefijo PREFIX
@@ -103,9 +105,28 @@ database.init_app(app)
 login_manager.init_app(app)
 moment.init_app(app)
 
+# Socket.IO, en producción con gevent porque cada navegador conectado ocupa su conexión todo el tiempo y con hilos
+# acabaría con los de gunicorn, ver gunicorn.conf.py; en desarrollo con hilos para usar flask run
+if app.config["ENVIRONMENT"].lower() == "production":
+    socketio.init_app(app, async_mode="gevent")
+else:
+    socketio.init_app(app, async_mode="threading")
+
+# Enviar el progreso de las tareas a los navegadores por Socket.IO
+socketio.on_namespace(TareasNamespace(TAREAS_NAMESPACE))
+
 # Cargar el modelo de usuario para la autenticación
 authentication(Usuario)
 
 # Inicializar conexión a Redis
 redis_client = Redis(host=app.config["REDIS_HOST"], port=app.config["REDIS_PORT"])
-task_queue = Queue(name=app.config["TASK_QUEUE_NAME"], connection=redis_client)
+task_queues = {
+    prioridad: Queue(name=task_queue_name(app.config["TASK_QUEUE_NAME"], prioridad), connection=redis_client)
+    for prioridad in COLAS_SUFIJOS
+}
+task_queue = task_queues[COLA_ALTA]
+
+# Dejar Redis y las colas de tareas en la aplicación para usarlos con current_app
+app.redis = redis_client
+app.task_queue = task_queue
+app.task_queues = task_queues
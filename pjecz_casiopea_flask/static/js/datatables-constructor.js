@@ -41,3 +41,18 @@ class ConfigDataTable {
     };
   }
 }
+
+/* Paginación por llave (keyset) */
+// Si el servidor entrega un cursor, se guarda para el inicio de la página a la que corresponde
+$(document).on("xhr.dt", function (e, settings, json) {
+  if (json && json.cursor) {
+    settings.cursores = settings.cursores || {};
+    settings.cursores[json.cursor_start] = json.cursor;
+  }
+});
+// Al solicitar una página, se envía el cursor si se tiene uno para su inicio
+$(document).on("preXhr.dt", function (e, settings, data) {
+  if (settings.cursores && settings.cursores[data.start]) {
+    data.cursor = settings.cursores[data.start];
+  }
+});
@@ -98,6 +98,18 @@ class FiltrosDataTable {
     $(this.dataTable).DataTable(this.configDataTable);
   }
 
+  // Agregar un botón de exportar, al dar clic va al URL con los valores de los filtros que se envían al DataTable
+  agregarExportar(elementById, url) {
+    let boton = document.getElementById(elementById);
+    if (boton === null) return;
+    boton.addEventListener("click", (event) => {
+      event.preventDefault();
+      this.leerValoresInputs();
+      let parametros = new URLSearchParams(this.configDataTable["ajax"]["data"]);
+      window.location.href = url + "?" + parametros.toString();
+    });
+  }
+
   // Precargar
   precargar() {
     $(this.dataTable).DataTable(this.configDataTable);
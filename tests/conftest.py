@@ -0,0 +1,138 @@
+"""
+Pruebas, fixtures
+
+Las pruebas con la base de datos necesitan un PostgreSQL vacío en la variable de entorno TEST_SQLALCHEMY_DATABASE_URI,
+las tablas se crean al iniciar y se eliminan al terminar. Si no está definida, esas pruebas se omiten.
+"""
+
+import os
+from datetime import date, time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+TEST_SQLALCHEMY_DATABASE_URI = os.getenv("TEST_SQLALCHEMY_DATABASE_URI", "")
+
+# La configuración se toma de las variables de entorno al crear la aplicación, antes de importar las pruebas
+if TEST_SQLALCHEMY_DATABASE_URI != "":
+    os.environ["SQLALCHEMY_DATABASE_URI"] = TEST_SQLALCHEMY_DATABASE_URI
+    os.environ["ENVIRONMENT"] = "development"
+    os.environ.setdefault("SECRET_KEY", "pruebas")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Aplicación con las tablas creadas en la base de datos de pruebas"""
+    if TEST_SQLALCHEMY_DATABASE_URI == "":
+        pytest.skip("Defina TEST_SQLALCHEMY_DATABASE_URI para las pruebas con la base de datos")
+    from pjecz_casiopea_flask.config.extensions import database
+    from pjecz_casiopea_flask.main import app as aplicacion
+
+    aplicacion.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with aplicacion.app_context():
+        database.drop_all()
+        database.create_all()
+        yield aplicacion
+        database.session.remove()
+        database.drop_all()
+
+
+@pytest.fixture()
+def base_de_datos(app):
+    """Sesión de la base de datos, al terminar la prueba se vacían todas las tablas"""
+    from pjecz_casiopea_flask.config.extensions import database
+
+    yield database
+    database.session.rollback()
+    tablas = ", ".join(tabla.name for tabla in database.metadata.sorted_tables)
+    database.session.execute(text(f"TRUNCATE {tablas} CASCADE"))
+    database.session.commit()
+
+
+@pytest.fixture()
+def datos(base_de_datos):
+    """Registros mínimos para citas y bitácoras: oficina, servicio, cliente, módulo y usuario"""
+    from pjecz_casiopea_flask.blueprints.autoridades.models import Autoridad
+    from pjecz_casiopea_flask.blueprints.cit_categorias.models import CitCategoria
+    from pjecz_casiopea_flask.blueprints.cit_clientes.models import CitCliente
+    from pjecz_casiopea_flask.blueprints.cit_servicios.models import CitServicio
+    from pjecz_casiopea_flask.blueprints.distritos.models import Distrito
+    from pjecz_casiopea_flask.blueprints.domicilios.models import Domicilio
+    from pjecz_casiopea_flask.blueprints.materias.models import Materia
+    from pjecz_casiopea_flask.blueprints.modulos.models import Modulo
+    from pjecz_casiopea_flask.blueprints.oficinas.models import Oficina
+    from pjecz_casiopea_flask.blueprints.usuarios.models import Usuario
+
+    distrito = Distrito(clave="PRUEBA", nombre="Distrito de pruebas", nombre_corto="Pruebas")
+    materia = Materia(clave="PRUEBA", nombre="Materia de pruebas", descripcion="Materia de pruebas")
+    domicilio = Domicilio(
+        clave="PRUEBA",
+        edificio="Edificio de pruebas",
+        estado="COAHUILA",
+        municipio="SALTILLO",
+        calle="CALLE",
+        num_ext="1",
+        num_int="",
+        colonia="CENTRO",
+        cp=25000,
+        completo="CALLE 1, CENTRO, SALTILLO, COAHUILA",
+    )
+    autoridad = Autoridad(
+        distrito=distrito,
+        materia=materia,
+        clave="PRUEBA",
+        descripcion="Autoridad de pruebas",
+        descripcion_corta="Pruebas",
+    )
+    oficina = Oficina(
+        distrito=distrito,
+        domicilio=domicilio,
+        clave="PRUEBA",
+        descripcion="Oficina de pruebas",
+        descripcion_corta="Pruebas",
+        puede_agendar_citas=True,
+        apertura=time(8, 0),
+        cierre=time(14, 0),
+        limite_personas=2,
+    )
+    cit_categoria = CitCategoria(clave="PRUEBA", nombre="Categoría de pruebas")
+    cit_servicio = CitServicio(
+        cit_categoria=cit_categoria,
+        clave="PRUEBA",
+        descripcion="Servicio de pruebas",
+        duracion=time(0, 30),
+        documentos_limite=1,
+        dias_habilitados="12345",
+    )
+    cit_cliente = CitCliente(
+        nombres="CLIENTE",
+        apellido_primero="DE",
+        apellido_segundo="PRUEBAS",
+        curp="PRUE000101HCLRRR09",
+        telefono="8440000000",
+        email="cliente@pruebas.com",
+        contrasena_md5="",
+        contrasena_sha256="",
+        renovacion=date(2100, 1, 1),
+    )
+    modulo = Modulo(nombre="BITACORAS", nombre_corto="Bitácoras", icono="fa-list", ruta="/bitacoras")
+    usuario = Usuario(
+        autoridad=autoridad,
+        email="usuario@pruebas.com",
+        nombres="USUARIO",
+        apellido_paterno="DE",
+        apellido_materno="PRUEBAS",
+        puesto="PRUEBAS",
+        contrasena="",
+    )
+    base_de_datos.session.add_all([oficina, cit_servicio, cit_cliente, modulo, usuario])
+    base_de_datos.session.commit()
+    return SimpleNamespace(
+        oficina=oficina,
+        cit_servicio=cit_servicio,
+        cit_cliente=cit_cliente,
+        modulo=modulo,
+        usuario=usuario,
+    )
+
@@ -0,0 +1,26 @@
+"""
+Pruebas, utilerías
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from pjecz_casiopea_flask.config.extensions import database
+
+
+@contextmanager
+def assert_max_sql_statements(maximo: int):
+    """Contar las sentencias SQL ejecutadas dentro del bloque y fallar si son más que el máximo"""
+    sentencias = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", contar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(database.engine, "before_cursor_execute", contar)
+    if len(sentencias) > maximo:
+        raise AssertionError(f"Se ejecutaron {len(sentencias)} sentencias SQL, el máximo es {maximo}")
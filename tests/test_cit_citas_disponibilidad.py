@@ -0,0 +1,106 @@
+"""
+Pruebas, disponibilidad de las citas
+
+La oficina de pruebas abre de 8:00 a 14:00 y atiende a dos personas a la vez, el servicio dura 30 minutos.
+"""
+
+from datetime import date, datetime, time
+
+LUNES = date(2100, 1, 4)
+MARTES = date(2100, 1, 5)
+SABADO = date(2100, 1, 9)
+
+
+def nueva_cita(datos, inicio: datetime, termino: datetime, estado: str = "PENDIENTE"):
+    """Crear una cita de la oficina y el servicio de pruebas"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCita
+
+    return CitCita(
+        cit_cliente=datos.cit_cliente,
+        cit_servicio=datos.cit_servicio,
+        oficina=datos.oficina,
+        inicio=inicio,
+        termino=termino,
+        estado=estado,
+    ).save()
+
+
+def test_build_occupancy():
+    """Las citas suman en las celdas que tocan y las horas bloqueadas las llenan hasta el límite"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.availability import build_occupancy
+
+    citas = [
+        (datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30))),
+        (datetime.combine(LUNES, time(8, 15)), datetime.combine(LUNES, time(8, 45))),
+        (datetime.combine(MARTES, time(7, 0)), datetime.combine(MARTES, time(8, 15))),
+    ]
+    horas_bloqueadas = [(LUNES, time(9, 0), time(9, 30))]
+    ocupacion = build_occupancy(LUNES, MARTES, 8 * 60, 8, 15, 2, horas_bloqueadas, citas)
+
+    assert list(ocupacion[LUNES]) == [1, 2, 1, 0, 2, 2, 0, 0]
+    assert list(ocupacion[MARTES]) == [1, 0, 0, 0, 0, 0, 0, 0]
+
+
+def test_horas_disponibles(datos):
+    """Una hora se ofrece solo si en todas las celdas del servicio queda lugar"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.availability import get_available_slots
+
+    nueva_cita(datos, datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30)))
+    nueva_cita(datos, datetime.combine(LUNES, time(8, 15)), datetime.combine(LUNES, time(8, 45)))
+    nueva_cita(datos, datetime.combine(LUNES, time(10, 0)), datetime.combine(LUNES, time(10, 30)), "CANCELO")
+    nueva_cita(datos, datetime.combine(LUNES, time(10, 0)), datetime.combine(LUNES, time(10, 30)), "CANCELO")
+
+    disponibles = get_available_slots(datos.oficina.id, datos.cit_servicio.id, LUNES, LUNES, ahora=datetime(2099, 1, 1))
+    horas = disponibles[LUNES]
+
+    # De 8:15 a 8:30 hay dos citas, no caben las que inician a las 8:00 y a las 8:15
+    assert time(8, 0) not in horas
+    assert time(8, 15) not in horas
+    assert horas[0] == time(8, 30)
+    # Las citas canceladas no ocupan lugar
+    assert time(10, 0) in horas
+    # La última hora es la que termina al cierre
+    assert horas[-1] == time(13, 30)
+
+
+def test_dias_inhabiles_fines_de_semana_y_horas_bloqueadas(datos, base_de_datos):
+    """No se ofrecen los días inhábiles, los que no habilita el servicio ni las horas bloqueadas"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.availability import get_available_slots
+    from pjecz_casiopea_flask.blueprints.cit_dias_inhabiles.models import CitDiaInhabil
+    from pjecz_casiopea_flask.blueprints.cit_horas_bloqueadas.models import CitHoraBloqueada
+
+    base_de_datos.session.add(CitDiaInhabil(fecha=MARTES, descripcion="Día inhábil de pruebas"))
+    base_de_datos.session.add(
+        CitHoraBloqueada(oficina=datos.oficina, fecha=LUNES, inicio=time(8, 0), termino=time(13, 0), descripcion="Junta")
+    )
+    base_de_datos.session.commit()
+
+    disponibles = get_available_slots(datos.oficina.id, datos.cit_servicio.id, LUNES, SABADO, ahora=datetime(2099, 1, 1))
+
+    assert disponibles[LUNES] == [time(13, 0), time(13, 15), time(13, 30)]
+    assert MARTES not in disponibles
+    assert SABADO not in disponibles
+    assert date(2100, 1, 6) in disponibles
+
+
+def test_no_ofrecer_horas_pasadas(datos):
+    """En el día de hoy solo se ofrecen las horas que no han pasado"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.availability import get_available_slots
+
+    ahora = datetime.combine(LUNES, time(12, 40))
+    disponibles = get_available_slots(datos.oficina.id, datos.cit_servicio.id, LUNES, LUNES, ahora=ahora)
+
+    assert disponibles[LUNES] == [time(12, 45), time(13, 0), time(13, 15), time(13, 30)]
+
+
+def test_has_capacity(datos):
+    """Hay lugar mientras la ocupación de todas las celdas de la cita esté abajo del límite"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.availability import has_capacity
+
+    inicio, termino = datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30))
+    assert has_capacity(datos.oficina, inicio, termino)
+    nueva_cita(datos, inicio, termino)
+    assert has_capacity(datos.oficina, inicio, termino)
+    nueva_cita(datos, datetime.combine(LUNES, time(8, 15)), datetime.combine(LUNES, time(8, 45)))
+    assert not has_capacity(datos.oficina, inicio, termino)
+    assert has_capacity(datos.oficina, datetime.combine(LUNES, time(8, 45)), datetime.combine(LUNES, time(9, 15)))
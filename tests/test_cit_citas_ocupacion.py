@@ -0,0 +1,133 @@
+"""
+Pruebas, ocupación de las citas
+
+La tabla cit_citas_ocupaciones se mantiene al crear, cancelar, mover, eliminar y recuperar citas, y nunca guarda
+cantidades negativas aunque se reste de celdas que no existen.
+"""
+
+from datetime import date, datetime, time
+
+from sqlalchemy import select
+
+LUNES = date(2100, 1, 4)
+
+
+def nueva_cita(datos, inicio: datetime, termino: datetime):
+    """Crear una cita pendiente de la oficina y el servicio de pruebas"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCita
+
+    return CitCita(
+        cit_cliente=datos.cit_cliente,
+        cit_servicio=datos.cit_servicio,
+        oficina=datos.oficina,
+        inicio=inicio,
+        termino=termino,
+        estado="PENDIENTE",
+    ).save()
+
+
+def ocupacion(base_de_datos) -> dict:
+    """Entregar la ocupación como un diccionario con llave (fecha, hora)"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCitaOcupacion
+
+    renglones = base_de_datos.session.execute(
+        select(CitCitaOcupacion.fecha, CitCitaOcupacion.hora, CitCitaOcupacion.cantidad)
+    ).all()
+    return {(fecha, hora): cantidad for fecha, hora, cantidad in renglones}
+
+
+def test_cells():
+    """Las celdas de una cita comienzan en el múltiplo de 15 minutos anterior y terminan antes del término"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCitaOcupacion
+
+    celdas = CitCitaOcupacion.cells(datetime(2100, 1, 4, 8, 10), datetime(2100, 1, 4, 8, 45))
+    assert [celda.time() for celda in celdas] == [time(8, 0), time(8, 15), time(8, 30)]
+    assert CitCitaOcupacion.cells(datetime(2100, 1, 4, 8, 0), datetime(2100, 1, 4, 8, 0)) == []
+
+
+def test_crear_y_cancelar(datos, base_de_datos):
+    """Crear dos citas suma en sus celdas y cancelar una la resta"""
+    inicio, termino = datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30))
+    primera = nueva_cita(datos, inicio, termino)
+    nueva_cita(datos, inicio, termino)
+    assert ocupacion(base_de_datos) == {(LUNES, time(8, 0)): 2, (LUNES, time(8, 15)): 2}
+
+    primera.estado = "CANCELO"
+    primera.save()
+    assert ocupacion(base_de_datos) == {(LUNES, time(8, 0)): 1, (LUNES, time(8, 15)): 1}
+
+
+def test_mover(datos, base_de_datos):
+    """Mover una cita resta de las celdas anteriores y suma en las nuevas"""
+    cit_cita = nueva_cita(datos, datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30)))
+    cit_cita.inicio = datetime.combine(LUNES, time(9, 0))
+    cit_cita.termino = datetime.combine(LUNES, time(9, 30))
+    cit_cita.save()
+    assert ocupacion(base_de_datos) == {
+        (LUNES, time(8, 0)): 0,
+        (LUNES, time(8, 15)): 0,
+        (LUNES, time(9, 0)): 1,
+        (LUNES, time(9, 15)): 1,
+    }
+
+
+def test_restar_sin_celdas_no_inserta_negativos(datos, base_de_datos):
+    """Si la ocupación no tiene las celdas, cancelar no inserta cantidades negativas"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCitaOcupacion
+
+    cit_cita = nueva_cita(datos, datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30)))
+    CitCitaOcupacion.query.delete()
+    base_de_datos.session.commit()
+
+    cit_cita.estado = "CANCELO"
+    cit_cita.save()
+    assert ocupacion(base_de_datos) == {}
+
+
+def test_restar_no_baja_de_cero(datos, base_de_datos):
+    """Si la ocupación se quedó abajo, restar la deja en cero"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCitaOcupacion
+
+    cit_cita = nueva_cita(datos, datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30)))
+    CitCitaOcupacion.query.update({"cantidad": 0})
+    base_de_datos.session.commit()
+
+    cit_cita.delete()
+    assert ocupacion(base_de_datos) == {(LUNES, time(8, 0)): 0, (LUNES, time(8, 15)): 0}
+
+
+def test_eliminar_y_recuperar_en_bloque(datos, base_de_datos):
+    """Eliminar en bloque resta sin bajar de cero y recuperar vuelve a sumar"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCita, CitCitaOcupacion
+
+    inicio, termino = datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30))
+    nueva_cita(datos, inicio, termino)
+    nueva_cita(datos, inicio, termino)
+
+    assert CitCita.bulk_delete(CitCita.oficina_id == datos.oficina.id) == 2
+    assert ocupacion(base_de_datos) == {(LUNES, time(8, 0)): 0, (LUNES, time(8, 15)): 0}
+
+    CitCitaOcupacion.query.delete()
+    base_de_datos.session.commit()
+    assert CitCita.bulk_recover(CitCita.oficina_id == datos.oficina.id) == 2
+    assert ocupacion(base_de_datos) == {(LUNES, time(8, 0)): 2, (LUNES, time(8, 15)): 2}
+
+    CitCitaOcupacion.query.delete()
+    base_de_datos.session.commit()
+    assert CitCita.bulk_delete(CitCita.oficina_id == datos.oficina.id) == 2
+    assert ocupacion(base_de_datos) == {}
+
+
+def test_reconstruir(datos, base_de_datos):
+    """Reconstruir da lo mismo que mantener la ocupación al guardar las citas"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCitaOcupacion
+
+    nueva_cita(datos, datetime.combine(LUNES, time(8, 0)), datetime.combine(LUNES, time(8, 30)))
+    nueva_cita(datos, datetime.combine(LUNES, time(8, 15)), datetime.combine(LUNES, time(9, 0)))
+    cancelada = nueva_cita(datos, datetime.combine(LUNES, time(10, 0)), datetime.combine(LUNES, time(10, 30)))
+    cancelada.estado = "CANCELO"
+    cancelada.save()
+    mantenida = {llave: cantidad for llave, cantidad in ocupacion(base_de_datos).items() if cantidad > 0}
+
+    CitCitaOcupacion.rebuild()
+    assert ocupacion(base_de_datos) == mantenida
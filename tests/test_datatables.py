@@ -0,0 +1,79 @@
+"""
+Pruebas, DataTables
+
+Los listados cargan las relaciones con el perfil del endpoint, así las sentencias SQL no crecen con los renglones de
+la página: una para la página, una para el EXPLAIN del total estimado, una para contar exacto si el estimado es bajo
+y una para resolver los permisos del usuario.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask_login import login_user
+
+from tests.helpers import assert_max_sql_statements
+
+SENTENCIAS_MAXIMO = 4
+RENGLONES = 25
+
+
+def datatable_request(app, ruta: str, length: int = 10):
+    """Elaborar la petición que envía DataTables por POST"""
+    datos = {"draw": "1", "start": "0", "length": str(length), "estatus": "A"}
+    return app.test_request_context(ruta, method="POST", data=datos)
+
+
+@pytest.mark.parametrize("length", [10, 20])
+def test_cit_citas_datatable_json(app, datos, length):
+    """El listado de citas no consulta cada cliente, servicio y oficina por separado"""
+    from pjecz_casiopea_flask.blueprints.cit_citas.models import CitCita
+    from pjecz_casiopea_flask.blueprints.cit_citas.views import datatable_json
+    from pjecz_casiopea_flask.config.extensions import database
+
+    inicio = datetime(2100, 1, 4, 8, 0)
+    for numero in range(RENGLONES):
+        database.session.add(
+            CitCita(
+                cit_cliente=datos.cit_cliente,
+                cit_servicio=datos.cit_servicio,
+                oficina=datos.oficina,
+                inicio=inicio + timedelta(days=numero),
+                termino=inicio + timedelta(days=numero, minutes=30),
+                estado="PENDIENTE",
+            )
+        )
+    database.session.commit()
+    database.session.expire_all()
+
+    with datatable_request(app, "/cit_citas/datatable_json", length):
+        login_user(datos.usuario)
+        with assert_max_sql_statements(SENTENCIAS_MAXIMO):
+            respuesta = datatable_json()
+
+    assert len(respuesta["aaData"]) == length
+    assert respuesta["iTotalRecords"] == RENGLONES
+    assert respuesta["aaData"][0]["cit_cliente"]["email"] == datos.cit_cliente.email
+
+
+@pytest.mark.parametrize("length", [10, 20])
+def test_bitacoras_datatable_json(app, datos, length):
+    """El listado de bitácoras no consulta cada usuario y módulo por separado"""
+    from pjecz_casiopea_flask.blueprints.bitacoras.models import Bitacora
+    from pjecz_casiopea_flask.blueprints.bitacoras.views import datatable_json
+    from pjecz_casiopea_flask.config.extensions import database
+
+    for numero in range(RENGLONES):
+        database.session.add(
+            Bitacora(modulo=datos.modulo, usuario=datos.usuario, descripcion=f"Bitácora {numero}", url="/bitacoras")
+        )
+    database.session.commit()
+    database.session.expire_all()
+
+    with datatable_request(app, "/bitacoras/datatable_json", length):
+        login_user(datos.usuario)
+        with assert_max_sql_statements(SENTENCIAS_MAXIMO):
+            respuesta = datatable_json()
+
+    assert len(respuesta["aaData"]) == length
+    assert respuesta["iTotalRecords"] == RENGLONES
+    assert respuesta["aaData"][0]["usuario"]["email"] == datos.usuario.email
@@ -0,0 +1,104 @@
+"""
+Pruebas, cliente de SendGrid
+
+Se usa SendGridFakeTransport con códigos de estado encolados, las esperas entre reintentos se registran sin dormir.
+"""
+
+import pytest
+import requests
+
+from pjecz_casiopea_flask.lib import sendgrid_client
+from pjecz_casiopea_flask.lib.exceptions import MyRequestError
+from pjecz_casiopea_flask.lib.sendgrid_client import (
+    SENDGRID_ESPERA_MAXIMA_SEGUNDOS,
+    SENDGRID_ESPERA_SEGUNDOS,
+    SENDGRID_LOTE_MAXIMO,
+    SENDGRID_REINTENTOS,
+    SendGridFakeTransport,
+    post_with_retry,
+    retry_wait_seconds,
+    send_emails_batch,
+    set_sendgrid_transport,
+)
+
+PAYLOAD = {"personalizations": [{"to": [{"email": "cliente@pruebas.com"}]}]}
+
+
+class SendGridFailingTransport(SendGridFakeTransport):
+    """Transporte local que falla la conexión las primeras veces"""
+
+    def __init__(self, fallas: int):
+        super().__init__()
+        self.fallas = fallas
+
+    def post(self, payload: dict) -> tuple[int, dict]:
+        """Fallar la conexión mientras queden fallas, después responder 202"""
+        if self.fallas > 0:
+            self.fallas -= 1
+            raise requests.ConnectionError("Conexión rechazada")
+        return super().post(payload)
+
+
+@pytest.fixture()
+def esperas(monkeypatch):
+    """Registrar las esperas en lugar de dormir"""
+    registradas = []
+    monkeypatch.setattr(sendgrid_client.time, "sleep", registradas.append)
+    return registradas
+
+
+def test_reintentar_429_y_5xx(esperas):
+    """Con 429 y 503 se reintenta hasta que SendGrid acepta el mensaje"""
+    transporte = SendGridFakeTransport([429, 503, 202])
+    assert post_with_retry(transporte, PAYLOAD) == 202
+    assert len(transporte.peticiones) == 3
+    assert len(esperas) == 2
+
+
+def test_reintentar_fallas_de_conexion(esperas):
+    """Si falla la conexión se reintenta"""
+    transporte = SendGridFailingTransport(fallas=2)
+    assert post_with_retry(transporte, PAYLOAD) == 202
+    assert len(transporte.peticiones) == 1
+    assert len(esperas) == 2
+
+
+@pytest.mark.parametrize("codigo", [400, 401, 403, 413])
+def test_fallar_de_inmediato_con_4xx(esperas, codigo):
+    """Con un 4xx que no es 429 no se reintenta"""
+    transporte = SendGridFakeTransport([codigo, 202])
+    with pytest.raises(MyRequestError):
+        post_with_retry(transporte, PAYLOAD)
+    assert len(transporte.peticiones) == 1
+    assert esperas == []
+
+
+def test_rendirse_despues_de_los_reintentos(esperas):
+    """Si SendGrid sigue fallando, se rinde después de SENDGRID_REINTENTOS"""
+    transporte = SendGridFakeTransport([500] * (SENDGRID_REINTENTOS + 2))
+    with pytest.raises(MyRequestError):
+        post_with_retry(transporte, PAYLOAD)
+    assert len(transporte.peticiones) == SENDGRID_REINTENTOS + 1
+    assert len(esperas) == SENDGRID_REINTENTOS
+
+
+def test_retry_wait_seconds():
+    """Retry-After manda hasta la espera máxima, sin él la espera crece con cada intento"""
+    assert retry_wait_seconds(0, {"Retry-After": "7"}) == 7
+    assert retry_wait_seconds(0, {"Retry-After": "3600"}) == SENDGRID_ESPERA_MAXIMA_SEGUNDOS
+    for intento in range(10):
+        espera = retry_wait_seconds(intento, {"Retry-After": "mañana"})
+        assert 0 <= espera <= min(SENDGRID_ESPERA_SEGUNDOS * 2**intento, SENDGRID_ESPERA_MAXIMA_SEGUNDOS)
+
+
+def test_send_emails_batch():
+    """Los destinatarios se envían en lotes de SENDGRID_LOTE_MAXIMO, cada uno en su personalización"""
+    transporte = SendGridFakeTransport()
+    set_sendgrid_transport(transporte)
+    destinatarios = [
+        (f"cliente{numero}@pruebas.com", {"-numero-": str(numero)}) for numero in range(2 * SENDGRID_LOTE_MAXIMO + 1)
+    ]
+
+    assert send_emails_batch("citas@pruebas.com", "Asunto", "<p>-numero-</p>", destinatarios) == len(destinatarios)
+    assert len(transporte.peticiones) == 3
+    assert transporte.destinatarios() == [email for email, _ in destinatarios]
@@ -1,20 +1,155 @@
 """
 Worker, para procesar tareas en segundo plano usando RQ y Redis
 
+El supervisor carga la aplicación y los módulos de tareas una sola vez y después crea WORKER_PROCESSES procesos de RQ
+(fork), que comparten lo ya cargado. Los primeros WORKER_PROCESSES_ALTA solo atienden la cola de alta prioridad, para
+que una exportación lenta no detenga el envío de mensajes; los demás atienden las dos colas, primero la de alta. Cada
+proceso termina después de WORKER_MAX_JOBS tareas y el supervisor lo reemplaza, así la memoria no crece sin límite.
+
+Además crea el proceso del auditor, que toma de Redis las bitácoras y entradas-salidas que encolan las vistas y las
+escribe en la base de datos (ver lib/audit_log.py), y lo reemplaza si termina por un error.
+
+Con Ctrl+C la terminal envía SIGINT a todos los procesos, los procesos hijos lo ignoran y solo el supervisor lo
+atiende: envía una sola vez SIGTERM a cada hijo que no se esté deteniendo ya, para que RQ termine la tarea en curso
+(un segundo SIGTERM sería un cierre en frío), y mata a los que no terminen en SUPERVISOR_ESPERA_SEGUNDOS.
+
 Ejecutar en la terminal y dejar corriendo:
 
     python3 worker.py
 
 """
 
+import importlib
+import multiprocessing
+import signal
+import time
+
 from rq import worker
 
-from pjecz_casiopea_flask.main import app, redis_client, task_queue
+from pjecz_casiopea_flask.config.extensions import database
+from pjecz_casiopea_flask.lib.audit_log import consume_audit_events
+from pjecz_casiopea_flask.lib.tasks import COLA_ALTA, COLA_BAJA
+from pjecz_casiopea_flask.main import app, redis_client, task_queues
+
+SUPERVISOR_REVISION_SEGUNDOS = 1
+SUPERVISOR_ESPERA_SEGUNDOS = 60
+
+# Módulos de tareas que se cargan antes de crear los procesos
+TAREAS_MODULOS = (
+    "bitacoras.tasks",
+    "cit_citas.tasks",
+    "cit_clientes.tasks",
+    "cit_clientes_recuperaciones.tasks",
+    "cit_clientes_registros.tasks",
+    "pag_pagos.tasks",
+)
+
+detener = False
+
+
+def stop(signum, frame):
+    """Al recibir la señal, dejar de reemplazar procesos y pedirles que terminen su tarea en curso"""
+    global detener
+    detener = True
+
+
+class SupervisedWorker(worker.Worker):
+    """Worker de RQ que ignora SIGINT, solo se detiene con el SIGTERM del supervisor, y avisa que se está deteniendo"""
+
+    deteniendo = None
+
+    def _install_signal_handlers(self):
+        """Atender solo SIGTERM, la señal que envía el supervisor"""
+        super()._install_signal_handlers()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def request_stop(self, signum, frame):
+        """Marcar que se está deteniendo, para que el supervisor no le envíe otra señal"""
+        self.deteniendo.value = 1
+        super().request_stop(signum, frame)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_worker(deteniendo, prioridades: tuple, max_jobs: int) -> None:
+    """Atender las colas en el orden de prioridad hasta completar max_jobs tareas"""
+    # RQ instala sus propias señales para terminar la tarea en curso antes de salir
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with app.app_context():
+        # No usar las conexiones a la base de datos que se hayan abierto en el supervisor
+        database.engine.dispose(close=False)
+        colas = [task_queues[prioridad] for prioridad in prioridades]
+        trabajador = SupervisedWorker(colas, connection=redis_client)
+        trabajador.deteniendo = deteniendo
+        trabajador.work(max_jobs=max_jobs)
+
+
+def run_auditor(deteniendo) -> None:
+    """Escribir los eventos de auditoría hasta recibir SIGTERM del supervisor"""
+
+    def stop_auditor(signum, frame):
+        """Marcar que se está deteniendo, termina lo que haya tomado de la cola"""
+        deteniendo.value = 1
+
+    signal.signal(signal.SIGTERM, stop_auditor)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with app.app_context():
+        database.engine.dispose(close=False)
+        consume_audit_events(redis_client, detener=lambda: deteniendo.value == 1)
+
+
+def start_process(contexto, objetivo, argumentos: tuple):
+    """Crear un proceso de RQ o el del auditor, con la marca compartida de que se está deteniendo"""
+    deteniendo = contexto.RawValue("b", 0)
+    proceso = contexto.Process(target=objetivo, args=(deteniendo, *argumentos))
+    proceso.deteniendo = deteniendo
+    proceso.start()
+    return proceso
+
 
 if __name__ == "__main__":
-    print("Worker is running and ready to process tasks...")
-    try:
-        with app.app_context():
-            worker.Worker([task_queue], connection=redis_client).work()
-    except KeyboardInterrupt:
-        print("Worker has been stopped.")
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Cargar los módulos de tareas, para que los procesos los hereden ya cargados
+    for modulo in TAREAS_MODULOS:
+        importlib.import_module(f"pjecz_casiopea_flask.blueprints.{modulo}")
+
+    # Repartir los procesos entre las colas
+    total = max(app.config["WORKER_PROCESSES"], 1)
+    reservados = min(max(app.config["WORKER_PROCESSES_ALTA"], 0), total - 1)
+    max_jobs = app.config["WORKER_MAX_JOBS"]
+    plan = [(run_worker, ((COLA_ALTA,), max_jobs))] * reservados
+    plan += [(run_worker, ((COLA_ALTA, COLA_BAJA), max_jobs))] * (total - reservados)
+    plan.append((run_auditor, ()))
+
+    # Crear los procesos con fork, para compartir la aplicación ya cargada
+    contexto = multiprocessing.get_context("fork")
+    procesos = [start_process(contexto, objetivo, argumentos) for objetivo, argumentos in plan]
+    print(f"Worker is running with {total} processes ({reservados} only for high priority), recycled every {max_jobs} jobs...")
+    print("Auditor is running in its own process...")
+
+    # Reemplazar los procesos que terminen, por llegar a max_jobs o por fallar
+    while not detener:
+        time.sleep(SUPERVISOR_REVISION_SEGUNDOS)
+        for indice, proceso in enumerate(procesos):
+            if not detener and not proceso.is_alive():
+                proceso.join()
+                procesos[indice] = start_process(contexto, *plan[indice])
+
+    # Pedir a los procesos que terminen su tarea en curso, y al auditor lo que haya tomado de la cola, con un solo
+    # SIGTERM y solo a los que no se estén deteniendo ya
+    for proceso in procesos:
+        if proceso.is_alive() and proceso.deteniendo.value == 0:
+            proceso.terminate()
+
+    # Esperarlos hasta SUPERVISOR_ESPERA_SEGUNDOS en total y matar a los que sigan corriendo
+    limite = time.monotonic() + SUPERVISOR_ESPERA_SEGUNDOS
+    for proceso in procesos:
+        proceso.join(max(limite - time.monotonic(), 0))
+    for proceso in procesos:
+        if proceso.is_alive():
+            proceso.kill()
+            proceso.join()
+            print(f"Process {proceso.pid} did not stop in {SUPERVISOR_ESPERA_SEGUNDOS} s and was killed.")
+    print("Worker has been stopped.")